@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Applets are small pieces of Thumb code, which are uploaded to SRAM and run by SAM-BA's 'G' command.
+
+Memory layout:
+
+    APPLET_ADDR             Applet stack (grows down towards APPLET_ADDR).
+    APPLET_MAILBOX_ADDR     Mailbox: command, status, arguments and results.
+    APPLET_CODE_ADDR        Applet image.
+
+    APPLET_REGION_END       End of the region shared by applet images.
+
+Like a Cortex-M vector table the image starts with the initial stack pointer and the entry point;
+the monitor rebases the stack, calls the entry point and regains control when the applet returns (bx lr).
+The third word holds a CRC32 of the image, so a single read tells whether an applet is resident.
+"""
+
+import struct
+import weakref
+import zlib
+
+
+APPLET_ADDR         = 0x20002000
+APPLET_MAILBOX_ADDR = 0x20002040
+MAILBOX_SIZE        = 0x40
+APPLET_CODE_ADDR    = APPLET_MAILBOX_ADDR + MAILBOX_SIZE
+APPLET_REGION_END   = 0x20003000
+
+HEADER_SIZE = 12
+HASH_OFFSET = 8
+
+# Mailbox offsets.
+MBX_COMMAND = 0x00
+MBX_STATUS  = 0x04
+MBX_ARGS    = 0x08
+
+STATUS_OK       = 0x00000000
+STATUS_TIMEOUT  = 0x00000001
+STATUS_BUSY     = 0xFFFFFFFF
+
+# Register numbers.
+R0, R1, R2, R3, R4, R5, R6, R7 = range(8)
+SP, LR, PC = 13, 14, 15
+
+# Condition codes.
+EQ, NE, CS, CC, MI, PL, VS, VC, HI, LS, GE, LT, GT, LE = range(14)
+
+
+class AppletError(Exception): pass
+
+
+class Thumb(object):
+    """Minimal assembler for the 16-bit Thumb instructions used by applets.
+
+    Branch targets and literals are resolved by `assemble()`; literals are pooled behind the code.
+    """
+
+    def __init__(self, origin):
+        self.origin = origin
+        self._code = []
+        self._labels = {}
+        self._literals = []
+
+    def label(self, name):
+        self._labels[name] = len(self._code)
+
+    def _emit(self, halfword):
+        self._code.append(halfword)
+
+    def _alu(self, op, rd, rm):
+        self._emit(0x4000 | (op << 6) | (rm << 3) | rd)
+
+    def ands(self, rd, rm):     self._alu(0x0, rd, rm)
+    def eors(self, rd, rm):     self._alu(0x1, rd, rm)
+    def lslsr(self, rd, rm):    self._alu(0x2, rd, rm)
+    def tst(self, rn, rm):      self._alu(0x8, rn, rm)
+    def cmp(self, rn, rm):      self._alu(0xa, rn, rm)
+    def orrs(self, rd, rm):     self._alu(0xc, rd, rm)
+    def muls(self, rd, rm):     self._alu(0xd, rd, rm)
+    def bics(self, rd, rm):     self._alu(0xe, rd, rm)
+    def mvns(self, rd, rm):     self._alu(0xf, rd, rm)
+
+    def movs(self, rd, imm):    self._emit(0x2000 | (rd << 8) | imm)
+    def cmpi(self, rn, imm):    self._emit(0x2800 | (rn << 8) | imm)
+    def addi(self, rd, imm):    self._emit(0x3000 | (rd << 8) | imm)
+    def subi(self, rd, imm):    self._emit(0x3800 | (rd << 8) | imm)
+
+    def lsls(self, rd, rm, imm):    self._emit(0x0000 | (imm << 6) | (rm << 3) | rd)
+    def lsrs(self, rd, rm, imm):    self._emit(0x0800 | (imm << 6) | (rm << 3) | rd)
+    def adds(self, rd, rn, rm):     self._emit(0x1800 | (rm << 6) | (rn << 3) | rd)
+    def subs(self, rd, rn, rm):     self._emit(0x1a00 | (rm << 6) | (rn << 3) | rd)
+    def mov(self, rd, rm):          self._emit(0x4600 | ((rd & 8) << 4) | (rm << 3) | (rd & 7))
+
+    def ldr(self, rt, rn, offset = 0):  self._emit(0x6800 | ((offset >> 2) << 6) | (rn << 3) | rt)
+    def str(self, rt, rn, offset = 0):  self._emit(0x6000 | ((offset >> 2) << 6) | (rn << 3) | rt)
+    def ldrh(self, rt, rn, offset = 0): self._emit(0x8800 | ((offset >> 1) << 6) | (rn << 3) | rt)
+    def strh(self, rt, rn, offset = 0): self._emit(0x8000 | ((offset >> 1) << 6) | (rn << 3) | rt)
+    def ldrb(self, rt, rn, offset = 0): self._emit(0x7800 | (offset << 6) | (rn << 3) | rt)
+    def strb(self, rt, rn, offset = 0): self._emit(0x7000 | (offset << 6) | (rn << 3) | rt)
+    def ldrr(self, rt, rn, rm):         self._emit(0x5800 | (rm << 6) | (rn << 3) | rt)
+    def strr(self, rt, rn, rm):         self._emit(0x5000 | (rm << 6) | (rn << 3) | rt)
+    def ldrbr(self, rt, rn, rm):        self._emit(0x5c00 | (rm << 6) | (rn << 3) | rt)
+    def strbr(self, rt, rn, rm):        self._emit(0x5400 | (rm << 6) | (rn << 3) | rt)
+
+    def push(self, *regs):
+        self._emit(0xb400 | (0x100 if LR in regs else 0) | sum(1 << r for r in regs if r < 8))
+
+    def pop(self, *regs):
+        self._emit(0xbc00 | (0x100 if PC in regs else 0) | sum(1 << r for r in regs if r < 8))
+
+    def bx(self, rm):
+        self._emit(0x4700 | (rm << 3))
+
+    def nop(self):
+        self._emit(0x46c0)
+
+    def ldrConst(self, rt, value):
+        """Load a 32-bit constant from the literal pool.
+        """
+        value &= 0xffffffff
+        if value not in self._literals:
+            self._literals.append(value)
+        index = self._literals.index(value)
+        def fixup(pos, pool):
+            offset = (pool + (index << 2) - ((pos + 4) & ~3)) >> 2
+            if not 0 <= offset < 256:
+                raise AppletError("Literal pool out of range.")
+            return 0x4800 | (rt << 8) | offset
+        self._code.append(fixup)
+
+    def b(self, label, cond = None):
+        def fixup(pos, pool):
+            offset = (self.origin + (self._labels[label] << 1) - (pos + 4)) >> 1
+            if cond is None:
+                if not -1024 <= offset < 1024:
+                    raise AppletError("Branch to '%s' out of range." % label)
+                return 0xe000 | (offset & 0x7ff)
+            if not -128 <= offset < 128:
+                raise AppletError("Branch to '%s' out of range." % label)
+            return 0xd000 | (cond << 8) | (offset & 0xff)
+        self._code.append(fixup)
+
+    def waitBits(self, rbase, offset, bit, scratch = R0):
+        """Spin until `bit` (0..31) of the register at [`rbase` + `offset`] is set.
+        """
+        loop = "_wait%d" % len(self._code)
+        self.label(loop)
+        self.ldr(scratch, rbase, offset)
+        self.lsrs(scratch, scratch, (bit + 1) & 0x1f)     # Shifts the bit into carry.
+        self.b(loop, CC)
+
+    def assemble(self):
+        if len(self._code) & 1:
+            self.nop()
+        pool = self.origin + (len(self._code) << 1)
+        halfwords = []
+        for idx, item in enumerate(self._code):
+            if callable(item):
+                item = item(self.origin + (idx << 1), pool)
+            if not 0 <= item <= 0xffff:
+                raise AppletError("Can't encode instruction #%d." % idx)
+            halfwords.append(item)
+        return struct.pack("<%uH" % len(halfwords), *halfwords) + struct.pack("<%uL" % len(self._literals), *self._literals)
+
+
+# Images known to be resident, per `Samba` instance and load address.
+_resident = weakref.WeakKeyDictionary()
+
+
+def forget(samba, addr, length):
+    """Forget all resident images overlapping [`addr`, `addr` + `length`), e.g. because the host wrote there.
+    """
+    images = _resident.get(samba, {})
+    for start, image in list(images.items()):
+        if start < addr + length and addr < start + len(image):
+            del images[start]
+
+
+class Applet(object):
+    """Base class for applets.
+
+    Subclasses implement `build()`, which emits the code into a `Thumb` assembler; the entry point
+    is called without arguments and finds its parameters in the mailbox.
+    """
+    NAME = None
+
+    def __init__(self, samba, addr = APPLET_CODE_ADDR, mailbox = APPLET_MAILBOX_ADDR, stack = APPLET_MAILBOX_ADDR):
+        self.samba = samba
+        self.addr = addr
+        self.mailbox = mailbox
+        self.stack = stack
+        self._hash = None
+        self._image = None
+
+    def build(self, asm):
+        raise NotImplementedError()
+
+    @property
+    def image(self):
+        if self._image is None:
+            entry = self.addr + HEADER_SIZE
+            asm = Thumb(entry)
+            self.build(asm)
+            code = struct.pack("<LL", self.stack, entry | 1) + asm.assemble()
+            self._hash = zlib.crc32(code) & 0xffffffff
+            self._image = code[ : HASH_OFFSET] + struct.pack("<L", self._hash) + code[HASH_OFFSET : ]
+        return self._image
+
+    @property
+    def hash(self):
+        """CRC32 identifying the image (and thereby its load address).
+        """
+        if self._hash is None:
+            self.image
+        return self._hash
+
+    @property
+    def loaded(self):
+        """Known (host-side) to be resident.
+        """
+        return _resident.get(self.samba, {}).get(self.addr) == self.image
+
+    def resident(self):
+        """Check on-target whether the applet is resident, by reading its hash word.
+        """
+        if self.samba.readLong(self.addr + HASH_OFFSET) != self.hash:
+            return False
+        _resident.setdefault(self.samba, {})[self.addr] = self.image
+        return True
+
+    def load(self):
+        forget(self.samba, self.addr, len(self.image))
+        self.samba.sendFile(self.addr, self.image)
+        _resident.setdefault(self.samba, {})[self.addr] = self.image
+
+    def ensure(self):
+        """Upload the applet unless it is already resident.
+        """
+        if not self.loaded and not self.resident():
+            self.load()
+
+    def start(self, command, *args):
+        """Fill the mailbox and start the applet, without waiting for it to finish.
+        """
+        self.ensure()
+        self.samba.writeLong(self.mailbox + MBX_COMMAND, command)
+        self.samba.writeLong(self.mailbox + MBX_STATUS, STATUS_BUSY)
+        for idx, arg in enumerate(args):
+            self.samba.writeLong(self.mailbox + MBX_ARGS + (idx << 2), arg)
+        self.samba.go(self.addr)
+
+    def result(self, count = 0, timeout = 1.0):
+        """Wait for the running applet and return its status followed by `count` result words.
+
+        Results are placed in the mailbox right behind the status, i.e. they overwrite the arguments.
+        """
+        data = self.samba.receiveFile(self.mailbox + MBX_STATUS, 4 + (count << 2), timeout)
+        return struct.unpack("<%uL" % (count + 1), bytes(data))
+
+    def call(self, command, *args, **kws):
+        self.start(command, *args)
+        status = self.result(kws.get("count", 0), kws.get("timeout", 1.0))
+        if status[0] == STATUS_BUSY:
+            raise AppletError("Applet '%s' did not finish." % self.NAME)
+        return status
+
+
+class Allocator(object):
+    """First-fit allocator for SRAM regions, honouring reserved regions.
+    """
+
+    def __init__(self, start, end, reserved = (), alignment = 4):
+        self.start = start
+        self.end = end
+        self.alignment = alignment
+        self._used = sorted((addr, addr + length) for addr, length in reserved)
+
+    def reserve(self, addr, length):
+        self._used = sorted(self._used + [(addr, addr + length)])
+
+    def allocate(self, length):
+        mask = self.alignment - 1
+        candidate = (self.start + mask) & ~mask
+        for start, end in self._used:
+            if candidate + length <= start:
+                break
+            if end > candidate:
+                candidate = (end + mask) & ~mask
+        if candidate + length > self.end:
+            raise AppletError("Out of applet memory (%u bytes requested)." % length)
+        self.reserve(candidate, length)
+        return candidate
+
+    def free(self, addr):
+        self._used = [(start, end) for start, end in self._used if start != addr]
+
+
+class AppletManager(object):
+    """Places applets side by side in the applet region and keeps a registry by content hash.
+
+    Applets are uploaded on first use only if the hash word at their load address doesn't match,
+    so applets left resident by an earlier session cost a single read.
+    """
+
+    def __init__(self, samba, start = APPLET_ADDR, end = APPLET_REGION_END, reserved = ()):
+        self.samba = samba
+        self.allocator = Allocator(start, end, reserved)
+        self.allocator.reserve(APPLET_ADDR, APPLET_CODE_ADDR - APPLET_ADDR)    # Stack and mailbox.
+        self.registry = {}
+        self._instances = {}
+
+    def reserve(self, addr, length):
+        """Keep applets out of a user region.
+        """
+        self.allocator.reserve(addr, length)
+
+    def get(self, cls):
+        """The (single) managed instance of applet class `cls`.
+        """
+        applet = self._instances.get(cls)
+        if applet is None:
+            size = len(cls(self.samba).image)
+            applet = cls(self.samba, addr = self.allocator.allocate(size))
+            self._instances[cls] = applet
+            self.registry[applet.hash] = applet
+        return applet
+
+    def lookup(self, hash):
+        return self.registry.get(hash)
+
+    def release(self, cls):
+        applet = self._instances.pop(cls, None)
+        if applet is not None:
+            del self.registry[applet.hash]
+            self.allocator.free(applet.addr)
@@ -43,22 +43,24 @@ Set Lock Bit [0..15]        Set the specified lock bit to prevent any erasure of
 Unlock All                  Unlock every flash memory sections
 """
 
-from collections import namedtuple, OrderedDict
+from collections import OrderedDict
 
 import logging
 from optparse import OptionParser, OptionGroup
 import os
 import sys
-import threading
 import serial.serialutil as serialutil
-from atenka.port import Port
+from atenka.port import Port, TimeoutError
 from atenka.samba import Samba
+from atenka.applet import APPLET_ADDR
+from atenka.baudrate import negotiate, BaudrateError, USARTS
+from atenka.profiling import profiled, phase
+from atenka import dump, script
+from atenka.module import (ACC_RW, ACC_RO, ACC_WO, Register, GPIORegister, Field, Module, readRegisters, decodeRegisters,
+    InterfaceNotSupportedError, RegisterNotDefinedError)
 
 SRAM            = 0x20000000
 
-APPLET_ADDR     = 0x20002000
-APPLET_MAILBOX_ADDR = 0x20002040
-
 
 GPIO            = 0x400E1000
 FLASHCALW       = 0x400A0000
@@ -69,19 +71,13 @@ logger.setLevel(logging.WARN)
 COMMANDS = {    # a.k.a builtin plugins.
     'info': None,
     'dump': None,
+    'run': None,
 
 
     'del-plugin': None,
     'ls-plugins': None,
 }
 
-ACC_RW  = 0 # Read/Write access.
-ACC_RO  = 1 # Read-only access.
-ACC_WO  = 2 # Write-only access.
-
-Register = namedtuple('Register', 'offset description decoder')
-GPIORegister = namedtuple('Register', 'offset description decoder access extInterface')
-
 
 """
 Use-cases:
@@ -94,34 +90,6 @@ Curiosity
 Fun-stuff.
 """
 
-class InterfaceNotSupportedError(Exception): pass
-class RegisterNotDefinedError(Exception): pass
-class ModuleInstanceNotAvailable(Exception): pass
-
-
-class SingletonBase(object):
-    _lock = threading.Lock()
-
-    def __new__(cls, *args, **kws):
-        # Double-Checked Locking
-        if not hasattr(cls, '_instance'):
-            try:
-                cls._lock.acquire()
-                if not hasattr(cls, '_instance'):
-                    cls._instance = super(SingletonBase, cls).__new__(cls)
-            finally:
-                cls._lock.release()
-        return cls._instance
-
-
-class Module(SingletonBase):
-    NAME = None
-    EXTRAS = []
-
-    def __init__(self, samba):
-        self.samba = samba
-
-
 class ModGPIO(Module):
 
     NAME                = "GPIO"
@@ -209,7 +177,7 @@ class ModFlash(Module):
         "FCR":      Register(0x00, "Flash Control Register", None),
         "FCMD":     Register(0x04, "Flash Command Register", None),
         "FSR":      Register(0x08, "Flash Status Register", None),
-        "FPR":      Register(0x0C, "Flash Parameter Register", "flashParameters"),
+        "FPR":      Register(0x0C, "Flash Parameter Register", None),
         "FVR":      Register(0x10, "Flash Version Register", None),
         "FGPFRHI":  Register(0x14, "Flash General Purpose Fuse Register Hi", None),
         "FGPFRLO":  Register(0x18, "Flash General Purpose Fuse Register Lo", None),
@@ -224,55 +192,125 @@ class ModFlash(Module):
         "PVR":      Register(0x4FC, "PicoCache Version Register", None),
     }
 
-    def flashParameters(cls, value):
-        PSZ = {
-            0: "32 Byte",
-            1: "64 Byte",
-            2: "128 Byte",
-            3: "256 Byte",
-            4: "512 Byte",
-            5: "1024 Byte",
-            6: "2048 Byte",
-            7: "4096 Byte",
-        }
-        FSZ = {
-            0:  "4 Kbyte ",
-            8:  "192 Kbyte",
-            1:  "8 Kbyte",
-            9:  "256 Kbyte",
-            2:  "16 Kbyte",
-            10: "384 Kbyte",
-            3:  "32 Kbyte",
-            11: "512 Kbyte",
-            4:  "48 Kbyte",
-            12: "768 Kbyte",
-            5:  "64 Kbyte",
-            13: "1024 Kbyte",
-            6:  "96 Kbyte",
-            14: "2048 Kbyte",
-            7:  "128 Kbyte",
-            15: "Reserved",
-        }
-        fsz = value & 0x000000ff
-        psz = (value & 0x00000700) >> 8
-        print "    Flash Size     :", FSZ.get(fsz, "Reserved")
-        print "    Flash Page Size:", PSZ.get(psz, "*** UNKNOWN ***")
-        print
+    FIELDS = {
+        "FPR": (
+            Field("FSZ", 0, 4, "Flash Size", ACC_RO),
+            Field("PSZ", 8, 3, "Flash Page Size", ACC_RO),
+        ),
+    }
+
+    ENUMS = {
+        "FPR": {
+            "FSZ": {
+                0:  "4 Kbyte ",
+                8:  "192 Kbyte",
+                1:  "8 Kbyte",
+                9:  "256 Kbyte",
+                2:  "16 Kbyte",
+                10: "384 Kbyte",
+                3:  "32 Kbyte",
+                11: "512 Kbyte",
+                4:  "48 Kbyte",
+                12: "768 Kbyte",
+                5:  "64 Kbyte",
+                13: "1024 Kbyte",
+                6:  "96 Kbyte",
+                14: "2048 Kbyte",
+                7:  "128 Kbyte",
+                15: "Reserved",
+            },
+            "PSZ": {
+                0: "32 Byte",
+                1: "64 Byte",
+                2: "128 Byte",
+                3: "256 Byte",
+                4: "512 Byte",
+                5: "1024 Byte",
+                6: "2048 Byte",
+                7: "4096 Byte",
+            },
+        },
+    }
 
 
 def dumpModule(samba, mod):
+    with phase("transfer"):
+        values = readRegisters(samba, mod)
+    with phase("decode"):
+        registers = decodeRegisters(mod, values)
+    with phase("output"):
+        _printModule(mod, registers)
+
+def _printModule(mod, registers):
     print "Module:", mod.NAME
     print
     print "=" * 60
     print "Addr     Name      Description"
     print "Val/Hex  Val/Bin"
     print "=" * 60
-    for k, reg in sorted(mod.REGISTERS.items(), key = lambda x: x[1][0]):
-        value = samba.readLong(mod.BASE_ADDRESS + reg.offset)
-        print "{:08X} {:10s}{:s}".format(GPIO + reg.offset, k, reg.description)
-        print "{:08X} {:032b}\n".format(value, value)
-        if reg.decoder:
-            getattr(mod, reg.decoder)(value)
+    for reg in registers:
+        print "{:08X} {:10s}{:s}".format(reg.address, reg.name, reg.description)
+        print "{:08X} {:032b}\n".format(reg.value, reg.value)
+        for field in reg.fields:
+            print "    {:15s}: {}".format(field.description or field.name,
+                field.label if field.label is not None else field.value)
+        if reg.fields:
+            print
+
+def runScript(samba, args):
+    """run <script> -- execute a batch script, see `atenka.script`.
+    """
+    if len(args) != 1:
+        print "usage: run <script>"
+        sys.exit(1)
+    try:
+        with phase("transfer"):
+            result = script.load(args[0]).run(samba)
+    except (IOError, script.ScriptError) as e:
+        print str(e)
+        sys.exit(1)
+    with phase("output"):
+        _printScriptResult(result)
+
+def _printScriptResult(result):
+    for step, value in result.steps:
+        if value is None:
+            continue
+        if isinstance(value, bytearray):
+            value = "%u bytes" % len(value)
+        else:
+            value = "0x%08X" % value
+        print "{:4d} {:8s} {:10s} {:s}".format(step.line or 0, step.kind, step.name or "", value)
+    print
+    print "%u steps in %u batches, %.3f s." % (len(result.steps), result.batches, result.elapsed)
+
+COMMANDS['run'] = runScript
+
+
+def dumpMemory(samba, args):
+    """dump <file> <start>:<length>|<start>-<end> ... -- resumable memory dump, see `atenka.dump`.
+    """
+    if len(args) < 2:
+        print "usage: dump <file> <start>:<length>|<start>-<end> ..."
+        sys.exit(1)
+    try:
+        dumper = dump.Dump(samba, args[0], [dump.parseRange(arg) for arg in args[1 : ]])
+        with phase("transfer"):
+            result = dumper.run()
+    except (EnvironmentError, dump.DumpError, TimeoutError) as e:
+        print str(e)
+        sys.exit(1)
+    if result.resumed:
+        print "Resumed, %u chunks already verified." % result.resumed
+    print "%u of %u bytes read in %.3f s, %u retries." % (result.read, dumper.size, result.elapsed, result.retries)
+    if result.failed:
+        for addr, length in result.failed:
+            print "Failed: 0x%08X:0x%X" % (addr, length)
+        print "Run the same command again to retry the failed chunks."
+        sys.exit(1)
+
+COMMANDS['dump'] = dumpMemory
+
 
 def printHeader():
     print """\n  %s
@@ -281,7 +319,7 @@ def printHeader():
     """ % (__description__)
 
 def main():
-    usage = "usage: %prog [options] command"
+    usage = "usage: %prog [options] command [arguments]"
 
     #printHeader()
     op = OptionParser(usage = usage, version = "%prog " +__version__)
@@ -289,9 +327,14 @@ def main():
     op.add_option("-p", "--port", action = "store", type = "string", dest = "comport",
         help = "Com-Port #. This depends on your operating system, e.g.: 1 ==> "
         "COM2 on Microsoft-Systems.", default = 0)
-#    op.add_option("-s", "--speed", action = "store", type = "choice", dest = "speed",
-#        choices = ('lo', 'med', 'hi'), default = "med", help = "Communication Speed. "
-#        "Select one of the folowing: ['lo' | 'med' | 'hi'] (19200, 57600, 115200).")
+    op.add_option("-s", "--speed", action = "store", type = "int", dest = "speed",
+        help = "Communication Speed. Baudrate to negotiate with UART connected bootloaders "
+        "(the connection is always opened at 115200).", default = None)
+    op.add_option("--usart", action = "store", type = "choice", choices = ["0", "1", "2", "3"], dest = "usart",
+        help = "USART the bootloader is connected to (used with --speed; detected if omitted).", default = None)
+    op.add_option("--profile", action = "store", type = "string", dest = "profile", metavar = "BASENAME",
+        help = "Profile host-side CPU usage; writes BASENAME.prof (pstats) and BASENAME.folded "
+        "(collapsed stacks for flamegraph tools) and prints per-phase timings.", default = None)
     '''
     input_group = OptionGroup(op, 'Input')
     input_group.add_option('-I', '--include-path', dest = 'inc_path', action = 'append',
@@ -314,7 +357,7 @@ def main():
         default = False
     '''
     (options, args) = op.parse_args()
-    if len(args) != 1:
+    if len(args) < 1:
         op.print_help()
         exit(1)
     command = args[0].lower()
@@ -324,18 +367,41 @@ def main():
         print "'%s' not recognized.\nValid commands are: %s" % (command, sorted(COMMANDS.keys()))
         sys.exit(1)
 
-    try:
-        port = Port(options.comport)
-    except serialutil.SerialException:
-        sys.exit(1)
-    except Exception as e:
-        #logger.error("%s", e)
-        print str(e)
-        sys.exit(1)
+    with profiled(options.profile):
+        session(options, command, args)
+
+
+def session(options, command, args):
+    with phase("connect"):
+        try:
+            port = Port(options.comport)
+        except serialutil.SerialException:
+            sys.exit(1)
+        except Exception as e:
+            #logger.error("%s", e)
+            print str(e)
+            sys.exit(1)
 
-    smb = Samba(port)
-    print "ChipID       : 0x%08x" % smb.chipId()
-    cinfo = smb.chipInfo()
+        smb = Samba(port)
+        if options.speed:
+            try:
+                usart = USARTS[int(options.usart)] if options.usart is not None else None
+                baudrate = negotiate(smb, port, options.speed, usart)
+            except BaudrateError as e:
+                print str(e)
+                sys.exit(1)
+            if baudrate != options.speed:
+                print "Could not switch to %u Baud, staying at %u Baud." % (options.speed, baudrate)
+
+    handler = COMMANDS[command]
+    if handler:
+        handler(smb, args[1 : ])
+        port.close()
+        return
+    with phase("identify"):
+        chipId = smb.chipId()
+        cinfo = smb.chipInfo()
+    print "ChipID       : 0x%08x" % chipId
 
 
     data = smb.receiveFile(APPLET_ADDR, 255)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Baudrate negotiation for UART connected SAM-BA monitors.
+
+The baud rate generator of the monitor's USART is reprogrammed through `writeLong`, the host follows,
+and the new setting is confirmed by reading BRGR back; on failure both sides return to the old rate.
+(Meaningless for USB CDC connections.)
+"""
+
+from atenka.port import TimeoutError
+
+
+USART0  = 0x40024000
+USART1  = 0x40028000
+USART2  = 0x4002C000
+USART3  = 0x40030000
+
+USARTS  = (USART0, USART1, USART2, USART3)
+
+# Offsets.
+MR      = 0x04          # Mode Register.
+BRGR    = 0x20          # Baud Rate Generator Register.
+
+MR_MODE     = 0x0000000f
+MR_SYNC     = 0x00000100
+MR_OVER     = 0x00080000
+BRGR_CD     = 0x0000ffff
+BRGR_FP     = 0x00070000
+
+MAX_ERROR   = 0.02      # Tolerable baudrate deviation.
+
+
+class BaudrateError(Exception): pass
+
+
+def _divisor(brgr):
+    """Clock divisor in 1/8 units.
+    """
+    return ((brgr & BRGR_CD) << 3) | ((brgr & BRGR_FP) >> 16)
+
+
+def brgrFor(baudrate, currentBaudrate, brgr, mr):
+    """Compute the BRGR value for `baudrate`, using the current setting to derive the USART clock.
+    """
+    sampling = 8 if (mr & MR_OVER) else 16
+    current = _divisor(brgr)
+    if (current >> 3) == 0:
+        raise BaudrateError("Baud rate generator is disabled (BRGR: 0x%08x)." % brgr)
+    clock = float(currentBaudrate) * sampling * current / 8
+    divisor = int(round(clock * 8 / (sampling * baudrate)))
+    if not 8 <= divisor <= ((BRGR_CD << 3) | 7):
+        raise BaudrateError("%u Baud not reachable." % baudrate)
+    actual = clock * 8 / (sampling * divisor)
+    if abs(actual - baudrate) / baudrate > MAX_ERROR:
+        raise BaudrateError("%u Baud not reachable (%.0f Baud would be off by more than %.0f%%)." %
+            (baudrate, actual, MAX_ERROR * 100))
+    return ((divisor & 7) << 16) | (divisor >> 3)
+
+
+def baudrateOf(clock, brgr, mr):
+    """Baudrate produced by `brgr` at a USART clock of `clock` Hz (None if the generator is disabled).
+    """
+    divisor = _divisor(brgr)
+    if (divisor >> 3) == 0:
+        return None
+    return clock * 8.0 / ((8 if (mr & MR_OVER) else 16) * divisor)
+
+
+def detect(samba, baudrate, clock = None):
+    """Find the USART the monitor talks through, without changing anything.
+
+    Candidates are USARTs running in normal asynchronous mode with an enabled baud rate generator;
+    if the USART `clock` is known, the generator also has to match `baudrate`.
+    Raises `BaudrateError` unless there is exactly one candidate.
+    """
+    candidates = []
+    for usart in USARTS:
+        brgr = samba.readLong(usart + BRGR)
+        mr = samba.readLong(usart + MR)
+        if (_divisor(brgr) >> 3) == 0 or mr & (MR_MODE | MR_SYNC):
+            continue
+        if clock is not None and abs(baudrateOf(clock, brgr, mr) - baudrate) / baudrate > MAX_ERROR:
+            continue
+        candidates.append(usart)
+    if len(candidates) != 1:
+        raise BaudrateError("Could not tell which USART the monitor uses (candidates: %s), please select one." %
+            (", ".join("USART%u" % USARTS.index(u) for u in candidates) or "none"))
+    return candidates[0]
+
+
+def _switch(samba, port, usart, brgr, baudrate):
+    samba.writeLong(usart + BRGR, brgr)
+    port.flush()
+    port.baudrate = baudrate
+    port.write(b'#')    # Terminates whatever the monitor received during the switch.
+    port.flush()
+
+
+def _probe(samba, usart, expected):
+    try:
+        return samba.readLong(usart + BRGR) == expected
+    except TimeoutError:
+        return False
+
+
+def negotiate(samba, port, baudrate, usart = None, clock = None):
+    """Switch monitor and host to `baudrate`; returns the baudrate in effect afterwards.
+
+    `usart` is the base address of the monitor's USART, by default it is `detect`ed.
+    Raises `BaudrateError` if the new rate isn't reachable or the connection couldn't be re-established.
+    """
+    oldBaudrate = port.baudrate
+    if baudrate == oldBaudrate:
+        return baudrate
+    if usart is None:
+        usart = detect(samba, oldBaudrate, clock)
+    oldBrgr = samba.readLong(usart + BRGR)
+    brgr = brgrFor(baudrate, oldBaudrate, oldBrgr, samba.readLong(usart + MR))
+    _switch(samba, port, usart, brgr, baudrate)
+    if _probe(samba, usart, brgr):
+        return baudrate
+    # Roll back: the monitor either didn't switch at all or doesn't talk to us at the new rate.
+    port.baudrate = oldBaudrate
+    port.flush()
+    if _probe(samba, usart, oldBrgr):
+        return oldBaudrate
+    port.baudrate = baudrate
+    _switch(samba, port, usart, oldBrgr, oldBaudrate)
+    if _probe(samba, usart, oldBrgr):
+        return oldBaudrate
+    raise BaudrateError("Lost connection while switching to %u Baud." % baudrate)
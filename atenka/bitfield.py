@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Bitfield decoding driven by register metadata.
+
+A `Decoder` turns the `Field`s of a register into mask/shift tables once; it then decodes single
+values or whole columns of samples (e.g. a register sampled a few thousand times) field by field,
+using NumPy if it is installed and the standard `array` module otherwise.
+"""
+
+from array import array
+from collections import namedtuple, OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DecodedField = namedtuple("DecodedField", "name value label description")
+DecodedRegister = namedtuple("DecodedRegister", "name address value description fields")
+
+
+def _typecode(width):
+    if width <= 8:
+        return 'B'
+    elif width <= 16:
+        return 'H'
+    return 'L'
+
+
+NUMPY_TYPES = {'B': "uint8", 'H': "uint16", 'L': "uint32"}
+
+
+class Decoder(object):
+    """Mask/shift tables for the `fields` of one register; `enums` maps field names to value -> label dicts.
+    """
+
+    def __init__(self, fields, enums = None):
+        self.fields = tuple(sorted(fields, key = lambda f: f.offset))
+        self.names = tuple(f.name for f in self.fields)
+        self.shifts = tuple(f.offset for f in self.fields)
+        self.masks = tuple((1 << f.width) - 1 for f in self.fields)
+        self.enums = enums or {}
+        self._table = tuple(zip(self.names, self.shifts, self.masks))
+
+    def __len__(self):
+        return len(self.fields)
+
+    def decode(self, value):
+        """OrderedDict field name -> field value.
+        """
+        return OrderedDict((name, (value >> shift) & mask) for name, shift, mask in self._table)
+
+    def label(self, name, value, default = None):
+        return self.enums.get(name, {}).get(value, default)
+
+    def describe(self, value):
+        """Tuple of `DecodedField`s, labels looked up in the enumerations.
+        """
+        return tuple(DecodedField(field.name, (value >> shift) & mask,
+                self.label(field.name, (value >> shift) & mask), field.description)
+            for field, shift, mask in zip(self.fields, self.shifts, self.masks))
+
+    def column(self, samples, useNumpy = None):
+        """Decode a whole column of samples; returns an OrderedDict field name -> column of field values.
+
+        Columns are NumPy arrays if NumPy is used (default: if available), `array.array`s otherwise.
+        """
+        if useNumpy is None:
+            useNumpy = numpy is not None
+        result = OrderedDict()
+        if useNumpy:
+            data = numpy.asarray(samples, dtype = numpy.uint32)
+            for field, shift, mask in zip(self.fields, self.shifts, self.masks):
+                result[field.name] = ((data >> shift) & mask).astype(NUMPY_TYPES[_typecode(field.width)])
+        else:
+            data = samples if isinstance(samples, array) else array('L', samples)
+            for field, shift, mask in zip(self.fields, self.shifts, self.masks):
+                result[field.name] = array(_typecode(field.width), [(v >> shift) & mask for v in data])
+        return result
+
+    def labels(self, name, column, default = None):
+        """Enumeration labels for a column of field values, as a list.
+        """
+        enum = self.enums.get(name, {})
+        return [enum.get(int(v), default) for v in column]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Resumable, checkpointed memory dumps.
+
+Ranges are read chunk by chunk and written to their place in the output file; after every chunk
+the sidecar manifest (``<output>.manifest``, JSON) records it together with its SHA-1. A later
+run over the same ranges verifies the recorded chunks against the file and only reads what is
+missing. Chunks failing with a `TimeoutError` are split and retried at smaller sizes, down to
+`minChunkSize`; chunks still failing then are left for the next run.
+
+After a failure the link is resynchronised and checked by reading the chip ID, so late bytes of
+an aborted reply can't end up in the following chunks.
+"""
+
+from collections import namedtuple, deque
+import hashlib
+import json
+import os
+import time
+
+from atenka.port import TimeoutError
+
+
+MANIFEST_VERSION    = 1
+CHUNK_SIZE          = 0x4000
+MIN_CHUNK_SIZE      = 0x100
+RETRIES             = 3             # Attempts at `minChunkSize` before giving up on a chunk.
+
+
+class DumpError(Exception): pass
+
+
+DumpResult = namedtuple("DumpResult", "read resumed retries failed elapsed")
+
+
+def parseRange(text):
+    """'<start>:<length>' or '<start>-<end>' (numbers in C notation) -> (start, length).
+    """
+    try:
+        if ":" in text:
+            start, length = [int(x, 0) for x in text.split(":", 1)]
+        else:
+            start, end = [int(x, 0) for x in text.split("-", 1)]
+            length = end - start
+    except ValueError:
+        raise DumpError("Invalid range '%s'." % text)
+    if length <= 0:
+        raise DumpError("Empty range '%s'." % text)
+    return start, length
+
+
+def _sha1(data):
+    return hashlib.sha1(bytes(data)).hexdigest()
+
+
+class Dump(object):
+    """Dump `ranges` [(start, length)] into `filename`, back to back in the given order.
+
+    `progress`, if given, is called as ``progress(addr, length)`` after each stored chunk.
+    """
+
+    def __init__(self, samba, filename, ranges, chunkSize = CHUNK_SIZE, minChunkSize = MIN_CHUNK_SIZE,
+            retries = RETRIES, timeout = 1.0, progress = None):
+        self.samba = samba
+        self.filename = filename
+        self.manifestName = filename + ".manifest"
+        self.ranges = [(start, length) for start, length in ranges]
+        bounds = sorted(self.ranges)
+        for (start, length), (nextStart, nextLength) in zip(bounds, bounds[1 : ]):
+            if start + length > nextStart:
+                raise DumpError("Ranges 0x%08x:0x%x and 0x%08x:0x%x overlap." % (start, length, nextStart, nextLength))
+        self.chunkSize = chunkSize
+        self.minChunkSize = min(minChunkSize, chunkSize)
+        self.retries = retries
+        self.timeout = timeout
+        self.progress = progress
+        self._offsets = {}
+        offset = 0
+        for start, length in self.ranges:
+            self._offsets[start] = offset
+            offset += length
+        self.size = offset
+        self.chunks = {}        # addr -> (length, sha1) of chunks stored and verified.
+        self.failed = []
+
+    def _fileOffset(self, addr):
+        for start, length in self.ranges:
+            if start <= addr < start + length:
+                return self._offsets[start] + addr - start
+        raise DumpError("Address 0x%08x outside of the dumped ranges." % addr)
+
+    def _writeManifest(self, complete = False):
+        manifest = {
+            "version":  MANIFEST_VERSION,
+            "ranges":   self.ranges,
+            "chunks":   sorted([addr, length, digest] for addr, (length, digest) in self.chunks.items()),
+            "failed":   self.failed,
+            "complete": complete,
+        }
+        if complete:
+            manifest["sha1"] = self._rangeHashes()
+        tmpName = "%s.%u.tmp" % (self.manifestName, os.getpid())
+        with open(tmpName, "w") as outf:
+            json.dump(manifest, outf, indent = 1)
+        os.rename(tmpName, self.manifestName)
+
+    def _rangeHashes(self):
+        result = []
+        for start, length in self.ranges:
+            self._file.seek(self._offsets[start])
+            result.append(_sha1(self._file.read(length)))
+        return result
+
+    def _resume(self):
+        """Adopt the chunks of an existing manifest that still match the file; returns their number.
+        """
+        try:
+            with open(self.manifestName) as inf:
+                manifest = json.load(inf)
+        except (IOError, OSError, ValueError):
+            return 0
+        if manifest.get("version") != MANIFEST_VERSION or [tuple(r) for r in manifest.get("ranges", [])] != self.ranges:
+            return 0
+        for addr, length, digest in manifest["chunks"]:
+            self._file.seek(self._fileOffset(addr))
+            if _sha1(self._file.read(length)) == digest:
+                self.chunks[addr] = (length, digest)
+        return len(self.chunks)
+
+    def _missing(self):
+        """(addr, length) runs of the ranges not covered by stored chunks, split into `chunkSize` pieces.
+        """
+        result = []
+        done = sorted((addr, addr + length) for addr, (length, digest) in self.chunks.items())
+        for start, length in self.ranges:
+            position, end = start, start + length
+            for doneStart, doneEnd in done:
+                if doneEnd <= position or doneStart >= end:
+                    continue
+                if doneStart > position:
+                    result.append((position, doneStart - position))
+                position = max(position, doneEnd)
+            if position < end:
+                result.append((position, end - position))
+        chunks = []
+        for addr, length in result:
+            chunks.extend((offset, min(self.chunkSize, addr + length - offset)) for offset in range(addr, addr + length, self.chunkSize))
+        return chunks
+
+    def _read(self, addr, length):
+        data = self.samba.receiveFile(addr, length, self.timeout)
+        if len(data) != length:
+            raise TimeoutError("Requested %d bytes got %d" % (length, len(data)))
+        return data
+
+    def _resync(self, length):
+        """Drain the aborted reply, then make sure replies line up again by reading the chip ID.
+        """
+        for attempt in range(self.retries):
+            try:
+                self.samba.resync(length)
+                if self.samba.chipId() == self._chipId:
+                    return
+            except TimeoutError:
+                pass
+        raise DumpError("Lost synchronisation with the monitor.")
+
+    def run(self):
+        """Dump all missing chunks; returns a `DumpResult`.
+        """
+        started = time.time()
+        self._chipId = self.samba.chipId()
+        mode = "r+b" if os.path.exists(self.filename) else "w+b"
+        with open(self.filename, mode) as self._file:
+            self._file.truncate(self.size)
+            resumed = self._resume()
+            pending = deque((addr, length, 0) for addr, length in self._missing())
+            self.failed = []
+            read = retries = 0
+            while pending:
+                addr, length, attempt = pending.popleft()
+                try:
+                    data = self._read(addr, length)
+                except TimeoutError:
+                    retries += 1
+                    self._resync(length)
+                    if length > self.minChunkSize:     # Retry the failed chunk only, in smaller pieces.
+                        piece = max(self.minChunkSize, length // 4)
+                        pending.extendleft(reversed([(offset, min(piece, addr + length - offset), 0)
+                            for offset in range(addr, addr + length, piece)]))
+                    elif attempt + 1 < self.retries:
+                        pending.appendleft((addr, length, attempt + 1))
+                    else:
+                        self.failed.append([addr, length])
+                    continue
+                self._file.seek(self._fileOffset(addr))
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())   # The manifest must never claim unwritten data.
+                self.chunks[addr] = (length, _sha1(data))
+                read += length
+                self._writeManifest()
+                if self.progress is not None:
+                    self.progress(addr, length)
+            self._writeManifest(complete = not self.failed)
+        self._file = None
+        return DumpResult(read, resumed, retries, self.failed, time.time() - started)
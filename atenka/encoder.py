@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+import struct
+
+
+TERM = bytearray(b'#\x0a')
+
+# Prebuilt little-endian decoders for the replies of 'o', 'h' and 'w'.
+UNIT_DECODERS = {
+    1: struct.Struct("<B"),
+    2: struct.Struct("<H"),
+    4: struct.Struct("<L"),
+}
+
+# Hex fields are rendered in one go by %-formatting into a slice of the frame.
+UNIT_FORMATS = {
+    1: b'%08X,%02X',
+    2: b'%08X,%04X',
+    4: b'%08X,%08X',
+}
+UNIT_MASKS = {1: 0xff, 2: 0xffff, 4: 0xffffffff}
+
+# Frame layouts (offsets into the reusable buffers).
+#
+#   <cmd><addr:8>,<dlen:1>#\n           -- unit read.
+#   <cmd><addr:8>,<value:2|4|8>#\n      -- unit write.
+#   <cmd><addr:8>,<length:8>#\n         -- bulk transfer ('S' / 'R').
+#   <cmd><addr:8>#\n                    -- go.
+ADDR_OFFSET     = 1
+PARAM_OFFSET    = 10
+
+
+def _code(cmd):
+    """Command characters may be given as one-character strings or as integers.
+    """
+    return cmd if isinstance(cmd, int) else ord(cmd)
+
+
+def _frame(length):
+    buf = bytearray(length)
+    buf[-2 : ] = TERM
+    return buf
+
+
+class CommandEncoder(object):
+    """Builds SAM-BA command frames into preallocated `bytearray` buffers.
+
+    The returned frames are owned by the encoder and are overwritten by the next call
+    of the same kind, so they have to be handed to the port (which copies them) right away.
+    """
+
+    def __init__(self):
+        self._command = _frame(3)
+        self._readUnit = _frame(PARAM_OFFSET + 1 + 2)
+        self._readUnit[9] = ord(',')
+        self._writeUnit = {}
+        for dlen in (1, 2, 4):
+            frame = _frame(PARAM_OFFSET + (dlen << 1) + 2)
+            frame[9] = ord(',')
+            self._writeUnit[dlen] = frame
+        self._transfer = _frame(PARAM_OFFSET + 8 + 2)
+        self._transfer[9] = ord(',')
+        self._go = _frame(ADDR_OFFSET + 8 + 2)
+
+    def command(self, cmd):
+        frame = self._command
+        frame[0] = _code(cmd)
+        return frame
+
+    def readUnit(self, cmd, addr, dlen):
+        frame = self._readUnit
+        frame[0] = _code(cmd)
+        frame[ADDR_OFFSET : PARAM_OFFSET - 1] = b'%08X' % addr
+        frame[PARAM_OFFSET] = 0x30 + dlen
+        return frame
+
+    def writeUnit(self, cmd, addr, value, dlen):
+        frame = self._writeUnit[dlen]
+        frame[0] = _code(cmd)
+        frame[ADDR_OFFSET : -2] = UNIT_FORMATS[dlen] % (addr, value & UNIT_MASKS[dlen])
+        return frame
+
+    def transfer(self, cmd, addr, length):
+        frame = self._transfer
+        frame[0] = _code(cmd)
+        frame[ADDR_OFFSET : -2] = b'%08X,%08X' % (addr, length)
+        return frame
+
+    def go(self, cmd, addr):
+        frame = self._go
+        frame[0] = _code(cmd)
+        frame[ADDR_OFFSET : -2] = b'%08X' % addr
+        return frame
+
+    @staticmethod
+    def decodeUnit(data, dlen):
+        return UNIT_DECODERS[dlen].unpack_from(data)[0]
+
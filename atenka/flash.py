@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+from collections import namedtuple
+import struct
+import time
+import zlib
+
+from atenka.applet import (Applet, R0, R1, R2, R3, R4, R5, R6, R7, LR, PC, CC, CS, NE, MBX_ARGS, MBX_STATUS,
+    STATUS_TIMEOUT)
+
+
+FLASHCALW   = 0x400A0000
+
+# Offsets.
+FCMD        = 0x04          # Flash Command Register.
+FSR         = 0x08          # Flash Status Register.
+FPR         = 0x0C          # Flash Parameter Register.
+MAINT0      = 0x420         # PicoCache Maintenance Register 0.
+
+FCMD_KEY    = 0xA5000000
+
+# Flash commands.
+CMD_WP      = 0x01          # Write Page.
+CMD_EP      = 0x02          # Erase Page.
+CMD_CPB     = 0x03          # Clear Page Buffer.
+
+# Flash status bits.
+FSR_FRDY    = 0x01
+FSR_LOCKE   = 0x04
+FSR_PROGE   = 0x08
+
+STAGING_ADDR = 0x20004000   # Two page sized SRAM buffers.
+STAGING_SIZE = 0x2000       # Room for two pages of the largest size FPR.PSZ can report.
+
+CRC32_POLYNOMIAL = 0xEDB88320
+
+
+class FlashError(Exception): pass
+
+
+def pageSize(samba):
+    """Flash page size in bytes, as reported by FPR.PSZ.
+    """
+    return 32 << ((samba.readLong(FLASHCALW + FPR) & 0x00000700) >> 8)
+
+
+def crc32(data):
+    return zlib.crc32(bytes(data)) & 0xffffffff
+
+
+class FlashApplet(Applet):
+    """Copies a staged page into the page buffer, (erases and) writes it and returns the CRC32
+    of the programmed page.
+
+    Arguments:  source, page address, page number, flags (bit 0: erase), page size in words.
+    Results:    CRC32.
+    Status:     FSR.LOCKE | FSR.PROGE seen by any FSR read (reading FSR clears them), or STATUS_TIMEOUT
+                if FSR.FRDY stays low for `READY_LIMIT` polls.
+    """
+    NAME = "flash"
+
+    PROGRAM = 1
+
+    ERASE   = 0x01
+
+    READY_LIMIT = 0x00100000
+
+    def build(self, asm):
+        def command(cmd):
+            asm.movs(R0, cmd)
+            asm.orrs(R0, R5)
+            asm.str(R0, R4, FCMD)
+            asm.ldrConst(R2, self.READY_LIMIT)
+            loop, ready = "wait%u" % cmd, "ready%u" % cmd
+            asm.label(loop)
+            asm.ldr(R0, R4, FSR)
+            asm.movs(R1, FSR_LOCKE | FSR_PROGE)
+            asm.ands(R1, R0)
+            asm.orrs(R6, R1)                # Accumulated errors.
+            asm.lsrs(R0, R0, 1)             # FRDY into carry.
+            asm.b(ready, CS)
+            asm.subi(R2, 1)
+            asm.b(loop, NE)
+            asm.b("timeout")
+            asm.label(ready)
+
+        asm.push(R4, R5, R6, R7, LR)
+        asm.ldrConst(R7, self.mailbox)
+        asm.ldrConst(R4, FLASHCALW)
+        asm.ldr(R5, R7, MBX_ARGS + 8)       # PAGEN.
+        asm.lsls(R5, R5, 8)
+        asm.ldrConst(R6, FCMD_KEY)
+        asm.orrs(R5, R6)
+        asm.movs(R6, 0)
+
+        asm.ldr(R0, R7, MBX_ARGS + 12)      # Flags.
+        asm.lsrs(R0, R0, 1)
+        asm.b("noerase", CC)
+        command(CMD_EP)
+        asm.label("noerase")
+        command(CMD_CPB)
+
+        asm.ldr(R0, R7, MBX_ARGS + 0)       # Fill page buffer.
+        asm.ldr(R1, R7, MBX_ARGS + 4)
+        asm.ldr(R2, R7, MBX_ARGS + 16)
+        asm.label("copy")
+        asm.ldr(R3, R0)
+        asm.str(R3, R1)
+        asm.addi(R0, 4)
+        asm.addi(R1, 4)
+        asm.subi(R2, 1)
+        asm.b("copy", NE)
+        command(CMD_WP)
+
+        asm.ldrConst(R0, FLASHCALW + MAINT0)    # Invalidate PicoCache.
+        asm.movs(R1, 1)
+        asm.str(R1, R0)
+
+        asm.ldr(R0, R7, MBX_ARGS + 4)       # CRC32 of the programmed page.
+        asm.ldr(R1, R7, MBX_ARGS + 16)
+        asm.lsls(R1, R1, 2)
+        asm.movs(R2, 0)
+        asm.mvns(R2, R2)
+        asm.ldrConst(R3, CRC32_POLYNOMIAL)
+        asm.label("crcbyte")
+        asm.ldrb(R4, R0)
+        asm.eors(R2, R4)
+        asm.movs(R5, 8)
+        asm.label("crcbit")
+        asm.lsrs(R2, R2, 1)
+        asm.b("crcnext", CC)
+        asm.eors(R2, R3)
+        asm.label("crcnext")
+        asm.subi(R5, 1)
+        asm.b("crcbit", NE)
+        asm.addi(R0, 1)
+        asm.subi(R1, 1)
+        asm.b("crcbyte", NE)
+        asm.mvns(R2, R2)
+        asm.str(R2, R7, MBX_ARGS)
+
+        asm.str(R6, R7, MBX_STATUS)
+        asm.pop(R4, R5, R6, R7, PC)
+
+        asm.label("timeout")
+        asm.movs(R0, STATUS_TIMEOUT)
+        asm.str(R0, R7, MBX_STATUS)
+        asm.pop(R4, R5, R6, R7, PC)
+
+
+Stage = namedtuple("Stage", "name count busy")
+
+
+class PipelineReport(namedtuple("PipelineReport", "pages elapsed stages overlapped")):
+    """Per-stage busy times of a `FlashPipeline` run.
+
+    `transfer` is time until the target holds the staged page, `program` is time spent waiting
+    for the flash controller (erase, write and on-target CRC), `verify` is the host-side comparison.
+
+    With `overlapped` runs, page data is still on the wire while the host waits for the applet,
+    so `transfer` only covers the host side and wire time shows up under `program`.
+    """
+    __slots__ = ()
+
+    def utilization(self):
+        return dict((s.name, (s.busy / self.elapsed) if self.elapsed else 0.0) for s in self.stages)
+
+    @property
+    def bottleneck(self):
+        """'link' or 'flash controller'; None for overlapped runs, whose stages can't be told apart.
+        """
+        if self.overlapped:
+            return None
+        busy = dict((s.name, s.busy) for s in self.stages)
+        return "link" if busy["transfer"] >= busy["program"] else "flash controller"
+
+
+class FlashPipeline(object):
+    """Programs flash page by page, overlapping the transfer of page N+1 with programming of page N.
+
+    Pages are staged in two alternating SRAM buffers; the flash applet copies a buffer into the
+    page buffer, waits for FSR.FRDY on-target and verifies the result by a CRC32 computed
+    on-target, so no page is ever read back over the link.
+
+    Overlapping relies on the link buffering the next page while the monitor runs the applet,
+    which USB CDC does but a plain UART doesn't; `overlap = None` picks it from `Port.buffered`.
+    Without overlap every transfer is confirmed by reading back the last word of the staged page.
+    """
+
+    STAGES = ("transfer", "program", "verify")
+
+    def __init__(self, samba, pageSize = None, staging = STAGING_ADDR, erase = True, verify = True,
+            overlap = None, timeout = 1.0, applet = None):
+        self.samba = samba
+        self._pageSize = pageSize
+        self.staging = staging
+        self.erase = erase
+        self.verify = verify
+        self.overlap = overlap if overlap is not None else getattr(samba._port, "buffered", False)
+        self.timeout = timeout
+        self.applet = applet if applet is not None else samba.applets.get(FlashApplet)
+
+    @property
+    def pageSize(self):
+        if self._pageSize is None:
+            self._pageSize = pageSize(self.samba)
+        return self._pageSize
+
+    def _pages(self, addr, data):
+        size = self.pageSize
+        if addr % size:
+            raise FlashError("Address 0x%08x is not page aligned." % addr)
+        if len(data) % size:
+            data = bytearray(data)
+            data.extend(b'\xff' * (size - len(data) % size))
+        return [data[offset : offset + size] for offset in range(0, len(data), size)]
+
+    def program(self, addr, data, crcs = None):
+        """Program `data` to flash starting at the page aligned address `addr`; returns a `PipelineReport`.
+
+        `crcs` are precomputed per-page CRC32s (see `atenka.imagecache`); page aligned `data` isn't copied.
+        """
+        pages = self._pages(addr, data)
+        size = self.pageSize
+        buffers = (self.staging, self.staging + size)
+        busy = dict.fromkeys(self.STAGES, 0.0)
+        counts = dict.fromkeys(self.STAGES, 0)
+
+        def transfer(idx):
+            start = time.time()
+            self.samba.sendFile(buffers[idx & 1], pages[idx])
+            if not self.overlap:
+                # Replies come in order, so this returns once the target has the whole page.
+                last = self.samba.readLong(buffers[idx & 1] + size - 4)
+                if last != struct.unpack_from("<L", bytes(pages[idx][-4 : ]))[0]:
+                    raise FlashError("Staging page %u failed (read back 0x%08x)." % (idx, last))
+            busy["transfer"] += time.time() - start
+            counts["transfer"] += 1
+
+        started = time.time()
+        self.applet.ensure()
+        transfer(0)
+        for idx, page in enumerate(pages):
+            pageAddr = addr + idx * size
+            hasNext = idx + 1 < len(pages)
+            start = time.time()
+            self.applet.start(FlashApplet.PROGRAM, buffers[idx & 1], pageAddr, pageAddr // size,
+                FlashApplet.ERASE if self.erase else 0, size >> 2)
+            busy["program"] += time.time() - start
+            if self.overlap and hasNext:
+                transfer(idx + 1)
+            start = time.time()
+            status, crc = self.applet.result(1, self.timeout)
+            busy["program"] += time.time() - start
+            counts["program"] += 1
+            if status == STATUS_TIMEOUT:
+                raise FlashError("Flash controller not ready programming page at 0x%08x." % pageAddr)
+            if status:
+                raise FlashError("Programming page at 0x%08x failed (FSR: 0x%08x)." % (pageAddr, status))
+            if not self.overlap and hasNext:
+                transfer(idx + 1)
+            if self.verify:
+                start = time.time()
+                if crc != (crcs[idx] if crcs is not None else crc32(page)):
+                    raise FlashError("Verification of page at 0x%08x failed." % pageAddr)
+                busy["verify"] += time.time() - start
+                counts["verify"] += 1
+        elapsed = time.time() - started
+        return PipelineReport(len(pages), elapsed, [Stage(name, counts[name], busy[name]) for name in self.STAGES],
+            self.overlap)
+
+    def programImage(self, image):
+        """Program a `CachedImage` straight from its mapping, verifying against its CRC table.
+        """
+        if image.pageSize != self.pageSize:
+            raise FlashError("Image prepared for %u byte pages, flash has %u." % (image.pageSize, self.pageSize))
+        return self.program(image.base, image.data, image.crcs)
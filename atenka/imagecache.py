@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Content-addressed cache of prepared firmware images.
+
+An image is read (raw binary or Intel HEX), flattened into a page-aligned binary padded with
+0xff, and stored together with its per-page CRC32 table and optional encoded forms in a single
+file named after the SHA-1 of the input and the preparation parameters. Entries are only ever
+created by an atomic rename and never modified afterwards, so any number of worker processes can
+mmap them read-only at the same time and hand out page views without copying.
+"""
+
+from collections import namedtuple
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+
+
+CACHE_VERSION   = 1
+CACHE_DIR       = os.path.join(os.path.expanduser("~"), ".atenka", "images")
+MAX_CACHE_SIZE  = 256 * 1024 * 1024
+
+MAGIC           = b"ATIC"
+HEADER          = struct.Struct("<4sLL")        # Magic, version, length of the JSON index.
+SECTION_ALIGN   = 4096
+
+ERASED          = 0xff
+
+
+class ImageError(Exception): pass
+
+
+CacheStats = namedtuple("CacheStats", "hits misses evictions entries size")
+
+
+def parseIntelHex(text):
+    """Segments [(address, bytearray)] of an Intel HEX file.
+    """
+    segments = []
+    upper = 0
+    for lineNo, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith(b":"):
+            raise ImageError("Line %u: missing start code." % lineNo)
+        try:
+            record = bytearray.fromhex(line[1 : ].decode("ascii"))
+        except ValueError:
+            raise ImageError("Line %u: invalid hex digits." % lineNo)
+        if len(record) < 5 or len(record) != record[0] + 5:
+            raise ImageError("Line %u: invalid record length." % lineNo)
+        if sum(record) & 0xff:
+            raise ImageError("Line %u: checksum mismatch." % lineNo)
+        length, offset, kind, data = record[0], (record[1] << 8) | record[2], record[3], record[4 : -1]
+        if kind == 0x00:
+            addr = upper + offset
+            if segments and segments[-1][0] + len(segments[-1][1]) == addr:
+                segments[-1][1].extend(data)
+            else:
+                segments.append((addr, bytearray(data)))
+        elif kind == 0x01:
+            break
+        elif kind == 0x02:
+            upper = ((data[0] << 8) | data[1]) << 4
+        elif kind == 0x04:
+            upper = ((data[0] << 8) | data[1]) << 16
+    return segments
+
+
+def flatten(segments, pageSize):
+    """(base address, page aligned binary) covering all `segments`, gaps filled with 0xff.
+    """
+    if not segments:
+        raise ImageError("Empty image.")
+    base = min(addr for addr, _ in segments) & ~(pageSize - 1)
+    end = max(addr + len(data) for addr, data in segments)
+    end = (end + pageSize - 1) & ~(pageSize - 1)
+    image = bytearray([ERASED]) * (end - base)
+    for addr, data in segments:
+        image[addr - base : addr - base + len(data)] = data
+    return base, image
+
+
+def _view(mm, offset, length):
+    try:
+        return memoryview(mm)[offset : offset + length]
+    except TypeError:
+        return buffer(mm, offset, length)   # Python 2: mmap has no new-style buffer interface.
+
+
+class CachedImage(object):
+    """Read-only, mmapped cache entry; `data`, `page()` and `encoded()` are zero-copy views.
+
+    On Python 2 the views are plain buffers and must not be used after `close()`.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.data = None
+        with open(filename, "rb") as inf:
+            self._mmap = mmap.mmap(inf.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, version, indexLength = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != CACHE_VERSION:
+            self.close()
+            raise ImageError("'%s' is not a valid cache entry." % filename)
+        self._index = json.loads(self._mmap[HEADER.size : HEADER.size + indexLength].decode("utf-8"))
+        self.base = self._index["base"]
+        self.pageSize = self._index["pageSize"]
+        self.pages = self._index["pages"]
+        self.data = self._section("data")
+        offset, length = self._index["sections"]["crcs"]
+        self.crcs = struct.unpack_from("<%uL" % self.pages, self._mmap, offset)
+
+    def _section(self, name):
+        offset, length = self._index["sections"][name]
+        return _view(self._mmap, offset, length)
+
+    def __len__(self):
+        return self.pages * self.pageSize
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def page(self, idx):
+        return _view(self._mmap, self._index["sections"]["data"][0] + idx * self.pageSize, self.pageSize)
+
+    @property
+    def encodings(self):
+        return sorted(name[len("encoded:") : ] for name in self._index["sections"] if name.startswith("encoded:"))
+
+    def encoded(self, name):
+        return self._section("encoded:" + name)
+
+    def close(self):
+        if self._mmap is not None:
+            if isinstance(self.data, memoryview):
+                self.data.release()
+            self.data = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass    # Views still handed out, the mapping goes away with them.
+            self._mmap = None
+
+
+def _write(filename, base, pageSize, image, encoded):
+    pages = len(image) // pageSize
+    sections = [("data", bytes(image)),
+        ("crcs", struct.pack("<%uL" % pages, *[zlib.crc32(bytes(image[offset : offset + pageSize])) & 0xffffffff
+            for offset in range(0, len(image), pageSize)]))]
+    sections.extend(("encoded:" + name, bytes(blob)) for name, blob in sorted(encoded.items()))
+    index = {"base": base, "pageSize": pageSize, "pages": pages, "sections": {}}
+    # The index size depends on the offsets it contains; lay out behind a generous upper bound.
+    offset = SECTION_ALIGN * (1 + (HEADER.size + 64 * (len(sections) + 4)) // SECTION_ALIGN)
+    for name, blob in sections:
+        index["sections"][name] = [offset, len(blob)]
+        offset += (len(blob) + SECTION_ALIGN - 1) & ~(SECTION_ALIGN - 1)
+    indexText = json.dumps(index).encode("utf-8")
+    if HEADER.size + len(indexText) > index["sections"]["data"][0]:
+        raise ImageError("Cache entry index too large.")
+    tmpName = "%s.%u.tmp" % (filename, os.getpid())
+    with open(tmpName, "wb") as outf:
+        outf.write(HEADER.pack(MAGIC, CACHE_VERSION, len(indexText)))
+        outf.write(indexText)
+        for name, blob in sections:
+            outf.seek(index["sections"][name][0])
+            outf.write(blob)
+    os.rename(tmpName, filename)
+
+
+class ImageCache(object):
+    """Size-bounded, least recently used cache of prepared images in `directory`.
+
+    `encoders` maps names to callables producing transfer-ready forms of the flattened binary
+    (e.g. ``{"zlib": zlib.compress}``); they are computed once, on a miss.
+    """
+
+    def __init__(self, directory = CACHE_DIR, maxSize = MAX_CACHE_SIZE):
+        self.directory = directory
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+    def key(self, content, pageSize, base = None, encoders = None):
+        digest = hashlib.sha1(content)
+        digest.update(("|%u|%u|%r|%s" % (CACHE_VERSION, pageSize, base,
+            ",".join(sorted(encoders or ())))).encode("ascii"))
+        return digest.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, "%s.img" % key)
+
+    def load(self, filename, pageSize, base = None, encoders = None):
+        """Cached image of `filename`; Intel HEX if it ends in '.hex', else raw binary located at `base`.
+        """
+        with open(filename, "rb") as inf:
+            content = inf.read()
+        if filename.lower().endswith(".hex"):
+            return self.get(content, pageSize, None, encoders, parseIntelHex)
+        return self.get(content, pageSize, base or 0, encoders)
+
+    def get(self, content, pageSize, base = 0, encoders = None, parser = None):
+        """Cached image of `content`, prepared on a miss; `parser` turns content into segments.
+        """
+        key = self.key(content, pageSize, base, encoders)
+        entry = self._filename(key)
+        if os.path.exists(entry):
+            try:
+                image = CachedImage(entry)
+            except (ImageError, ValueError, EnvironmentError):
+                pass    # Damaged, rebuild.
+            else:
+                self.hits += 1
+                os.utime(entry, None)
+                return image
+        self.misses += 1
+        segments = parser(content) if parser is not None else [(base, bytearray(content))]
+        imageBase, image = flatten(segments, pageSize)
+        encoded = dict((name, encoder(bytes(image))) for name, encoder in (encoders or {}).items())
+        _write(entry, imageBase, pageSize, image, encoded)
+        self.evict(keep = entry)
+        return CachedImage(entry)
+
+    def _entries(self):
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".img"):
+                continue
+            filename = os.path.join(self.directory, name)
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue    # Evicted by someone else.
+            result.append((st.st_mtime, st.st_size, filename))
+        return sorted(result)
+
+    def evict(self, keep = None):
+        """Remove least recently used entries until the cache fits `maxSize`.
+
+        Processes still mapping a removed entry keep their view (POSIX unlink semantics).
+        """
+        entries = self._entries()
+        size = sum(entry[1] for entry in entries)
+        for mtime, length, filename in entries:
+            if size <= self.maxSize:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            size -= length
+            self.evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        return CacheStats(self.hits, self.misses, self.evictions, len(entries), sum(entry[1] for entry in entries))
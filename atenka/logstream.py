@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Target-to-host log streaming from an SRAM ring buffer.
+
+The firmware provides a control block, followed by the buffer itself:
+
+    struct {
+        uint32_t magic;     /* LOG_MAGIC ('ATLG'). */
+        uint32_t size;      /* Buffer size in bytes. */
+        uint32_t head;      /* Write offset, advanced by the firmware. */
+        uint32_t tail;      /* Read offset, advanced by the host. */
+        uint8_t  buffer[];
+    };
+
+Records are newline terminated.
+"""
+
+import struct
+import time
+
+
+LOG_MAGIC   = 0x474C5441
+
+# Offsets.
+LOG_SIZE    = 0x04
+LOG_HEAD    = 0x08
+LOG_TAIL    = 0x0C
+LOG_BUFFER  = 0x10
+
+SRAM        = 0x20000000
+SRAM_SIZE   = 0x8000
+
+
+class LogStreamError(Exception): pass
+
+
+def locate(samba, start = SRAM, end = SRAM + SRAM_SIZE):
+    """Address of the first plausible control block in [`start`, `end`).
+    """
+    for addr in samba.search(start, end, struct.pack("<L", LOG_MAGIC)):
+        if addr & 3:
+            continue
+        size = samba.readLong(addr + LOG_SIZE)
+        if 0 < size and addr + LOG_BUFFER + size <= end:
+            return addr
+    raise LogStreamError("No log control block found in 0x%08x..0x%08x." % (start, end))
+
+
+class LogStream(object):
+    """Reads records from the ring buffer.
+
+    Every poll costs one `readLong` of the head index; new data is fetched with one 'R' transfer
+    (two if it wraps) and the tail is written back with `writeLong`, which has no reply.
+    The poll interval drops to `minInterval` while data arrives and doubles up to `maxInterval` while idle.
+    """
+
+    def __init__(self, samba, addr = None, minInterval = 0.001, maxInterval = 0.1, encoding = "utf-8"):
+        self.samba = samba
+        self.addr = addr if addr is not None else locate(samba)
+        if samba.readLong(self.addr) != LOG_MAGIC:
+            raise LogStreamError("No log control block at 0x%08x." % self.addr)
+        self.size = samba.readLong(self.addr + LOG_SIZE)
+        self.tail = samba.readLong(self.addr + LOG_TAIL)
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.encoding = encoding
+        self.interval = minInterval
+        self._partial = bytearray()
+
+    def _fetch(self, head):
+        buffer = self.addr + LOG_BUFFER
+        if head >= self.tail:
+            data = self.samba.receiveFile(buffer + self.tail, head - self.tail)
+        else:
+            data = self.samba.receiveFile(buffer + self.tail, self.size - self.tail)
+            data.extend(self.samba.receiveFile(buffer, head))
+        self.tail = head
+        self.samba.writeLong(self.addr + LOG_TAIL, head)
+        return data
+
+    def poll(self):
+        """Fetch whatever arrived and return the complete records.
+        """
+        head = self.samba.readLong(self.addr + LOG_HEAD)
+        if head >= self.size:
+            raise LogStreamError("Corrupted log control block (head: 0x%08x)." % head)
+        if head == self.tail:
+            self.interval = min(self.interval * 2, self.maxInterval)
+            return []
+        self.interval = self.minInterval
+        self._partial.extend(self._fetch(head))
+        lines = self._partial.split(b'\n')
+        self._partial = lines.pop()
+        return [bytes(line).decode(self.encoding, "replace") for line in lines]
+
+    def records(self, timeout = None):
+        """Generator yielding records as they arrive; stops after `timeout` seconds without data.
+        """
+        idleSince = time.time()
+        while True:
+            records = self.poll()
+            now = time.time()
+            if records:
+                idleSince = now
+                for record in records:
+                    yield record
+                continue
+            if timeout is not None and now - idleSince >= timeout:
+                return
+            time.sleep(self.interval)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+from collections import OrderedDict
+import struct
+
+
+class TargetMemory(object):
+    """Target memory as a Python sequence: ``mem[0x20000000:0x20000100]``, ``mem.u32[addr]``.
+
+    Reads go through a page cache with LRU eviction; runs of missing pages are fetched with a single
+    'R' transfer, and sequential misses read ahead `readAhead` pages, but only inside `regions`
+    ((start, end) address ranges known to be readable, e.g. flash and SRAM). Writes are buffered (and
+    reflected by subsequent reads) until `flush()`, which sends contiguous runs with `sendFile`.
+    The cache is not coherent with the target: `invalidate()` after the target changed memory.
+    """
+
+    def __init__(self, samba, pageSize = 256, maxPages = 256, readAhead = 4, maxPending = 4096, regions = ()):
+        self.samba = samba
+        self.pageSize = pageSize
+        self.regions = [((start + pageSize - 1) // pageSize, end // pageSize) for start, end in regions]
+        self.maxPages = maxPages
+        self.readAhead = readAhead
+        self.maxPending = maxPending
+        self._pages = OrderedDict()
+        self._pending = {}          # page -> {offset: value}
+        self._pendingCount = 0
+        self._lastMiss = None
+        self.hits = 0
+        self.misses = 0
+        self.transfers = 0
+        self.u8 = TypedView(self, "B")
+        self.u16 = TypedView(self, "H")
+        self.u32 = TypedView(self, "L")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def _fetch(self, first, count):
+        size = self.pageSize
+        data = self.samba.receiveFile(first * size, count * size)
+        self.transfers += 1
+        for idx in range(count):
+            page = bytearray(data[idx * size : (idx + 1) * size])
+            for offset, value in self._pending.get(first + idx, {}).items():
+                page[offset] = value
+            self._pages[first + idx] = page
+
+    def _evict(self):
+        while len(self._pages) > self.maxPages:
+            self._pages.popitem(last = False)
+
+    def _ensure(self, first, last):
+        """Make pages `first` .. `last` resident and return them as a dict.
+
+        Eviction happens only afterwards, so requests larger than the cache work (and leave only
+        their tail cached); read-ahead never goes beyond `maxPages` pages per transfer nor
+        beyond the end of the region it started in.
+        """
+        runs = []
+        for page in range(first, last + 1):
+            if page in self._pages:
+                self.hits += 1
+                self._pages[page] = self._pages.pop(page)     # Most recently used.
+                continue
+            self.misses += 1
+            if runs and runs[-1][0] + runs[-1][1] == page:
+                runs[-1][1] += 1
+            else:
+                runs.append([page, 1])
+        for start, count in runs:
+            if self._lastMiss is not None and start == self._lastMiss + 1:
+                limit = min(self.readAhead + (last + 1 - start), max(self.maxPages, last + 1 - start),
+                    self._regionEnd(start, last) - start)
+                while count < limit and (start + count) not in self._pages:
+                    count += 1
+            self._fetch(start, count)
+            self._lastMiss = start + count - 1
+        pages = dict((page, self._pages[page]) for page in range(first, last + 1))
+        self._evict()
+        return pages
+
+    def _regionEnd(self, page, last):
+        """Page behind the region containing `page`; `last` + 1 outside of all regions.
+        """
+        for low, high in self.regions:
+            if low <= page < high:
+                return max(high, last + 1)
+        return last + 1
+
+    def _range(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1) or key.start is None or key.stop is None:
+                raise IndexError("Only contiguous slices with explicit bounds are supported.")
+            return key.start, key.stop - key.start
+        return key, 1
+
+    def read(self, addr, length):
+        if length <= 0:
+            return bytearray()
+        size = self.pageSize
+        first, last = addr // size, (addr + length - 1) // size
+        pages = self._ensure(first, last)
+        result = bytearray()
+        for page in range(first, last + 1):
+            data = pages[page]
+            start = addr - page * size if page == first else 0
+            stop = addr + length - page * size if page == last else size
+            result.extend(data[start : stop])
+        return result
+
+    def write(self, addr, data):
+        size = self.pageSize
+        for idx, value in enumerate(bytearray(data)):
+            page, offset = divmod(addr + idx, size)
+            pending = self._pending.setdefault(page, {})
+            if offset not in pending:
+                self._pendingCount += 1
+            pending[offset] = value
+            if page in self._pages:
+                self._pages[page][offset] = value
+        if self._pendingCount >= self.maxPending:
+            self.flush()
+
+    def __getitem__(self, key):
+        addr, length = self._range(key)
+        data = self.read(addr, length)
+        return data if isinstance(key, slice) else data[0]
+
+    def __setitem__(self, key, value):
+        addr, length = self._range(key)
+        if isinstance(key, slice):
+            if len(value) != length:
+                raise ValueError("Slice assignment can't change the size of target memory.")
+            self.write(addr, value)
+        else:
+            self.write(addr, bytearray([value]))
+
+    def flush(self):
+        """Send pending writes, one `sendFile` per contiguous run.
+        """
+        size = self.pageSize
+        addresses = sorted(page * size + offset for page, offsets in self._pending.items() for offset in offsets)
+        runStart = None
+        run = bytearray()
+        for addr in addresses:
+            if runStart is not None and addr != runStart + len(run):
+                self.samba.sendFile(runStart, run)
+                runStart, run = None, bytearray()
+            if runStart is None:
+                runStart = addr
+            page, offset = divmod(addr, size)
+            run.append(self._pending[page][offset])
+        if run:
+            self.samba.sendFile(runStart, run)
+        self._pending = {}
+        self._pendingCount = 0
+
+    def invalidate(self):
+        """Drop all cached pages (pending writes are kept).
+        """
+        self._pages.clear()
+        self._lastMiss = None
+
+
+class TypedView(object):
+    """Little-endian integer access to a `TargetMemory`, e.g. ``mem.u32[addr]`` or ``mem.u32[start:stop]``.
+    """
+
+    def __init__(self, memory, fmt):
+        self.memory = memory
+        self.fmt = fmt
+        self.size = struct.calcsize("<" + fmt)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            count = (key.stop - key.start) // self.size
+            data = self.memory.read(key.start, count * self.size)
+            return struct.unpack("<%u%s" % (count, self.fmt), bytes(data))
+        return struct.unpack("<" + self.fmt, bytes(self.memory.read(key, self.size)))[0]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            self.memory.write(key.start, struct.pack("<%u%s" % (len(value), self.fmt), *value))
+        else:
+            self.memory.write(key, struct.pack("<" + self.fmt, value))
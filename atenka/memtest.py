@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+On-target memory fill and memory tests.
+
+Everything runs inside a `MemTestApplet`: only the test parameters are written to the mailbox,
+only the failure summary (count, first failing address, expected/actual value, failing data bits)
+comes back. Tests are sequences of march elements, each one pass over the region that reads and/or
+writes every word, ascending or descending. The pattern tests are a plain write pass followed by
+a read pass; `marchCMinus` is the March C- algorithm.
+"""
+
+from collections import namedtuple
+import struct
+
+from atenka.applet import Applet, R0, R1, R2, R3, R4, R5, R6, R7, LR, PC, CC, CS, EQ, LS, NE, PL, \
+    MBX_ARGS, MBX_STATUS, STATUS_OK, APPLET_ADDR, APPLET_REGION_END
+from atenka.flash import STAGING_ADDR, STAGING_SIZE
+from atenka.watch import HASH_TABLE_ADDR
+
+
+TEST_CHUNK      = 0x10000       # Bytes per applet call.
+
+SRAM            = 0x20000000
+
+# RAM the monitor and the tools rely on, never touched by a test.
+RESERVED = (
+    (SRAM, APPLET_ADDR, "monitor"),
+    (APPLET_ADDR, APPLET_REGION_END, "applet area"),
+    (HASH_TABLE_ADDR, STAGING_ADDR, "hash table"),
+    (STAGING_ADDR, STAGING_ADDR + STAGING_SIZE, "flash staging buffers"),
+)
+
+# Value of the word at address `a` (data background).
+MODE_CONSTANT   = 0     # pattern
+MODE_ALTERNATE  = 1     # pattern or ~pattern, alternating from word to word
+MODE_ADDRESS    = 2     # a ^ pattern
+MODE_WALKING    = 3     # (1 << ((a >> 2) % 32)) ^ pattern
+
+# Mailbox result words, behind the arguments.
+RES_FAILURES    = MBX_ARGS + 20
+RES_ADDRESS     = MBX_ARGS + 24
+RES_EXPECTED    = MBX_ARGS + 28
+RES_ACTUAL      = MBX_ARGS + 32
+RES_BITS        = MBX_ARGS + 36
+
+
+class MemTestError(Exception): pass
+
+
+class MemTestResult(namedtuple("MemTestResult", "name failures address expected actual bits")):
+    """Summary of all mismatches of a test; `address`, `expected` and `actual` describe the first one.
+    """
+    __slots__ = ()
+
+    @property
+    def passed(self):
+        return self.failures == 0
+
+
+class MemTestApplet(Applet):
+    """Runs one march element over a word-aligned region.
+
+    Arguments:  start address, end address, mode (MODE_*), pattern, flags.
+    Results:    arguments[5] number of mismatches, arguments[6] first failing address,
+                arguments[7] expected and arguments[8] actual value there,
+                arguments[9] OR of all failing bits.
+    Status:     STATUS_OK.
+
+    Every word is read and compared (READ), then written (WRITE). INVERT complements the value;
+    an element that both reads and writes writes the complement of what it reads.
+    """
+    NAME = "memtest"
+
+    ELEMENT = 1
+
+    # Element flags.
+    READ    = 0x01
+    WRITE   = 0x02
+    DOWN    = 0x04      # Descending addresses.
+    INVERT  = 0x08
+
+    def _flag(self, asm, flag, skip):
+        """Branch to `skip` unless `flag` is set in R4.
+        """
+        asm.lsrs(R6, R4, flag.bit_length())
+        asm.b(skip, CC)
+
+    def _value(self, asm):
+        """R5 <- value of the word at R0.
+        """
+        asm.cmpi(R3, MODE_ADDRESS)
+        asm.b("address", EQ)
+        asm.cmpi(R3, MODE_WALKING)
+        asm.b("walking", EQ)
+        asm.lsls(R5, R2, 0)
+        asm.cmpi(R3, MODE_ALTERNATE)
+        asm.b("valued", NE)
+        asm.lsls(R6, R0, 29)                # N <- address bit 2.
+        asm.b("valued", PL)
+        asm.mvns(R5, R5)
+        asm.b("valued")
+        asm.label("address")
+        asm.lsls(R5, R0, 0)
+        asm.eors(R5, R2)
+        asm.b("valued")
+        asm.label("walking")
+        asm.lsls(R6, R0, 25)
+        asm.lsrs(R6, R6, 27)
+        asm.movs(R5, 1)
+        asm.lslsr(R5, R6)
+        asm.eors(R5, R2)
+        asm.label("valued")
+
+    def build(self, asm):
+        asm.push(R4, R5, R6, R7, LR)
+        asm.ldrConst(R7, self.mailbox)
+        asm.movs(R0, 0)
+        for offset in (RES_FAILURES, RES_ADDRESS, RES_EXPECTED, RES_ACTUAL, RES_BITS):
+            asm.str(R0, R7, offset)
+        asm.ldr(R0, R7, MBX_ARGS + 0)
+        asm.ldr(R1, R7, MBX_ARGS + 4)
+        asm.ldr(R3, R7, MBX_ARGS + 8)
+        asm.ldr(R2, R7, MBX_ARGS + 12)
+        asm.ldr(R4, R7, MBX_ARGS + 16)
+
+        self._flag(asm, MemTestApplet.DOWN, "up")
+        asm.lsls(R6, R0, 0)                 # Descending: R0 runs from end down to start.
+        asm.lsls(R0, R1, 0)
+        asm.lsls(R1, R6, 0)
+        asm.label("down")
+        asm.cmp(R0, R1)
+        asm.b("exit", LS)
+        asm.subi(R0, 4)
+        asm.b("body")
+        asm.label("up")
+        asm.cmp(R0, R1)
+        asm.b("exit", CS)
+
+        asm.label("body")
+        self._value(asm)
+        self._flag(asm, MemTestApplet.INVERT, "inverted")
+        asm.mvns(R5, R5)
+        asm.label("inverted")
+        self._flag(asm, MemTestApplet.READ, "write")
+        asm.ldr(R6, R0)
+        asm.cmp(R6, R5)
+        asm.b("matched", EQ)
+        asm.push(R0, R1)                    # Mismatch, R0/R1 serve as scratch.
+        asm.ldr(R1, R7, RES_FAILURES)
+        asm.cmpi(R1, 0)
+        asm.b("counted", NE)
+        asm.str(R0, R7, RES_ADDRESS)
+        asm.str(R5, R7, RES_EXPECTED)
+        asm.str(R6, R7, RES_ACTUAL)
+        asm.label("counted")
+        asm.addi(R1, 1)
+        asm.str(R1, R7, RES_FAILURES)
+        asm.eors(R6, R5)
+        asm.ldr(R1, R7, RES_BITS)
+        asm.orrs(R1, R6)
+        asm.str(R1, R7, RES_BITS)
+        asm.pop(R0, R1)
+        asm.label("matched")
+        asm.mvns(R5, R5)
+        asm.label("write")
+        self._flag(asm, MemTestApplet.WRITE, "next")
+        asm.str(R5, R0)
+
+        asm.label("next")
+        self._flag(asm, MemTestApplet.DOWN, "ascending")
+        asm.b("down")
+        asm.label("ascending")
+        asm.addi(R0, 4)
+        asm.b("up")
+
+        asm.label("exit")
+        asm.movs(R0, STATUS_OK)
+        asm.str(R0, R7, MBX_STATUS)
+        asm.pop(R4, R5, R6, R7, PC)
+
+
+def _checkRegion(samba, start, end):
+    allocator = samba.applets.allocator
+    for low, high, name in ((allocator.start, allocator.end, "applet area"), ) + RESERVED:
+        if start < high and end > low:
+            raise MemTestError("Region 0x%08x..0x%08x overlaps the %s (0x%08x..0x%08x)." %
+                (start, end, name, low, high))
+
+
+def run(samba, elements, start, end, mode, pattern, name = None, applet = None, timeout = 5.0):
+    """Run the march `elements` (combinations of MemTestApplet.READ/WRITE/DOWN/INVERT) in turn
+    over the word-aligned region [`start`, `end`).
+
+    Returns a `MemTestResult` summarising all mismatches.
+    """
+    if start & 3 or end & 3:
+        raise MemTestError("Region 0x%08x..0x%08x is not word aligned." % (start, end))
+    _checkRegion(samba, start, end)
+    if applet is None:
+        applet = samba.applets.get(MemTestApplet)
+    applet.ensure()
+    pattern &= 0xffffffff
+    failures, address, expected, actual, bits = 0, None, None, None, 0
+    chunks = [(offset, min(end, offset + TEST_CHUNK)) for offset in range(start, end, TEST_CHUNK)]
+    for flags in elements:
+        for low, high in (reversed(chunks) if flags & MemTestApplet.DOWN else chunks):
+            reply = applet.call(MemTestApplet.ELEMENT, low, high, mode, pattern, flags, count = 10,
+                timeout = timeout)
+            if reply[6] and not failures:
+                address, expected, actual = reply[7 : 10]
+            failures += reply[6]
+            bits |= reply[10]
+    return MemTestResult(name or "memtest", failures, address, expected, actual, bits)
+
+
+def fill(samba, addr, length, pattern):
+    """Fill `length` bytes from `addr` with `pattern`, a 32-bit integer (little endian) or 1, 2 or 4 bytes.
+
+    The aligned middle part is filled by the applet, unaligned head and tail bytes are written by the host.
+    """
+    _checkRegion(samba, addr, addr + length)
+    if isinstance(pattern, (bytes, bytearray, list, tuple)):
+        pattern = bytearray(pattern)
+        if len(pattern) not in (1, 2, 4):
+            raise ValueError("Fill pattern must be 1, 2 or 4 bytes.")
+        pattern = pattern * (4 // len(pattern))
+    else:
+        pattern = bytearray(struct.pack("<L", pattern & 0xffffffff))
+    shift = addr & 3                    # Rotate, so that `addr` receives pattern[0].
+    pattern = struct.unpack("<L", bytes(pattern[4 - shift : ] + pattern[ : 4 - shift]))[0]
+    end = addr + length
+    start, stop = (addr + 3) & ~3, end & ~3
+    if start >= stop:
+        start = stop = end
+    batch = samba.batch()
+    for position in list(range(addr, start)) + list(range(stop, end)):
+        batch.writeByte(position, (pattern >> (8 * (position & 3))) & 0xff)
+    if len(batch):
+        batch.execute()
+    if start < stop:
+        run(samba, (MemTestApplet.WRITE, ), start, stop, MODE_CONSTANT, pattern, "fill")
+
+
+def _combine(name, results):
+    failures = sum(r.failures for r in results)
+    first = ([r for r in results if r.failures] or [MemTestResult(name, 0, None, None, None, 0)])[0]
+    bits = 0
+    for r in results:
+        bits |= r.bits
+    return MemTestResult(name, failures, first.address, first.expected, first.actual, bits)
+
+
+FILL_VERIFY = (MemTestApplet.WRITE, MemTestApplet.READ)
+
+
+def walkingOnes(samba, start, end, **kws):
+    """Fill/verify with ``1 << ((a >> 2) % 32)`` in the word at `a`, then the complement (walking zeros).
+    """
+    return _combine("walking-ones", [run(samba, FILL_VERIFY, start, end, MODE_WALKING, pattern,
+        **kws) for pattern in (0x00000000, 0xffffffff)])
+
+
+def addressInAddress(samba, start, end, **kws):
+    """Fill/verify with each word's own address, then its complement.
+    """
+    return _combine("address-in-address", [run(samba, FILL_VERIFY, start, end, MODE_ADDRESS, pattern,
+        **kws) for pattern in (0x00000000, 0xffffffff)])
+
+
+def checkerboard(samba, start, end, **kws):
+    """Fill/verify with alternating 0x55555555/0xaaaaaaaa words, then inverted.
+    """
+    return _combine("checkerboard", [run(samba, FILL_VERIFY, start, end, MODE_ALTERNATE, pattern,
+        **kws) for pattern in (0x55555555, 0xaaaaaaaa)])
+
+
+MARCH_C_MINUS = (
+    MemTestApplet.WRITE,                                                            # (w0)
+    MemTestApplet.READ | MemTestApplet.WRITE,                                       # up (r0, w1)
+    MemTestApplet.READ | MemTestApplet.WRITE | MemTestApplet.INVERT,                # up (r1, w0)
+    MemTestApplet.DOWN | MemTestApplet.READ | MemTestApplet.WRITE,                  # down (r0, w1)
+    MemTestApplet.DOWN | MemTestApplet.READ | MemTestApplet.WRITE | MemTestApplet.INVERT,   # down (r1, w0)
+    MemTestApplet.READ,                                                             # (r0)
+)
+
+
+def marchCMinus(samba, start, end, mode = MODE_CONSTANT, pattern = 0, **kws):
+    """March C- (10n): finds stuck-at, transition, address decoder and unlinked coupling faults.
+
+    "0" is the data background given by `mode` and `pattern`, "1" its complement.
+    """
+    return run(samba, MARCH_C_MINUS, start, end, mode, pattern, "march-c-", **kws)
+
+
+TESTS = (marchCMinus, walkingOnes, addressInAddress, checkerboard)
+
+
+def memoryTest(samba, start, end, tests = TESTS, **kws):
+    """Run `tests` over [`start`, `end`); returns their `MemTestResult`s.
+    """
+    return [test(samba, start, end, **kws) for test in tests]
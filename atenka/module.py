@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+from collections import namedtuple, OrderedDict
+import struct
+import threading
+
+from atenka.bitfield import Decoder, DecodedRegister
+
+
+ACC_RW  = 0 # Read/Write access.
+ACC_RO  = 1 # Read-only access.
+ACC_WO  = 2 # Write-only access.
+
+Register = namedtuple('Register', 'offset description decoder')
+GPIORegister = namedtuple('Register', 'offset description decoder access extInterface')
+SvdRegister = namedtuple('Register', 'offset description decoder access size resetValue fields')
+Field = namedtuple('Field', 'name offset width description access')
+
+# A run of registers without gaps, covered by a single block read.
+Range = namedtuple('Range', 'offset length names')
+
+
+class InterfaceNotSupportedError(Exception): pass
+class RegisterNotDefinedError(Exception): pass
+class ModuleInstanceNotAvailable(Exception): pass
+
+
+class SingletonBase(object):
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kws):
+        # Double-Checked Locking
+        if not hasattr(cls, '_instance'):
+            try:
+                cls._lock.acquire()
+                if not hasattr(cls, '_instance'):
+                    cls._instance = super(SingletonBase, cls).__new__(cls)
+            finally:
+                cls._lock.release()
+        return cls._instance
+
+
+def registerSize(reg):
+    return getattr(reg, "size", 4)
+
+
+def layout(registers):
+    """Register names sorted by offset, the sorted offsets and the contiguous `Range`s.
+    """
+    order = sorted(registers, key = lambda name: registers[name].offset)
+    ranges = []
+    for name in order:
+        reg = registers[name]
+        last = ranges[-1] if ranges else None
+        if last is not None and last.offset + last.length == reg.offset:
+            ranges[-1] = Range(last.offset, last.length + registerSize(reg), last.names + (name, ))
+        else:
+            ranges.append(Range(reg.offset, registerSize(reg), (name, )))
+    return tuple(order), tuple(registers[name].offset for name in order), tuple(ranges)
+
+
+class Module(SingletonBase):
+    NAME = None
+    EXTRAS = []
+    BASE_ADDRESS = None
+    REGISTERS = {}
+    FIELDS = {}     # Register name -> `Field`s, for registers without own field metadata.
+    ENUMS = {}      # Register name -> {field name -> {value -> label}}.
+
+    def __init__(self, samba):
+        self.samba = samba
+
+    @classmethod
+    def layout(cls):
+        """(ORDER, OFFSETS, RANGES) of the module, computed once per class unless precompiled.
+        """
+        if "RANGES" not in cls.__dict__:
+            cls.ORDER, cls.OFFSETS, cls.RANGES = layout(cls.REGISTERS)
+        return cls.ORDER, cls.OFFSETS, cls.RANGES
+
+    @classmethod
+    def decoder(cls, name):
+        """`Decoder` of register `name`, built once per class.
+        """
+        if "_decoders" not in cls.__dict__:
+            cls._decoders = {}
+        if name not in cls._decoders:
+            fields = getattr(cls.REGISTERS[name], "fields", None) or cls.FIELDS.get(name, ())
+            cls._decoders[name] = Decoder(fields, cls.ENUMS.get(name))
+        return cls._decoders[name]
+
+
+UNIT_FORMATS = {1: "<B", 2: "<H", 4: "<L"}
+UNIT_READS = {1: "readByte", 2: "readWord", 4: "readLong"}
+MAX_OUTSTANDING = 32    # Replies in flight per exchange, bounded by the input buffer of the port.
+
+
+def readRegisters(samba, mod, blockReads = False):
+    """Read all registers of `mod` in one batch; returns an OrderedDict (by offset) name -> value.
+
+    Registers are read one by one (with their natural access size) unless `blockReads` is set,
+    then every contiguous range is fetched by a single 'R' transfer. Buffered ports pipeline up to
+    `MAX_OUTSTANDING` reads, plain serial ports wait for each reply (see `Batch`).
+    """
+    order, offsets, ranges = mod.layout()
+    batch = samba.batch()
+    values = {}
+    if blockReads:
+        for rng in ranges:
+            batch.receiveFile(mod.BASE_ADDRESS + rng.offset, rng.length)
+        for rng, data in zip(ranges, batch.execute(window = MAX_OUTSTANDING)):
+            position = 0
+            for name in rng.names:
+                size = registerSize(mod.REGISTERS[name])
+                values[name] = struct.unpack_from(UNIT_FORMATS[size], bytes(data), position)[0]
+                position += size
+    else:
+        for name in order:
+            getattr(batch, UNIT_READS[registerSize(mod.REGISTERS[name])])(mod.BASE_ADDRESS + mod.REGISTERS[name].offset)
+        values = dict(zip(order, batch.execute(window = MAX_OUTSTANDING)))
+    return OrderedDict((name, values[name]) for name in order)
+
+
+def decodeRegisters(mod, values):
+    """`DecodedRegister`s for `values` as returned by `readRegisters`.
+    """
+    result = []
+    for name, value in values.items():
+        reg = mod.REGISTERS[name]
+        result.append(DecodedRegister(name, mod.BASE_ADDRESS + reg.offset, value, reg.description,
+            mod.decoder(name).describe(value)))
+    return result
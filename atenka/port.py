@@ -26,23 +26,74 @@ __copyright__ = """
   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
 
+import os
+import select
+import time
+
 import serial
 
-class TimeoutError(Exception): pass
+try:
+    import termios
+except ImportError:
+    termios = None
+
+# Device names of USB CDC ACM ports (Linux, macOS).
+USB_CDC_PREFIXES = ("ttyACM", "cu.usbmodem", "tty.usbmodem")
+
+
+class TimeoutError(Exception):
+    """Fewer bytes than requested arrived in time; `data` holds those that did.
+    """
+
+    def __init__(self, message, data = b''):
+        super(TimeoutError, self).__init__(message)
+        self.data = bytearray(data)
+
 
 class Port(object):
+    """Serial connection to the monitor.
 
-    def __init__(self, name):
+    Where the tty's file descriptor is available (POSIX), reads wait on it with poll/select and return
+    as soon as the requested number of bytes has arrived; the per-call deadline is derived from the
+    link speed instead of a fixed timer.
+    """
+
+    def __init__(self, name, baudrate = 115200, timeout = 0.0125):
         self.opened = False
+        self.name = name
+        self.timeout = timeout
         try:
-            self._port = serial.Serial(port = name, baudrate = 115200, bytesize = 8, timeout = 0.0125, writeTimeout = 1.0)
+            self._port = serial.Serial(port = name, baudrate = baudrate, bytesize = 8, timeout = timeout, writeTimeout = 1.0)
         except serial.SerialException as e:
-            print str(e)
+            print(str(e))
             self.opened = False
             raise
         else:
             self.opened = True
-            
+        self._fd = self._fileno()
+        self._poller = None
+        if self._fd is not None:
+            if hasattr(select, "poll"):
+                self._poller = select.poll()
+                self._poller.register(self._fd, select.POLLIN)
+            self._tune()
+
+    def _fileno(self):
+        try:
+            return self._port.fileno()
+        except (AttributeError, NotImplementedError, serial.SerialException):
+            return None
+
+    def _tune(self):
+        """VMIN = VTIME = 0: the driver hands out whatever is there, waiting is left to poll/select.
+        """
+        if termios is None:
+            return
+        attrs = termios.tcgetattr(self._fd)
+        attrs[6][termios.VMIN] = 0
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+
     def __del__(self):
         self.close()
 
@@ -54,19 +105,81 @@ class Port(object):
     def write(self, data):
         self._port.write(data)
         
-    def read(self, length):
+    def deadline(self, length):
+        """Time allowed for `length` bytes: the basic timeout plus the time on the wire (10 bits per byte).
+        """
+        return self.timeout + length * 10.0 / self.baudrate
+
+    def _wait(self, timeout):
+        if self._poller is not None:
+            return bool(self._poller.poll(timeout * 1000.0))
+        return bool(select.select([self._fd], [], [], timeout)[0])
+
+    def _readFd(self, length, timeout):
+        result = bytearray()
+        deadline = time.time() + timeout
+        while len(result) < length:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._wait(remaining):
+                break
+            data = os.read(self._fd, length - len(result))
+            if not data:
+                break
+            result.extend(data)
+        return result
+
+    def _readSerial(self, length, timeout):
+        result = bytearray()
+        deadline = time.time() + timeout
+        while len(result) < length and time.time() < deadline:
+            result.extend(self._port.read(length - len(result)))
+        return result
+
+    def read(self, length, timeout = None):
+        """Read `length` bytes, returning as soon as all of them arrived.
+
+        `timeout` defaults to `deadline(length)`; if fewer bytes arrive in time `TimeoutError`
+        is raised, carrying the partial data.
+        """
         if length == 0:
             return bytearray()
-        data = self._port.read(length)
-        if len(data) == 0:
-            raise TimeoutError("Error on read operation. Requested %d bytes got %d" % (length, len(data)))
-        return bytearray(data)
-        
+        if timeout is None:
+            timeout = self.deadline(length)
+        if self._fd is not None:
+            data = self._readFd(length, timeout)
+        else:
+            data = self._readSerial(length, timeout)
+        if len(data) < length:
+            raise TimeoutError("Error on read operation. Requested %d bytes got %d" % (length, len(data)), data)
+        return data
+
     def flush(self):
         self._port.flush()
         self._port.flushOutput()
         self._port.flushInput()
 
+    def drain(self):
+        """Wait until all output is written, keeping pending input.
+        """
+        self._port.flush()
+
+    @property
+    def buffered(self):
+        """True for USB CDC ACM devices, which keep buffering input while the monitor runs an applet.
+        """
+        name = os.path.basename(str(self.name))
+        return name.startswith(USB_CDC_PREFIXES)
+
+    @property
+    def baudrate(self):
+        return self._port.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self._port.baudrate = value
+        if self._fd is not None:
+            self._tune()     # pyserial rewrites the termios settings.
+
 """
     cmd = Command(port)
     cmd.nonInteractive()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Host-side profiling.
+
+`profiled()` activates a `Profiler` for a block of code; `phase()` marks what the code is doing
+(connect, identify, transfer, decode, output, ...) and costs next to nothing if no profiler is
+active. Every phase gets its own cProfile, so the results written by `Profiler.write()`:
+
+    <basename>.prof     combined pstats dump (snakeviz, pstats, ...),
+    <basename>.folded   collapsed stacks rooted at the phase names, for flamegraph.pl,
+                        speedscope, inferno and friends,
+
+can be broken down by phase. Wall and CPU time per phase are collected as well.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+
+PHASES = ("connect", "identify", "transfer", "decode", "output")
+TOPLEVEL = "other"              # Code outside of any phase.
+MAX_DEPTH = 64
+
+cpuTime = getattr(time, "process_time", None) or time.clock
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_PHASE = _NullPhase()
+
+_active = None
+
+
+def phase(name):
+    """Context manager attributing the enclosed code to phase `name` of the active profiler, if any.
+    """
+    if _active is None:
+        return NULL_PHASE
+    return _active.phase(name)
+
+
+class Profiler(object):
+    """cProfile data and inclusive wall/CPU times per phase.
+    """
+
+    def __init__(self):
+        self.profiles = OrderedDict()
+        self.timings = OrderedDict()        # phase -> [calls, wall, cpu]
+        self._stack = []
+
+    def _profile(self, name):
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+        return self.profiles[name]
+
+    def _switch(self, name):
+        if self._stack:
+            self.profiles[self._stack[-1]].disable()
+        if name is not None:
+            self._profile(name).enable()
+
+    def start(self):
+        self._stack = [TOPLEVEL]
+        self._started = (time.time(), cpuTime())
+        self._profile(TOPLEVEL).enable()
+
+    def stop(self):
+        self._profile(self._stack[-1]).disable()
+        self._account(TOPLEVEL, *self._started)
+        self._stack = []
+
+    def _account(self, name, wall, cpu):
+        entry = self.timings.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += time.time() - wall
+        entry[2] += cpuTime() - cpu
+
+    @contextmanager
+    def phase(self, name):
+        self._switch(name)
+        self._stack.append(name)
+        wall, cpu = time.time(), cpuTime()
+        try:
+            yield self
+        finally:
+            self._account(name, wall, cpu)
+            self._switch(None)
+            self._stack.pop()
+            if self._stack:
+                self.profiles[self._stack[-1]].enable()
+
+    def stats(self):
+        """Combined `pstats.Stats` of all phases, None if nothing was recorded.
+        """
+        profiles = [profile for profile in self.profiles.values() if profile.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1 : ]:
+            stats.add(profile)
+        return stats
+
+    def folded(self):
+        """Collapsed stack lines ('phase;frame;frame <microseconds>'), derived from the caller graph.
+
+        cProfile only records caller/callee pairs, so time of functions with several callers is split
+        proportionally; recursion is cut off.
+        """
+        lines = []
+        for name, profile in self.profiles.items():
+            if not profile.getstats():
+                continue
+            stats = pstats.Stats(profile).stats
+            callees = {}
+            for func, (cc, nc, tt, ct, callers) in stats.items():
+                for caller, edge in callers.items():
+                    callees.setdefault(caller, []).append((func, edge[3]))
+            for func, entry in stats.items():
+                if not entry[4]:                # Root, caller not profiled.
+                    self._fold(stats, callees, func, [name], 1.0, lines)
+        return lines
+
+    def _fold(self, stats, callees, func, stack, scale, lines):
+        frame = _frameName(func)
+        if frame in stack or len(stack) > MAX_DEPTH:
+            return
+        frames = stack + [frame]
+        micros = int(stats[func][2] * scale * 1e6)
+        if micros > 0:
+            lines.append("%s %u" % (";".join(frames), micros))
+        for callee, edgeTime in callees.get(func, ()):
+            calleeTime = stats[callee][3]
+            if calleeTime > 0 and edgeTime * scale >= 1e-6:
+                self._fold(stats, callees, callee, frames, scale * edgeTime / calleeTime, lines)
+
+    def summary(self):
+        """Per-phase timing table, as lines of text.
+        """
+        lines = ["%-10s %6s %10s %10s" % ("Phase", "Calls", "Wall [s]", "CPU [s]")]
+        for name, (calls, wall, cpu) in self.timings.items():
+            lines.append("%-10s %6u %10.4f %10.4f" % (name, calls, wall, cpu))
+        return lines
+
+    def write(self, basename):
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(basename + ".prof")
+        with open(basename + ".folded", "w") as outf:
+            outf.write("\n".join(self.folded()) + "\n")
+
+
+def _frameName(func):
+    filename, line, name = func
+    if filename == "~":
+        return name.replace(";", ",")
+    return ("%s:%u:%s" % (os.path.basename(filename), line, name)).replace(";", ",")
+
+
+@contextmanager
+def profiled(basename = None, stream = None):
+    """Profile the enclosed block; if `basename` is given, write the results and a summary (to `stream`, default stderr).
+
+    Yields the `Profiler`, or None if `basename` is None and profiling is therefore off.
+    """
+    global _active
+
+    if basename is None:
+        yield None
+        return
+    profiler = Profiler()
+    previous, _active = _active, profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active = previous
+        profiler.write(basename)
+        stream = stream or sys.stderr
+        stream.write("\n".join(profiler.summary()) + "\n")
+        stream.write("Profile written to '%s.prof' and '%s.folded'.\n" % (basename, basename))
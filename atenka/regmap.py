@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Register maps compiled from CMSIS-SVD(-like) XML descriptions into `Module` classes.
+
+Compiling parses the XML and precomputes, per peripheral, the registers sorted by offset and the
+contiguous register ranges; the result is cached on disk, keyed by the SHA-1 of the XML file,
+so later runs don't parse XML at all.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+
+from atenka.module import ACC_RW, ACC_RO, ACC_WO, SvdRegister, Field, Range, Module, layout
+
+
+CACHE_VERSION   = 1
+CACHE_DIR       = os.path.join(os.path.expanduser("~"), ".atenka", "regmaps")
+
+ACCESS = {
+    "read-only":        ACC_RO,
+    "write-only":       ACC_WO,
+    "read-write":       ACC_RW,
+    "writeOnce":        ACC_WO,
+    "read-writeOnce":   ACC_RW,
+}
+
+
+class RegisterMapError(Exception): pass
+
+
+def _text(element, tag, default = None):
+    child = element.find(tag)
+    return child.text.strip() if child is not None and child.text else default
+
+
+def _int(text, default = None):
+    if text is None:
+        return default
+    text = text.strip().lower()
+    if text.startswith("#"):
+        return int(text[1 : ].replace("x", "0"), 2)
+    if text.startswith("0b"):
+        return int(text[2 : ], 2)
+    return int(text, 0)
+
+
+def _fields(register, access):
+    result = []
+    fields = register.find("fields")
+    for field in (fields.findall("field") if fields is not None else []):
+        bitRange = _text(field, "bitRange")
+        if _text(field, "bitOffset") is not None:
+            lsb = _int(_text(field, "bitOffset"))
+            width = _int(_text(field, "bitWidth"), 1)
+        elif _text(field, "lsb") is not None:
+            lsb = _int(_text(field, "lsb"))
+            width = _int(_text(field, "msb")) - lsb + 1
+        elif bitRange is not None:
+            msb, lsb = [int(x) for x in re.match(r"\[(\d+):(\d+)\]", bitRange).groups()]
+            width = msb - lsb + 1
+        else:
+            raise RegisterMapError("Field '%s' without bit position." % _text(field, "name"))
+        result.append([_text(field, "name"), lsb, width, _text(field, "description", ""),
+            ACCESS.get(_text(field, "access"), access)])
+    return result
+
+
+def _registers(peripheral, defaults):
+    result = []
+    registers = peripheral.find("registers")
+    for register in (registers.findall("register") if registers is not None else []):
+        name = _text(register, "name")
+        offset = _int(_text(register, "addressOffset"))
+        size = _int(_text(register, "size"), defaults["size"]) // 8
+        access = ACCESS.get(_text(register, "access"), defaults["access"])
+        reset = _int(_text(register, "resetValue"), defaults["resetValue"])
+        description = " ".join(_text(register, "description", "").split())
+        fields = _fields(register, access)
+        dim = _int(_text(register, "dim"))
+        if dim is None:
+            result.append([name, offset, description, access, size, reset, fields])
+            continue
+        increment = _int(_text(register, "dimIncrement"))
+        indices = (_text(register, "dimIndex") or ",".join(str(x) for x in range(dim))).split(",")
+        if "-" in indices[0] and len(indices) == 1:
+            first, last = [int(x) for x in indices[0].split("-")]
+            indices = [str(x) for x in range(first, last + 1)]
+        for idx, index in enumerate(indices):
+            result.append([name.replace("[%s]", index).replace("%s", index), offset + idx * increment,
+                description, access, size, reset, fields])
+    return result
+
+
+def compileSvd(text):
+    """Compile SVD text into plain (JSON serialisable) data, one entry per peripheral.
+    """
+    try:
+        device = ElementTree.fromstring(text)
+    except ElementTree.ParseError as e:
+        raise RegisterMapError(str(e))
+    deviceDefaults = {
+        "size":         _int(_text(device, "size"), 32),
+        "access":       ACCESS.get(_text(device, "access"), ACC_RW),
+        "resetValue":   _int(_text(device, "resetValue"), 0),
+    }
+    peripherals = OrderedDict()
+    for peripheral in device.iter("peripheral"):
+        name = _text(peripheral, "name")
+        defaults = {
+            "size":         _int(_text(peripheral, "size"), deviceDefaults["size"]),
+            "access":       ACCESS.get(_text(peripheral, "access"), deviceDefaults["access"]),
+            "resetValue":   _int(_text(peripheral, "resetValue"), deviceDefaults["resetValue"]),
+        }
+        registers = _registers(peripheral, defaults)
+        derivedFrom = peripheral.get("derivedFrom")
+        if not registers and derivedFrom:
+            if derivedFrom not in peripherals:
+                raise RegisterMapError("Peripheral '%s' derived from unknown '%s'." % (name, derivedFrom))
+            registers = peripherals[derivedFrom]["registers"]
+        regs = dict((reg[0], SvdRegister(reg[1], reg[2], None, reg[3], reg[4], reg[5], ())) for reg in registers)
+        order, offsets, ranges = layout(regs)
+        peripherals[name] = {
+            "name":         name,
+            "description":  " ".join(_text(peripheral, "description", "").split()),
+            "base":         _int(_text(peripheral, "baseAddress")),
+            "registers":    registers,
+            "order":        list(order),
+            "offsets":      list(offsets),
+            "ranges":       [[rng.offset, rng.length, list(rng.names)] for rng in ranges],
+        }
+    return {"version": CACHE_VERSION, "peripherals": list(peripherals.values())}
+
+
+def _modules(data):
+    result = OrderedDict()
+    for peripheral in data["peripherals"]:
+        registers = {}
+        for name, offset, description, access, size, reset, fields in peripheral["registers"]:
+            registers[str(name)] = SvdRegister(offset, description, None, access, size, reset,
+                tuple(Field(str(f[0]), f[1], f[2], f[3], f[4]) for f in fields))
+        name = str(peripheral["name"])
+        result[name] = type(str("Mod%s" % name), (Module, ), {
+            "NAME":         name,
+            "DESCRIPTION":  peripheral["description"],
+            "BASE_ADDRESS": peripheral["base"],
+            "REGISTERS":    registers,
+            "ORDER":        tuple(str(x) for x in peripheral["order"]),
+            "OFFSETS":      tuple(peripheral["offsets"]),
+            "RANGES":       tuple(Range(r[0], r[1], tuple(str(x) for x in r[2])) for r in peripheral["ranges"]),
+        })
+    return result
+
+
+def load(filename, cacheDir = CACHE_DIR):
+    """Load a register map; returns an OrderedDict peripheral name -> `Module` class.
+
+    Pass ``cacheDir = None`` to bypass the cache.
+    """
+    with open(filename, "rb") as inf:
+        text = inf.read()
+    cacheFile = None
+    if cacheDir is not None:
+        cacheFile = os.path.join(cacheDir, "%s.json" % hashlib.sha1(text).hexdigest())
+        try:
+            with open(cacheFile) as inf:
+                data = json.load(inf)
+            if data.get("version") == CACHE_VERSION:
+                return _modules(data)
+        except (IOError, OSError, ValueError):
+            pass
+    data = compileSvd(text)
+    if cacheFile is not None:
+        try:
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            tmpName = "%s.%u" % (cacheFile, os.getpid())
+            with open(tmpName, "w") as outf:
+                json.dump(data, outf)
+            os.rename(tmpName, cacheFile)
+        except (IOError, OSError):
+            pass    # Caching is an optimisation only.
+    return _modules(data)
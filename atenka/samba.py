@@ -31,6 +31,16 @@ import struct
 import logging
 from optparse import OptionParser, OptionGroup
 import os
+import time
+
+from atenka.applet import AppletManager, forget
+from atenka.bitfield import Decoder
+from atenka.encoder import CommandEncoder
+from atenka.memory import TargetMemory
+from atenka.memtest import fill
+from atenka.module import ACC_RO, Field
+from atenka.search import searchOnTarget, scan
+from atenka.port import TimeoutError
 
 
 MAX_PAYLOAD = 4000  # 4096
@@ -95,6 +105,282 @@ PVR     = 0x4FC         # Version Register.
 Info = namedtuple("Info", "name description")
 DeviceCapabilities = namedtuple("DeviceCapabilities", "friendlyName nvpType architecture sramSize nvpSize0 nvpSize1 processor version ext package lcd usb usbfull aes")
 
+FRIENDLY_NAMES = {
+    0xAB0B0AE0: "ATSAM4LC8C",
+    0xAB0A09E0: "ATSAM4LC4C",
+    0xAB0A07E0: "ATSAM4LC2C",
+    0xAB0B0AE0: "ATSAM4LC8B",
+    0xAB0A09E0: "ATSAM4LC4B",
+    0xAB0A07E0: "ATSAM4LC2B",
+    0xAB0B0AE0: "ATSAM4LC8A",
+    0xAB0A09E0: "ATSAM4LC4A",
+    0xAB0A07E0: "ATSAM4LC2A",
+    0xAB0B0AE0: "ATSAM4LS8C",
+    0xAB0A09E0: "ATSAM4LS4C",
+    0xAB0A07E0: "ATSAM4LS2C",
+    0xAB0B0AE0: "ATSAM4LS8B",
+    0xAB0A09E0: "ATSAM4LS4B",
+    0xAB0A07E0: "ATSAM4LS2B",
+    0xAB0B0AE0: "ATSAM4LS8A",
+    0xAB0A09E0: "ATSAM4LS4A",
+    0xAB0A07E0: "ATSAM4LS2A",
+}
+
+NVP_TYPES = {
+    0: Info("ROM", "ROM"),
+    1: Info("ROMLESS", "ROMless or on-chip Flash"),
+    4: Info("SRAM", "SRAM emulating ROM"),
+    2: Info("FLASH", "Embedded Flash Memory"),
+    3: Info("ROM_FLASH", "ROM and Embedded Flash Memory"),   ## NVPSIZ is ROM size, NVPSIZ2 is Flash size
+}
+
+ARCHS = {
+    0x19: Info("AT91SAM9xx", "AT91SAM9xx Series"),
+    0x29: Info("AT91SAM9XExx", "AT91SAM9XExx Series"),
+    0x34: Info("AT91x34", "AT91x34 Series"),
+    0x37: Info("CAP7", "CAP7 Series"),
+    0x39: Info("CAP9", "CAP9 Series"),
+    0x3B: Info("CAP11", "CAP11 Series"),
+    0x40: Info("AT91x40", "AT91x40 Series"),
+    0x42: Info("AT91x42", "AT91x42 Series"),
+    0x55: Info("AT91x55", "AT91x55 Series"),
+    0x60: Info("AT91SAM7Axx", "AT91SAM7Axx Series"),
+    0x61: Info("AT91SAM7AQxx", "AT91SAM7AQxx Series"),
+    0x63: Info("AT91x63", "AT91x63 Series"),
+    0x70: Info("AT91SAM7Sxx", "AT91SAM7Sxx Series"),
+    0x71: Info("AT91SAM7XCxx", "AT91SAM7XCxx Series"),
+    0x72: Info("AT91SAM7SExx", "AT91SAM7SExx Series"),
+    0x73: Info("AT91SAM7Lxx", "AT91SAM7Lxx Series"),
+    0x75: Info("AT91SAM7Xxx", "AT91SAM7Xxx Series"),
+    0x76: Info("AT91SAM7SLxx", "AT91SAM7SLxx Series"),
+    0x80: Info("SAM3UxC", "SAM3UxC Series (100-pin version)"),
+    0x81: Info("SAM3UxE", "SAM3UxE Series (144-pin version)"),
+    0x83: Info("SAM3AxC/SAM4AxC", "SAM3AxC/SAM4AxC Series (100-pin version)"),
+    0x84: Info("SAM3XxC/SAM4XxC", "SAM3XxC/SAM4XxC Series (100-pin version)"),
+    0x85: Info("SAM3XxE/SAM4XxE", "SAM3XxE/SAM4XxE Series (144-pin version)"),
+    0x86: Info("SAM3XxG/SAM4XxG", "SAM3XxG/SAM4XxG Series (208/217-pin version)"),
+    0x88: Info("SAM3SxA/SAM4SxA", "SAM3SxA/SAM4SxA Series (48-pin version)"),
+    0x89: Info("SAM3SxB/SAM4SxB", "SAM3SxB/SAM4SxB Series (64-pin version)"),
+    0x8A: Info("SAM3SxC/SAM4SxC", "SAM3SxC/SAM4SxC Series (100-pin version)"),
+    0x92: Info("AT91x92", "AT91x92 Series"),
+    0x93: Info("SAM3NxA", "SAM3NxA Series (48-pin version)"),
+    0x94: Info("SAM3NxB", "SAM3NxB Series (64-pin version)"),
+    0x95: Info("SAM3NxC", "SAM3NxC Series (100-pin version)"),
+    0x99: Info("SAM3SDxB", "SAM3SDxB Series (64-pin version)"),
+    0x9A: Info("SAM3SDxC", "SAM3SDxC Series (100-pin version)"),
+    0xA5: Info("SAM5A", "SAM5A"),
+    0xB0: Info("SAM4L", "SAM4Lxx Series"),
+    0xF0: Info("AT75Cxx", "AT75Cxx Series"),
+}
+
+SRAM_SIZES = {
+    0:  Info("48K", "48K bytes"),
+    1:  Info("1K", "1K bytes"),
+    2:  Info("2K", "2K bytes"),
+    3:  Info("6K", "6K bytes"),
+    4:  Info("24K", "24K bytes"),
+    5:  Info("4K", "4K bytes"),
+    6:  Info("80K", "80K bytes"),
+    7:  Info("160K", "160K bytes"),
+    8:  Info("8K", "8K bytes"),
+    9:  Info("16K", "16K bytes"),
+    10: Info("32K", "32K bytes"),
+    11: Info("64K", "64K bytes"),
+    12: Info("128K", "128K bytes"),
+    13: Info("256K", "256K bytes"),
+    14: Info("96K", "96K bytes"),
+    15: Info("512K", "512K bytes"),
+}
+
+NVP_SIZES2 = {
+    0:  Info("None", "None"),
+    1:  Info("8K", "8K bytes"),
+    2:  Info("16K", "16K bytes"),
+    3:  Info("32K", "32K bytes"),
+    4:  Info("Reserved", "Reserved"),
+    5:  Info("64K", "64K bytes"),
+    6:  Info("Reserved", "Reserved"),
+    7:  Info("128K", "128K bytes"),
+    8:  Info("Reserved", "Reserved"),
+    9:  Info("256K", "56K bytes"),
+    10: Info("512K", "512K bytes"),
+    11: Info("Reserved", "Reserved"),
+    12: Info("1024K", "1024K bytes"),
+    13: Info("Reserved", "Reserved"),
+    14: Info("2048K", "2048K bytes"),
+    15: Info("Reserved", "Reserved"),
+}
+
+EPROCS = {
+    1: Info("ARM946ES", "ARM946ES"),
+    2: Info("ARM7TDMI", "ARM7TDMI"),
+    3: Info("CM3", "Cortex-M3"),
+    4: Info("ARM920T", "ARM920T"),
+    5: Info("ARM926EJS", "ARM926EJS"),
+    6: Info("CA5", "Cortex-A5"),
+    7: Info("CM4", "Cortex-M4"),
+}
+
+NVP_SIZES = {
+    0:  Info("NONE", "None"),
+    1:  Info("8K", "8K bytes"),
+    2:  Info("16K", "16K bytes"),
+    3:  Info("32K", "32K bytes"),
+    4:  Info("Reserved", "Reserved"),
+    5:  Info("64K", "64K bytes"),
+    6:  Info("Reserved", "Reserved"),
+    7:  Info("128K", "128K bytes"),
+    8:  Info("Reserved", "Reserved"),
+    9:  Info("256K", "256K bytes"),
+    10: Info("512K", "512K bytes"),
+    11: Info("Reserved", "Reserved"),
+    12: Info("1024K", "1024K bytes"),
+    13: Info("Reserved", "Reserved"),
+    14: Info("2048K", "2048K bytes"),
+    15: Info("Reserved", "Reserved"),
+}
+
+PACKAGES = {
+    0: "24-pin",
+    1: "32-pin",
+    2: "48-pin",
+    3: "64-pin",
+    4: "100-pi",
+    5: "144-pin",
+}
+
+CHIP_ID = Decoder((
+    Field("VERSION",    0,  5, "Version of the Device", ACC_RO),
+    Field("EPROC",      5,  3, "Embedded Processor", ACC_RO),
+    Field("NVPSIZ",     8,  4, "Nonvolatile Program Memory Size", ACC_RO),
+    Field("NVPSIZ2",    12, 4, "Second Nonvolatile Program Memory Size", ACC_RO),
+    Field("SRAMSIZ",    16, 4, "Internal SRAM Size", ACC_RO),
+    Field("ARCH",       20, 8, "Architecture Identifier", ACC_RO),
+    Field("NVPTYP",     28, 3, "Nonvolatile Program Memory Type", ACC_RO),
+    Field("EXT",        31, 1, "Extension Flag", ACC_RO),
+), {
+    "EPROC":    EPROCS,
+    "NVPSIZ":   NVP_SIZES,
+    "NVPSIZ2":  NVP_SIZES2,
+    "SRAMSIZ":  SRAM_SIZES,
+    "ARCH":     ARCHS,
+    "NVPTYP":   NVP_TYPES,
+})
+
+EX_ID = Decoder((
+    Field("AES",        0,  1, "AES", ACC_RO),
+    Field("USB",        1,  1, "USB", ACC_RO),
+    Field("USBFULL",    2,  1, "USB Full Speed", ACC_RO),
+    Field("LCD",        3,  1, "LCD", ACC_RO),
+    Field("PACKAGE",    24, 3, "Package Type", ACC_RO),
+), {
+    "PACKAGE":  PACKAGES,
+})
+
+
+class Batch(object):
+    """Commands queued for one pipelined exchange with the monitor.
+
+    On buffered ports (USB CDC) all frames are written back to back and the replies, which the monitor
+    sends in order, are collected afterwards. A plain UART can't take input while the monitor is sending,
+    so there each reply is read before the next command goes out. `execute()` returns one result per
+    queued command (None for writes).
+    """
+
+    def __init__(self, samba):
+        self._samba = samba
+        self._commands = []     # ([(frame, payload, reply length)], unit): unit is None for writes.
+
+    def __len__(self):
+        return len(self._commands)
+
+    def _queue(self, frame, reply = None):
+        self._commands.append(([(bytes(frame), None, reply[0] if reply else 0)], reply and reply[1]))
+
+    def _writeUnit(self, cmd, addr, value, dlen):
+        forget(self._samba, addr, dlen)
+        self._queue(self._samba._encoder.writeUnit(cmd, addr, value, dlen))
+
+    def _readUnit(self, cmd, addr, dlen):
+        self._queue(self._samba._encoder.readUnit(cmd, addr, dlen), (dlen, True))
+
+    def writeLong(self, addr, l):
+        self._writeUnit(Samba.WRITE_WORD, addr, l, 4)
+
+    def readLong(self, addr):
+        self._readUnit(Samba.READ_WORD, addr, 4)
+
+    def writeWord(self, addr, w):
+        self._writeUnit(Samba.WRITE_HALF_WORD, addr, w, 2)
+
+    def readWord(self, addr):
+        self._readUnit(Samba.READ_HALF_WORD, addr, 2)
+
+    def writeByte(self, addr, b):
+        self._writeUnit(Samba.WRITE_OCTET, addr, b, 1)
+
+    def readByte(self, addr):
+        self._readUnit(Samba.READ_OCTET, addr, 1)
+
+    def sendFile(self, addr, data):
+        """Queue a write of `data`; command and payload go out in separate writes (see `Samba.sendFile`).
+        """
+        data = bytearray(data)
+        forget(self._samba, addr, len(data))
+        steps = []
+        for offset in range(0, len(data), MAX_PAYLOAD):
+            chunk = data[offset : offset + MAX_PAYLOAD]
+            steps.append((bytes(self._samba._encoder.transfer(Samba.WRITE, addr + offset, len(chunk))), chunk, 0))
+        self._commands.append((steps, None))
+
+    def receiveFile(self, addr, length):
+        steps = []
+        for offset in range(0, length, MAX_PAYLOAD):
+            chunk = min(MAX_PAYLOAD, length - offset)
+            steps.append((bytes(self._samba._encoder.transfer(Samba.READ, addr + offset, chunk)), None, chunk))
+        self._commands.append((steps, False))
+
+    def execute(self, timeout = 1.0, window = None):
+        """Run the queued commands; on buffered ports at most `window` replies (all if None) are outstanding.
+        """
+        port = self._samba._port
+        if not getattr(port, "buffered", False):
+            window = 1
+        replies = [bytearray() for _ in self._commands]
+        output = bytearray()
+        outstanding = []
+
+        def collect():
+            if output:
+                port.write(output)
+                del output[ : ]
+            for idx, length in outstanding:
+                replies[idx].extend(self._samba._readReply(length, timeout))
+            del outstanding[ : ]
+
+        for idx, (steps, unit) in enumerate(self._commands):
+            for frame, payload, length in steps:
+                output.extend(frame)
+                if payload is not None:
+                    port.write(output)
+                    del output[ : ]
+                    port.drain()
+                    port.write(payload)
+                    port.drain()
+                if length:
+                    outstanding.append((idx, length))
+                    if window is not None and len(outstanding) >= window:
+                        collect()
+        collect()
+        results = []
+        for (steps, unit), data in zip(self._commands, replies):
+            if unit is None:
+                results.append(None)
+            else:
+                results.append(self._samba._encoder.decodeUnit(data, len(data)) if unit else data)
+        self._commands = []
+        return results
+
 
 class Samba(object):
     """Interface to ATMEL SAM-BA bootloaders.
@@ -112,34 +398,55 @@ class Samba(object):
     READ = 'R'
     GO = 'G'
 
-    def __init__(self, port):
+    def __init__(self, port, progress = None):
         self._port = port
+        self.progress = progress    # Called as progress(Samba.WRITE / Samba.READ, addr, length) per chunk.
         self._interactive = None
+        self._encoder = CommandEncoder()
+        self._applets = None
         self._port.flush()
 
     def __del__(self):
         self._port.close()
 
+    def batch(self):
+        """Queue commands for a single pipelined exchange, see `Batch`.
+        """
+        return Batch(self)
+
     def writeCmd(self, cmd):
-        self._port.write("%s%s" % (cmd, TERM))
+        self._port.write(self._encoder.command(cmd))
 
-    def _readUnit(self, cmd, addr, dlen):
-        self._port.write("%s%08X,%u%s" % (cmd, addr, dlen, TERM))
-        data = self._port.read(dlen)
-        return int(struct.unpack("<L" if dlen == 4 else "H" if dlen == 2 else "B" if dlen == 1 else None, ''.join([chr(x) for x in data]))[0])
+    def _readReply(self, length, timeout = None):
+        """Read a reply of `length` bytes.
+
+        Without `timeout` this is a plain port read; otherwise the reply may take up to `timeout` seconds,
+        e.g. because the monitor is busy running an applet.
+        """
+        if timeout is None:
+            return self._port.read(length)
+        deadline = time.time() + timeout
+        result = bytearray()
+        while len(result) < length:
+            try:
+                result.extend(self._port.read(length - len(result)))
+            except TimeoutError as e:
+                result.extend(e.data)
+                if len(result) < length and time.time() >= deadline:
+                    raise TimeoutError("Error on read operation. Requested %d bytes got %d" % (length, len(result)), result)
+        return result
+
+    def _readUnit(self, cmd, addr, dlen, timeout = None):
+        self._port.write(self._encoder.readUnit(cmd, addr, dlen))
+        data = self._readReply(dlen, timeout)
+        return self._encoder.decodeUnit(data, dlen)
 
     def _writeUnit(self, cmd, addr, value, dlen):
-        MASKS = {
-            1: (0x000000ff, "%02X"),
-            2: (0x0000ffff, "%04X"),
-            4: (0xffffffff, "%08X"),
-        }
-        data = ("%s" % MASKS[dlen][1]) % (value & MASKS[dlen][0])
-        #print("%s%08X,%s%s" % (cmd, addr, data, TERM))
-        self._port.write("%s%08X,%s%s" % (cmd, addr, data, TERM))
+        forget(self, addr, dlen)
+        self._port.write(self._encoder.writeUnit(cmd, addr, value, dlen))
 
     def writeCmdParams(self, cmd, *params):
-        self._port.write("%s%s" % (cmd, TERM))
+        self._port.write(self._encoder.command(cmd))
         for param in params:
             pass
 
@@ -157,8 +464,8 @@ class Samba(object):
     def writeLong(self, addr, l):
         self._writeUnit(Samba.WRITE_WORD, addr, l, 4)
 
-    def readLong(self, addr):
-        return self._readUnit(self.READ_WORD, addr, 4)
+    def readLong(self, addr, timeout = None):
+        return self._readUnit(self.READ_WORD, addr, 4, timeout)
 
     def writeWord(self, addr, w):
         self._writeUnit(Samba.WRITE_HALF_WORD, addr, w, 2)
@@ -173,11 +480,13 @@ class Samba(object):
         return self._readUnit(self.READ_OCTET, addr, 1)
 
     def _write(self, addr, length, data):
-        print "Writing {0} bytes...".format(length)
-        self._port.write("%s%08X,%08X%s" % (Samba.WRITE, addr, length, TERM))
+        forget(self, addr, length)
+        self._port.write(self._encoder.transfer(Samba.WRITE, addr, length))
         self._port.flush()
-        self._port.write(data)
+        self._port.write(data if isinstance(data, (bytes, bytearray)) else bytearray(data))
         self._port.flush()
+        if self.progress is not None:
+            self.progress(Samba.WRITE, addr, length)
 
     def sendFile(self, addr, data):
         """
@@ -189,7 +498,7 @@ class Samba(object):
         // port object's flush method before writing the data.
         """
         length = len(data)
-        loops = length / MAX_PAYLOAD
+        loops = length // MAX_PAYLOAD
         bytesRemaining = length % MAX_PAYLOAD
         addrOffset = addr
         dataOffsetFrom = 0
@@ -215,24 +524,87 @@ class Samba(object):
             #self._port.write(bytearray(dslice))
             #print "addr", addrOffset
 
-    def receiveFile(self, addr, length):
-        loops = length / MAX_PAYLOAD
+    def receiveFile(self, addr, length, timeout = None):
+        loops = length // MAX_PAYLOAD
         bytesRemaining = length % MAX_PAYLOAD
         offset = addr
         result = bytearray()
         for l in range(loops):
-            self._port.write("%s%08X,%08X%s" % (Samba.READ, offset, MAX_PAYLOAD, TERM))
-            data = self._port.read(length)
+            self._port.write(self._encoder.transfer(Samba.READ, offset, MAX_PAYLOAD))
+            data = self._readReply(MAX_PAYLOAD, timeout)
             result.extend(data)
+            if self.progress is not None:
+                self.progress(Samba.READ, offset, len(data))
             offset += MAX_PAYLOAD
         if bytesRemaining:
-            self._port.write("%s%08X,%08X%s" % (Samba.READ, offset, bytesRemaining, TERM))
-            data = self._port.read(bytesRemaining)
+            self._port.write(self._encoder.transfer(Samba.READ, offset, bytesRemaining))
+            data = self._readReply(bytesRemaining, timeout)
             result.extend(data)
+            if self.progress is not None:
+                self.progress(Samba.READ, offset, len(data))
         return result
 
+    def resync(self, length = MAX_PAYLOAD, limit = 5.0):
+        """Drop the rest of a partially received reply of up to `length` bytes, e.g. after a `TimeoutError`.
+
+        Input is discarded until the line has been quiet for the time `length` bytes take on the wire
+        (only one transfer of at most `MAX_PAYLOAD` bytes is ever outstanding); raises `TimeoutError`
+        if it doesn't settle within `limit` seconds.
+        """
+        quiet = self._port.deadline(min(length, MAX_PAYLOAD))
+        deadline = time.time() + limit
+        self._port.drain()
+        while True:
+            try:
+                self._port.read(MAX_PAYLOAD, quiet)
+            except TimeoutError as e:
+                if not e.data:
+                    return
+            if time.time() >= deadline:
+                raise TimeoutError("Line didn't settle within %.1f s." % limit)
+
+    @property
+    def applets(self):
+        """`AppletManager` of this connection.
+        """
+        if self._applets is None:
+            self._applets = AppletManager(self)
+        return self._applets
+
+    def memory(self, **kws):
+        """Cached view of target memory, see `TargetMemory`; read-ahead defaults to `memoryRegions()`.
+        """
+        if "regions" not in kws:
+            kws["regions"] = self.memoryRegions()
+        return TargetMemory(self, **kws)
+
+    def memoryRegions(self):
+        """(start, end) of flash and SRAM, as far as the chip ID tells.
+        """
+        info = self.chipInfo()
+        regions = []
+        for base, size in ((0, info.nvpSize0), (SRAM, info.sramSize)):
+            name = getattr(size, "name", "")
+            if name.endswith("K"):
+                regions.append((base, base + int(name[ : -1]) * 1024))
+        return regions
+
+    def search(self, start, end, pattern, mask = None, onTarget = True):
+        """Addresses of all occurrences of `pattern` in [`start`, `end`); bits cleared in `mask` are don't-cares.
+
+        The search runs as an applet unless `onTarget` is false, then the region is streamed to the host.
+        """
+        if onTarget:
+            return list(searchOnTarget(self, start, end, pattern, mask))
+        return list(scan(self, start, end, pattern, mask))
+
+    def fill(self, addr, length, pattern):
+        """Fill `length` bytes from `addr` with `pattern` on-target, see `atenka.memtest.fill`.
+        """
+        fill(self, addr, length, pattern)
+
     def go(self, addr):
-        self._port.write("%s%08X" % (Samba.GO, addr))
+        self._port.write(self._encoder.go(Samba.GO, addr))
         self._port.flush()
 
     def chipId(self):
@@ -242,195 +614,27 @@ class Samba(object):
         return self.readLong(EX_ID_ADDR)
 
     def chipInfo(self):
-        EXT     = 0x80000000
-        NVPTYP  = 0x70000000
-        ARCH    = 0x0ff00000
-        SRAMSIZ = 0x000f0000
-        NVPSIZ2  =0x0000f000
-        NVPSIZ  = 0x00000f00
-        EPROC   = 0x000000e0
-        VERSION = 0x0000001f
-
-        PACKAGE = 0x07000000
-        LCD     = 0x00000008
-        USBFULL = 0x00000004
-        USB     = 0x00000002
-        AES     = 0x00000001
-
         chipId = self.chipId()
-
-        FriendlyNames = {
-            0xAB0B0AE0: "ATSAM4LC8C",
-            0xAB0A09E0: "ATSAM4LC4C",
-            0xAB0A07E0: "ATSAM4LC2C",
-            0xAB0B0AE0: "ATSAM4LC8B",
-            0xAB0A09E0: "ATSAM4LC4B",
-            0xAB0A07E0: "ATSAM4LC2B",
-            0xAB0B0AE0: "ATSAM4LC8A",
-            0xAB0A09E0: "ATSAM4LC4A",
-            0xAB0A07E0: "ATSAM4LC2A",
-            0xAB0B0AE0: "ATSAM4LS8C",
-            0xAB0A09E0: "ATSAM4LS4C",
-            0xAB0A07E0: "ATSAM4LS2C",
-            0xAB0B0AE0: "ATSAM4LS8B",
-            0xAB0A09E0: "ATSAM4LS4B",
-            0xAB0A07E0: "ATSAM4LS2B",
-            0xAB0B0AE0: "ATSAM4LS8A",
-            0xAB0A09E0: "ATSAM4LS4A",
-            0xAB0A07E0: "ATSAM4LS2A",
-        }
-
-
-        NvpTypes = {
-            0: Info("ROM", "ROM"),
-            1: Info("ROMLESS", "ROMless or on-chip Flash"),
-            4: Info("SRAM", "SRAM emulating ROM"),
-            2: Info("FLASH", "Embedded Flash Memory"),
-            3: Info("ROM_FLASH", "ROM and Embedded Flash Memory"),   ## NVPSIZ is ROM size, NVPSIZ2 is Flash size
-        }
-
-        Archs = {
-            0x19: Info("AT91SAM9xx", "AT91SAM9xx Series"),
-            0x29: Info("AT91SAM9XExx", "AT91SAM9XExx Series"),
-            0x34: Info("AT91x34", "AT91x34 Series"),
-            0x37: Info("CAP7", "CAP7 Series"),
-            0x39: Info("CAP9", "CAP9 Series"),
-            0x3B: Info("CAP11", "CAP11 Series"),
-            0x40: Info("AT91x40", "AT91x40 Series"),
-            0x42: Info("AT91x42", "AT91x42 Series"),
-            0x55: Info("AT91x55", "AT91x55 Series"),
-            0x60: Info("AT91SAM7Axx", "AT91SAM7Axx Series"),
-            0x61: Info("AT91SAM7AQxx", "AT91SAM7AQxx Series"),
-            0x63: Info("AT91x63", "AT91x63 Series"),
-            0x70: Info("AT91SAM7Sxx", "AT91SAM7Sxx Series"),
-            0x71: Info("AT91SAM7XCxx", "AT91SAM7XCxx Series"),
-            0x72: Info("AT91SAM7SExx", "AT91SAM7SExx Series"),
-            0x73: Info("AT91SAM7Lxx", "AT91SAM7Lxx Series"),
-            0x75: Info("AT91SAM7Xxx", "AT91SAM7Xxx Series"),
-            0x76: Info("AT91SAM7SLxx", "AT91SAM7SLxx Series"),
-            0x80: Info("SAM3UxC", "SAM3UxC Series (100-pin version)"),
-            0x81: Info("SAM3UxE", "SAM3UxE Series (144-pin version)"),
-            0x83: Info("SAM3AxC/SAM4AxC", "SAM3AxC/SAM4AxC Series (100-pin version)"),
-            0x84: Info("SAM3XxC/SAM4XxC", "SAM3XxC/SAM4XxC Series (100-pin version)"),
-            0x85: Info("SAM3XxE/SAM4XxE", "SAM3XxE/SAM4XxE Series (144-pin version)"),
-            0x86: Info("SAM3XxG/SAM4XxG", "SAM3XxG/SAM4XxG Series (208/217-pin version)"),
-            0x88: Info("SAM3SxA/SAM4SxA", "SAM3SxA/SAM4SxA Series (48-pin version)"),
-            0x89: Info("SAM3SxB/SAM4SxB", "SAM3SxB/SAM4SxB Series (64-pin version)"),
-            0x8A: Info("SAM3SxC/SAM4SxC", "SAM3SxC/SAM4SxC Series (100-pin version)"),
-            0x92: Info("AT91x92", "AT91x92 Series"),
-            0x93: Info("SAM3NxA", "SAM3NxA Series (48-pin version)"),
-            0x94: Info("SAM3NxB", "SAM3NxB Series (64-pin version)"),
-            0x95: Info("SAM3NxC", "SAM3NxC Series (100-pin version)"),
-            0x99: Info("SAM3SDxB", "SAM3SDxB Series (64-pin version)"),
-            0x9A: Info("SAM3SDxC", "SAM3SDxC Series (100-pin version)"),
-            0xA5: Info("SAM5A", "SAM5A"),
-            0xB0: Info("SAM4L", "SAM4Lxx Series"),
-            0xF0: Info("AT75Cxx", "AT75Cxx Series"),
-        }
-
-        SRamSizes = {
-            0:  Info("48K", "48K bytes"),
-            1:  Info("1K", "1K bytes"),
-            2:  Info("2K", "2K bytes"),
-            3:  Info("6K", "6K bytes"),
-            4:  Info("24K", "24K bytes"),
-            5:  Info("4K", "4K bytes"),
-            6:  Info("80K", "80K bytes"),
-            7:  Info("160K", "160K bytes"),
-            8:  Info("8K", "8K bytes"),
-            9:  Info("16K", "16K bytes"),
-            10: Info("32K", "32K bytes"),
-            11: Info("64K", "64K bytes"),
-            12: Info("128K", "128K bytes"),
-            13: Info("256K", "256K bytes"),
-            14: Info("96K", "96K bytes"),
-            15: Info("512K", "512K bytes"),
-        }
-
-        NvpSiz2s = {
-            0:  Info("None", "None"),
-            1:  Info("8K", "8K bytes"),
-            2:  Info("16K", "16K bytes"),
-            3:  Info("32K", "32K bytes"),
-            4:  Info("Reserved", "Reserved"),
-            5:  Info("64K", "64K bytes"),
-            6:  Info("Reserved", "Reserved"),
-            7:  Info("128K", "128K bytes"),
-            8:  Info("Reserved", "Reserved"),
-            9:  Info("256K", "56K bytes"),
-            10: Info("512K", "512K bytes"),
-            11: Info("Reserved", "Reserved"),
-            12: Info("1024K", "1024K bytes"),
-            13: Info("Reserved", "Reserved"),
-            14: Info("2048K", "2048K bytes"),
-            15: Info("Reserved", "Reserved"),
-        }
-
-        EProcs = {
-            1: Info("ARM946ES", "ARM946ES"),
-            2: Info("ARM7TDMI", "ARM7TDMI"),
-            3: Info("CM3", "Cortex-M3"),
-            4: Info("ARM920T", "ARM920T"),
-            5: Info("ARM926EJS", "ARM926EJS"),
-            6: Info("CA5", "Cortex-A5"),
-            7: Info("CM4", "Cortex-M4"),
-        }
-
-        NvpSizes = {
-            0:  Info("NONE", "None"),
-            1:  Info("8K", "8K bytes"),
-            2:  Info("16K", "16K bytes"),
-            3:  Info("32K", "32K bytes"),
-            4:  Info("Reserved", "Reserved"),
-            5:  Info("64K", "64K bytes"),
-            6:  Info("Reserved", "Reserved"),
-            7:  Info("128K", "128K bytes"),
-            8:  Info("Reserved", "Reserved"),
-            9:  Info("256K", "256K bytes"),
-            10: Info("512K", "512K bytes"),
-            11: Info("Reserved", "Reserved"),
-            12: Info("1024K", "1024K bytes"),
-            13: Info("Reserved", "Reserved"),
-            14: Info("2048K", "2048K bytes"),
-            15: Info("Reserved", "Reserved"),
-        }
-
-        Packages =  {
-            0: "24-pin",
-            1: "32-pin",
-            2: "48-pin",
-            3: "64-pin",
-            4: "100-pi",
-            5: "144-pin",
-        }
-
-        friendlyName = FriendlyNames.get(chipId, "*** Unknown ***")
-        ext = (chipId & EXT) == EXT
-        nvptyp = (chipId & NVPTYP) >> 28
-        arch = (chipId & ARCH) >> 20
-        sramsiz = (chipId & SRAMSIZ) >> 16
-        nvpsiz2 = (chipId & NVPSIZ2) >> 12
-        nvpsiz = (chipId & NVPSIZ) >> 8
-        eproc = (chipId & EPROC) >> 5
-        version = (chipId & VERSION)
-
+        cid = CHIP_ID.decode(chipId)
+        ext = cid["EXT"] == 1
         if ext:
-            exid = self.exId()
-            package = (exid & PACKAGE) >> 24
-            lcd     = (exid & LCD) == LCD
-            usbfull = (exid & USBFULL) == USBFULL
-            usb     = (exid & USB) == USB
-            aes     = (exid & AES) == AES
+            exid = EX_ID.decode(self.exId())
+            package = EX_ID.label("PACKAGE", exid["PACKAGE"], "*** Reserved ***")
+            lcd     = exid["LCD"] == 1
+            usbfull = exid["USBFULL"] == 1
+            usb     = exid["USB"] == 1
+            aes     = exid["AES"] == 1
         else:
-            package = "*** Unknown ***"
+            package = "*** Reserved ***"
             lcd = False
             usb = False
             usbfull = False
             aes = False
 
-
-        return DeviceCapabilities(friendlyName, NvpTypes.get(nvptyp, "*** Unknown ***"), Archs.get(arch, "*** Unknown ***"),
-            SRamSizes.get(sramsiz, "*** Unknown ***"), NvpSizes.get(nvpsiz, "*** Unknown ***"), NvpSiz2s.get(nvpsiz2, "*** Unknown ***"),
-            EProcs.get(eproc, "*** Unknown ***"), version, ext, Packages.get(package, "*** Reserved ***"), lcd, usb, usbfull, aes
+        unknown = "*** Unknown ***"
+        return DeviceCapabilities(FRIENDLY_NAMES.get(chipId, unknown), CHIP_ID.label("NVPTYP", cid["NVPTYP"], unknown),
+            CHIP_ID.label("ARCH", cid["ARCH"], unknown), CHIP_ID.label("SRAMSIZ", cid["SRAMSIZ"], unknown),
+            CHIP_ID.label("NVPSIZ", cid["NVPSIZ"], unknown), CHIP_ID.label("NVPSIZ2", cid["NVPSIZ2"], unknown),
+            CHIP_ID.label("EPROC", cid["EPROC"], unknown), cid["VERSION"], ext, package, lcd, usb, usbfull, aes
         )
 
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Batch scripts: sequences of register/memory operations executed with as few round trips as possible.
+
+Steps are queued into one pipelined `Batch` until a step needs a value that is still in flight
+(or is a barrier like ``wait`` and ``sleep``); only then are the replies collected.
+
+Script syntax, one step per line, arguments separated by commas, ``#`` starts a comment:
+
+    read32  0x400E1060 -> pins
+    write32 0x400E1050, $pins | 0x04
+    wait32  0x400A0008, 0x01, 0x01, 0.5
+    send    0x20004000, firmware.bin
+    receive 0x20004000, 512 -> page
+    sleep   0.01
+
+Arguments are expressions over integers and earlier results (``$name``), using ``| & ^ + - << >> ~`` and parentheses.
+"""
+
+from collections import namedtuple
+import ast
+import numbers
+import operator
+import os
+import time
+
+from atenka.wait import waitUntil
+
+
+class ScriptError(Exception): pass
+
+
+class Expr(object):
+    """Value computed from results of earlier steps.
+    """
+
+    def __init__(self, fn, deps):
+        self.fn = fn
+        self.deps = frozenset(deps)
+
+    def evaluate(self, values):
+        return self.fn(values)
+
+    def _combine(self, other, op, swap = False):
+        deps = self.deps | (other.deps if isinstance(other, Expr) else frozenset())
+        lhs, rhs = (other, self) if swap else (self, other)
+        return Expr(lambda values: op(evaluate(lhs, values), evaluate(rhs, values)), deps)
+
+    def __or__(self, other):        return self._combine(other, operator.or_)
+    def __ror__(self, other):       return self._combine(other, operator.or_, True)
+    def __and__(self, other):       return self._combine(other, operator.and_)
+    def __rand__(self, other):      return self._combine(other, operator.and_, True)
+    def __xor__(self, other):       return self._combine(other, operator.xor)
+    def __rxor__(self, other):      return self._combine(other, operator.xor, True)
+    def __add__(self, other):       return self._combine(other, operator.add)
+    def __radd__(self, other):      return self._combine(other, operator.add, True)
+    def __sub__(self, other):       return self._combine(other, operator.sub)
+    def __rsub__(self, other):      return self._combine(other, operator.sub, True)
+    def __lshift__(self, other):    return self._combine(other, operator.lshift)
+    def __rshift__(self, other):    return self._combine(other, operator.rshift)
+
+    def __invert__(self):
+        return Expr(lambda values: ~self.fn(values), self.deps)
+
+    def __neg__(self):
+        return Expr(lambda values: -self.fn(values), self.deps)
+
+
+def ref(name):
+    return Expr(lambda values: values[name], [name])
+
+
+def evaluate(value, values):
+    return value.evaluate(values) if isinstance(value, Expr) else value
+
+
+def dependencies(*args):
+    result = frozenset()
+    for arg in args:
+        if isinstance(arg, Expr):
+            result |= arg.deps
+    return result
+
+
+Step = namedtuple("Step", "kind args name line")
+StepResult = namedtuple("StepResult", "step value")
+ScriptResult = namedtuple("ScriptResult", "steps values batches elapsed")
+
+
+class Script(object):
+    """Builder for batch scripts; read steps return references usable as arguments of later steps::
+
+        script = Script()
+        pins = script.read32(GPIO + 0x060)
+        script.write32(GPIO + 0x050, pins | 0x04)
+        result = script.run(samba)
+    """
+
+    BARRIERS = ("wait32", "sleep")
+
+    def __init__(self):
+        self.steps = []
+
+    def _add(self, kind, args, name = None, line = None):
+        undefined = dependencies(*args) - set(step.name for step in self.steps)
+        if undefined:
+            raise ScriptError("Step %u (line %s): undefined result %s." %
+                (len(self.steps), line, ", ".join("'$%s'" % n for n in sorted(undefined))))
+        if name is None and kind.startswith(("read", "receive")):
+            name = "_%u" % len(self.steps)
+        self.steps.append(Step(kind, args, name, line))
+        return ref(name) if name is not None else None
+
+    def write8(self, addr, value, line = None):     self._add("write8", (addr, value), None, line)
+    def write16(self, addr, value, line = None):    self._add("write16", (addr, value), None, line)
+    def write32(self, addr, value, line = None):    self._add("write32", (addr, value), None, line)
+    def read8(self, addr, name = None, line = None):    return self._add("read8", (addr, ), name, line)
+    def read16(self, addr, name = None, line = None):   return self._add("read16", (addr, ), name, line)
+    def read32(self, addr, name = None, line = None):   return self._add("read32", (addr, ), name, line)
+
+    def send(self, addr, data, line = None):
+        self._add("send", (addr, bytearray(data)), None, line)
+
+    def receive(self, addr, length, name = None, line = None):
+        return self._add("receive", (addr, length), name, line)
+
+    def wait32(self, addr, mask, value, timeout = 1.0, line = None):
+        self._add("wait32", (addr, mask, value, timeout), None, line)
+
+    def sleep(self, seconds, line = None):
+        self._add("sleep", (seconds, ), None, line)
+
+    def run(self, samba, waitOnTarget = False):
+        """Execute all steps; returns a `ScriptResult`. `waitOnTarget` runs ``wait32`` steps in a `WaitApplet`.
+        """
+        started = time.time()
+        values = {}
+        results = [None] * len(self.steps)
+        batch = samba.batch()
+        queued = []
+        inFlight = set()
+        batches = [0]
+
+        def collect():
+            if not queued:
+                return
+            for idx, value in zip(queued, batch.execute()):
+                results[idx] = StepResult(self.steps[idx], value)
+                if self.steps[idx].name is not None:
+                    values[self.steps[idx].name] = value
+            del queued[:]
+            inFlight.clear()
+            batches[0] += 1
+
+        for idx, step in enumerate(self.steps):
+            if step.kind in self.BARRIERS or dependencies(*step.args) & inFlight:
+                collect()
+            try:
+                args = [evaluate(arg, values) for arg in step.args]
+                if step.kind == "sleep":
+                    time.sleep(args[0])
+                    results[idx] = StepResult(step, None)
+                    continue
+                if step.kind == "wait32":
+                    results[idx] = StepResult(step, waitUntil(samba, *args, onTarget = waitOnTarget))
+                    continue
+            except Exception as e:
+                raise ScriptError("Step %u (line %s): %s" % (idx, step.line, e))
+            getattr(batch, QUEUE[step.kind])(*args)
+            queued.append(idx)
+            if step.name is not None:
+                inFlight.add(step.name)
+        collect()
+        return ScriptResult(results, values, batches[0], time.time() - started)
+
+
+QUEUE = {
+    "write8": "writeByte", "write16": "writeWord", "write32": "writeLong",
+    "read8": "readByte", "read16": "readWord", "read32": "readLong",
+    "send": "sendFile", "receive": "receiveFile",
+}
+
+ARITY = {
+    "write8": (2, 2), "write16": (2, 2), "write32": (2, 2),
+    "read8": (1, 1), "read16": (1, 1), "read32": (1, 1),
+    "send": (2, 2), "receive": (2, 2), "wait32": (3, 4), "sleep": (1, 1),
+}
+
+BINARY_OPS = {
+    ast.BitOr: operator.or_, ast.BitAnd: operator.and_, ast.BitXor: operator.xor,
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.LShift: operator.lshift, ast.RShift: operator.rshift,
+}
+
+UNARY_OPS = {
+    ast.Invert: operator.invert, ast.USub: operator.neg, ast.UAdd: operator.pos,
+}
+
+
+def _compile(node, line):
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, line)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+        return BINARY_OPS[type(node.op)](_compile(node.left, line), _compile(node.right, line))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+        return UNARY_OPS[type(node.op)](_compile(node.operand, line))
+    if isinstance(node, ast.Name):
+        return ref(node.id)
+    value = node.value if hasattr(node, "value") else getattr(node, "n", None)
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return value
+    raise ScriptError("Line %u: unsupported expression." % line)
+
+
+def expression(text, line = 0):
+    """Compile a script expression; ``$name`` refers to the result of an earlier step.
+    """
+    try:
+        tree = ast.parse(text.strip().replace("$", ""), mode = "eval")
+    except SyntaxError:
+        raise ScriptError("Line %u: invalid expression '%s'." % (line, text.strip()))
+    return _compile(tree, line)
+
+
+def parse(text, basedir = "."):
+    """Parse script text into a `Script`; ``send`` reads its file relative to `basedir`.
+    """
+    script = Script()
+    for lineNo, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        name = None
+        if "->" in line:
+            line, name = [part.strip() for part in line.split("->", 1)]
+        parts = line.split(None, 1)
+        kind = parts[0].lower()
+        if kind not in ARITY:
+            raise ScriptError("Line %u: unknown command '%s'." % (lineNo, parts[0]))
+        args = [arg.strip() for arg in parts[1].split(",")] if len(parts) > 1 else []
+        low, high = ARITY[kind]
+        if not low <= len(args) <= high:
+            raise ScriptError("Line %u: '%s' takes %u to %u arguments." % (lineNo, kind, low, high))
+        if name is not None and not kind.startswith(("read", "receive")):
+            raise ScriptError("Line %u: '%s' has no result." % (lineNo, kind))
+        if kind == "send":
+            with open(os.path.join(basedir, args[1]), "rb") as inf:
+                script.send(expression(args[0], lineNo), inf.read(), line = lineNo)
+            continue
+        values = [expression(arg, lineNo) for arg in args]
+        if kind.startswith(("read", "receive")):
+            getattr(script, kind)(*values, name = name, line = lineNo)
+        else:
+            getattr(script, kind)(*values, line = lineNo)
+    return script
+
+
+def load(filename):
+    with open(filename) as inf:
+        return parse(inf.read(), os.path.dirname(os.path.abspath(filename)))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+import re
+import struct
+
+from atenka.applet import Applet, R0, R1, R2, R3, R4, R5, R6, R7, LR, PC, CS, EQ, NE, MBX_ARGS, MBX_STATUS
+
+
+MAX_RESULTS     = 64            # Matches per applet call.
+SCAN_CHUNK      = 0x10000       # Bytes scanned per applet call.
+STREAM_CHUNK    = 0x1000        # Bytes per transfer of the host-side scan.
+
+
+class SearchApplet(Applet):
+    """Scans memory for a masked byte pattern.
+
+    Arguments:  position, limit (last position + 1), pattern address, mask address, pattern length,
+                result buffer address, maximum number of results.
+    Results:    arguments[7] number of matches, arguments[8] position to resume from.
+    Status:     STATUS_OK.
+    """
+    NAME = "search"
+
+    SEARCH = 1
+
+    def build(self, asm):
+        asm.push(R4, R5, R6, R7, LR)
+        asm.ldrConst(R7, self.mailbox)
+        asm.ldr(R0, R7, MBX_ARGS + 0)
+        asm.ldr(R1, R7, MBX_ARGS + 4)
+        asm.movs(R6, 0)
+        asm.label("outer")
+        asm.cmp(R0, R1)
+        asm.b("done", CS)
+        asm.ldr(R2, R7, MBX_ARGS + 16)
+        asm.label("inner")                  # Compare backwards, pattern[length - 1] .. pattern[0].
+        asm.subi(R2, 1)
+        asm.ldrbr(R3, R0, R2)
+        asm.ldr(R4, R7, MBX_ARGS + 12)
+        asm.ldrbr(R4, R4, R2)
+        asm.ands(R3, R4)
+        asm.ldr(R4, R7, MBX_ARGS + 8)
+        asm.ldrbr(R4, R4, R2)
+        asm.cmp(R3, R4)
+        asm.b("next", NE)
+        asm.cmpi(R2, 0)
+        asm.b("inner", NE)
+        asm.ldr(R4, R7, MBX_ARGS + 20)      # Match.
+        asm.lsls(R5, R6, 2)
+        asm.strr(R0, R4, R5)
+        asm.addi(R6, 1)
+        asm.ldr(R4, R7, MBX_ARGS + 24)
+        asm.cmp(R6, R4)
+        asm.b("full", EQ)
+        asm.label("next")
+        asm.addi(R0, 1)
+        asm.b("outer")
+        asm.label("full")
+        asm.addi(R0, 1)
+        asm.label("done")
+        asm.str(R6, R7, MBX_ARGS + 28)
+        asm.str(R0, R7, MBX_ARGS + 32)
+        asm.movs(R0, 0)
+        asm.str(R0, R7, MBX_STATUS)
+        asm.pop(R4, R5, R6, R7, PC)
+
+
+def _prepare(pattern, mask):
+    pattern = bytearray(pattern)
+    if not pattern:
+        raise ValueError("Empty search pattern.")
+    mask = bytearray(mask) if mask is not None else bytearray(b'\xff' * len(pattern))
+    if len(mask) != len(pattern):
+        raise ValueError("Pattern and mask differ in length.")
+    return bytearray(p & m for p, m in zip(pattern, mask)), mask
+
+
+def searchOnTarget(samba, start, end, pattern, mask = None, applet = None, timeout = 5.0):
+    """Generator yielding the addresses of all matches in [`start`, `end`), found by a `SearchApplet`.
+
+    Only match addresses are transferred, `MAX_RESULTS` per call at most. Matches touching the
+    block holding pattern, mask and results are dropped, they'd only find the search itself.
+    """
+    pattern, mask = _prepare(pattern, mask)
+    if applet is None:
+        applet = samba.applets.get(SearchApplet)
+    applet.ensure()
+    allocator = samba.applets.allocator
+    length = len(pattern)
+    size = (length << 1) + 3 + (MAX_RESULTS << 2)
+    buffer = allocator.allocate(size)
+    try:
+        samba.sendFile(buffer, pattern + mask)
+        results = buffer + (length << 1)
+        results = (results + 3) & ~3
+        position, limit = start, end - length + 1
+        while position < limit:
+            reply = applet.call(SearchApplet.SEARCH, position, min(limit, position + SCAN_CHUNK), buffer,
+                buffer + length, length, results, MAX_RESULTS, count = 9, timeout = timeout)
+            count, position = reply[8], reply[9]
+            if count:
+                for addr in struct.unpack("<%uL" % count, bytes(samba.receiveFile(results, count << 2))):
+                    if addr + length <= buffer or addr >= buffer + size:
+                        yield addr
+    finally:
+        allocator.free(buffer)
+
+
+def _regex(pattern, mask):
+    """Compile a masked pattern into a bytes regex matching at every (also overlapping) position.
+    """
+    parts = []
+    for value, bits in zip(pattern, mask):
+        if bits == 0xff:
+            parts.append(b'\\x%02x' % value)
+        elif bits == 0x00:
+            parts.append(b'.')
+        else:
+            parts.append(b'[' + b''.join(b'\\x%02x' % x for x in range(256) if (x & bits) == value) + b']')
+    return re.compile(b'(?=' + b''.join(parts) + b')', re.DOTALL)
+
+
+def scan(samba, start, end, pattern, mask = None, chunkSize = STREAM_CHUNK):
+    """Host-side search: streams [`start`, `end`) in chunks and yields match addresses as found.
+
+    Only one chunk plus ``len(pattern) - 1`` bytes of overlap are held in memory.
+    """
+    pattern, mask = _prepare(pattern, mask)
+    regex = _regex(pattern, mask)
+    overlap = len(pattern) - 1
+    carry = bytearray()
+    for offset in range(start, end, chunkSize):
+        data = carry + samba.receiveFile(offset, min(chunkSize, end - offset))
+        base = offset - len(carry)
+        for match in regex.finditer(bytes(data)):
+            yield base + match.start()
+        carry = data[max(0, len(data) - overlap) : ] if overlap else bytearray()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+import time
+
+from atenka.applet import Applet, R0, R1, R2, R3, R4, R5, R6, LR, PC, EQ, NE, MBX_ARGS, MBX_STATUS, STATUS_OK, STATUS_TIMEOUT
+
+
+class WaitTimeoutError(Exception): pass
+
+
+class WaitApplet(Applet):
+    """Spins on-target until ``(*addr & mask) == value``.
+
+    Arguments:  address, mask, value, maximum number of iterations (0: practically forever).
+    Results:    last value read.
+    Status:     STATUS_OK or STATUS_TIMEOUT.
+    """
+    NAME = "wait"
+
+    WAIT = 1
+
+    # Rough estimate used to turn timeouts into iteration counts.
+    LOOPS_PER_SECOND = 1000000
+
+    def build(self, asm):
+        asm.push(R4, R5, R6, LR)
+        asm.ldrConst(R4, self.mailbox)
+        asm.ldr(R0, R4, MBX_ARGS + 0)
+        asm.ldr(R1, R4, MBX_ARGS + 4)
+        asm.ldr(R2, R4, MBX_ARGS + 8)
+        asm.ldr(R3, R4, MBX_ARGS + 12)
+        asm.label("loop")
+        asm.ldr(R5, R0)
+        asm.lsls(R6, R5, 0)
+        asm.ands(R6, R1)
+        asm.cmp(R6, R2)
+        asm.b("done", EQ)
+        asm.subi(R3, 1)
+        asm.b("loop", NE)
+        asm.movs(R0, STATUS_TIMEOUT)
+        asm.b("exit")
+        asm.label("done")
+        asm.movs(R0, STATUS_OK)
+        asm.label("exit")
+        asm.str(R5, R4, MBX_ARGS)
+        asm.str(R0, R4, MBX_STATUS)
+        asm.pop(R4, R5, R6, PC)
+
+    def wait(self, addr, mask, value, timeout = 1.0):
+        loops = min(int(timeout * self.LOOPS_PER_SECOND), 0xffffffff) or 1
+        status, last = self.call(WaitApplet.WAIT, addr, mask, value, loops, count = 1, timeout = timeout + 1.0)
+        if status == STATUS_TIMEOUT:
+            raise WaitTimeoutError("Timeout waiting for (0x%08x & 0x%08x) == 0x%08x (last value: 0x%08x)." % (addr, mask, value, last))
+        return last
+
+
+def pollUntil(samba, addr, mask, value, timeout = 1.0, initialDelay = 0.0005, maxDelay = 0.05):
+    """Host-side fallback: poll with `readLong`, backing off exponentially from `initialDelay` to `maxDelay`.
+
+    The first poll is issued right away, so conditions that are already met cost one round trip.
+    """
+    deadline = time.time() + timeout
+    delay = initialDelay
+    while True:
+        current = samba.readLong(addr)
+        if (current & mask) == value:
+            return current
+        now = time.time()
+        if now >= deadline:
+            raise WaitTimeoutError("Timeout waiting for (0x%08x & 0x%08x) == 0x%08x (last value: 0x%08x)." % (addr, mask, value, current))
+        time.sleep(min(delay, deadline - now))
+        delay = min(delay * 2, maxDelay)
+
+
+def waitUntil(samba, addr, mask, value, timeout = 1.0, onTarget = False, applet = None):
+    """Wait until ``(readLong(addr) & mask) == value`` and return the last value read.
+
+    With `onTarget` the loop runs in the `WaitApplet` placed by `samba.applets` (or `applet`) and costs
+    a single round trip, otherwise `pollUntil` is used.
+    """
+    if onTarget or applet is not None:
+        if applet is None:
+            applet = samba.applets.get(WaitApplet)
+        return applet.wait(addr, mask, value, timeout)
+    return pollUntil(samba, addr, mask, value, timeout)
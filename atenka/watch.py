@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__version__ = "0.1.0"
+__description__ = "AT-ENKA (Toolset for Atmel AT-SAM4 Controllers)."
+__copyright__ = """
+  AT-ENKA (Toolset for Atmel AT-SAM4 Controllers).
+
+  (C) 2015 by Christoph Schueler <https://github.com/christoph2,
+                                       cpu12.gems@googlemail.com>
+
+  All Rights Reserved
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License along
+  with this program; if not, write to the Free Software Foundation, Inc.,
+  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+"""
+Incremental memory watch.
+
+A hash applet computes a 32-bit hash of every block of the watched region into an SRAM table; only
+this table and the blocks whose hash differs from the host's copy are transferred.
+Changes are reported as deltas, which can be recorded to a compact stream and replayed later.
+"""
+
+from collections import namedtuple
+import struct
+import time
+
+from atenka.applet import (Applet, R0, R1, R2, R3, R4, R5, R6, R7, LR, PC, NE, MBX_ARGS, MBX_STATUS, APPLET_ADDR,
+    APPLET_REGION_END)
+
+
+HASH_TABLE_ADDR = 0x20003000
+
+FNV_BASIS   = 0x811C9DC5
+FNV_PRIME   = 0x01000193
+
+STREAM_MAGIC    = b'ATDS'
+STREAM_HEADER   = struct.Struct("<4sLLL")   # Magic, address, length, block size.
+FRAME_HEADER    = struct.Struct("<LdL")     # Sequence, timestamp, number of blocks.
+BLOCK_HEADER    = struct.Struct("<L")       # Block index.
+
+
+class WatchError(Exception): pass
+
+
+Delta = namedtuple("Delta", "sequence timestamp blocks")   # blocks: list of (index, data).
+
+
+def blockHash(data):
+    """Word-wise FNV-1a, as computed by `HashApplet`.
+    """
+    result = FNV_BASIS
+    for word in struct.unpack("<%uL" % (len(data) >> 2), bytes(data)):
+        result = ((result ^ word) * FNV_PRIME) & 0xffffffff
+    return result
+
+
+class HashApplet(Applet):
+    """Hashes consecutive blocks into a table.
+
+    Arguments:  start address, words per block, number of blocks, table address.
+    Status:     STATUS_OK.
+    """
+    NAME = "hash"
+
+    HASH = 1
+
+    def build(self, asm):
+        asm.push(R4, R5, R6, R7, LR)
+        asm.ldrConst(R7, self.mailbox)
+        asm.ldr(R0, R7, MBX_ARGS + 0)
+        asm.ldr(R4, R7, MBX_ARGS + 8)
+        asm.ldr(R3, R7, MBX_ARGS + 12)
+        asm.ldrConst(R6, FNV_PRIME)
+        asm.label("block")
+        asm.ldr(R1, R7, MBX_ARGS + 4)
+        asm.ldrConst(R2, FNV_BASIS)
+        asm.label("word")
+        asm.ldr(R5, R0)
+        asm.eors(R2, R5)
+        asm.muls(R2, R6)
+        asm.addi(R0, 4)
+        asm.subi(R1, 1)
+        asm.b("word", NE)
+        asm.str(R2, R3)
+        asm.addi(R3, 4)
+        asm.subi(R4, 1)
+        asm.b("block", NE)
+        asm.movs(R0, 0)
+        asm.str(R0, R7, MBX_STATUS)
+        asm.pop(R4, R5, R6, R7, PC)
+
+    def hashes(self, addr, blockSize, blockCount, table = HASH_TABLE_ADDR, timeout = 1.0):
+        self.call(HashApplet.HASH, addr, blockSize >> 2, blockCount, table, timeout = timeout)
+        data = self.samba.receiveFile(table, blockCount << 2)
+        return list(struct.unpack("<%uL" % blockCount, bytes(data)))
+
+
+class MemoryWatch(object):
+    """Keeps the last snapshot of a memory region and fetches only changed blocks.
+
+    Without a `HashApplet` the whole region is read on every poll and diffed host-side.
+    The watched region must neither contain the applet nor its hash table.
+    """
+
+    def __init__(self, samba, addr, length, blockSize = 256, applet = None, table = HASH_TABLE_ADDR):
+        if addr & 3 or blockSize & 3 or not blockSize:
+            raise WatchError("Address and block size must be word aligned.")
+        if length % blockSize:
+            raise WatchError("Length must be a multiple of the block size.")
+        blockCount = length // blockSize
+        for low, high, name in ((APPLET_ADDR, APPLET_REGION_END, "applet area"),
+                (table, table + (blockCount << 2), "hash table")):
+            if addr < high and addr + length > low:
+                raise WatchError("Region 0x%08x..0x%08x overlaps the %s (0x%08x..0x%08x)." %
+                    (addr, addr + length, name, low, high))
+        self.samba = samba
+        self.addr = addr
+        self.length = length
+        self.blockSize = blockSize
+        self.blockCount = blockCount
+        self.applet = applet
+        self.table = table
+        self.sequence = 0
+        self._snapshot = None
+        self._hashes = None
+
+    @property
+    def snapshot(self):
+        return bytearray(self._snapshot) if self._snapshot is not None else None
+
+    def _runs(self, indices):
+        """Coalesce block indices into (first, count) runs, so adjacent blocks cost a single transfer.
+        """
+        runs = []
+        for idx in indices:
+            if runs and runs[-1][0] + runs[-1][1] == idx:
+                runs[-1][1] += 1
+            else:
+                runs.append([idx, 1])
+        return runs
+
+    def _fetch(self, indices):
+        blocks = []
+        size = self.blockSize
+        for first, count in self._runs(indices):
+            data = self.samba.receiveFile(self.addr + first * size, count * size)
+            for offset in range(count):
+                blocks.append((first + offset, data[offset * size : (offset + 1) * size]))
+        return blocks
+
+    def poll(self):
+        """Return a `Delta` with the blocks changed since the last poll; the first poll returns all blocks.
+        """
+        size = self.blockSize
+        timestamp = time.time()
+        if self.applet is not None:
+            hashes = self.applet.hashes(self.addr, size, self.blockCount, self.table)
+            if self._hashes is None:
+                changed = list(range(self.blockCount))
+            else:
+                changed = [idx for idx, (old, new) in enumerate(zip(self._hashes, hashes)) if old != new]
+            blocks = self._fetch(changed)
+        else:
+            data = self.samba.receiveFile(self.addr, self.length)
+            blocks = [(idx, data[idx * size : (idx + 1) * size]) for idx in range(self.blockCount)
+                if self._snapshot is None or self._snapshot[idx * size : (idx + 1) * size] != data[idx * size : (idx + 1) * size]]
+        if self._snapshot is None:
+            self._snapshot = bytearray(self.length)
+            self._hashes = [0] * self.blockCount
+        for idx, data in blocks:
+            self._snapshot[idx * size : (idx + 1) * size] = data
+            self._hashes[idx] = blockHash(data)
+        delta = Delta(self.sequence, timestamp, blocks)
+        self.sequence += 1
+        return delta
+
+    def watch(self, interval = 0.0, count = None):
+        """Generator polling every `interval` seconds, yielding non-empty deltas only.
+        """
+        polls = 0
+        while count is None or polls < count:
+            started = time.time()
+            delta = self.poll()
+            polls += 1
+            if delta.blocks:
+                yield delta
+            remaining = interval - (time.time() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+
+class DeltaWriter(object):
+    """Records deltas of a `MemoryWatch` to a binary file object.
+    """
+
+    def __init__(self, fileobj, watch):
+        self.fileobj = fileobj
+        fileobj.write(STREAM_HEADER.pack(STREAM_MAGIC, watch.addr, watch.length, watch.blockSize))
+
+    def write(self, delta):
+        out = self.fileobj
+        out.write(FRAME_HEADER.pack(delta.sequence, delta.timestamp, len(delta.blocks)))
+        for idx, data in delta.blocks:
+            out.write(BLOCK_HEADER.pack(idx))
+            out.write(bytes(data))
+
+
+def replay(fileobj):
+    """Replay a recorded delta stream, yielding ``(sequence, timestamp, snapshot)`` after every frame.
+
+    The snapshot is updated in place; copy it to keep it.
+    """
+    magic, addr, length, blockSize = STREAM_HEADER.unpack(fileobj.read(STREAM_HEADER.size))
+    if magic != STREAM_MAGIC:
+        raise WatchError("Not a delta stream.")
+    snapshot = bytearray(length)
+    while True:
+        header = fileobj.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            break
+        sequence, timestamp, count = FRAME_HEADER.unpack(header)
+        for _ in range(count):
+            idx, = BLOCK_HEADER.unpack(fileobj.read(BLOCK_HEADER.size))
+            snapshot[idx * blockSize : (idx + 1) * blockSize] = fileobj.read(blockSize)
+        yield sequence, timestamp, snapshot
@@ -0,0 +1,285 @@
+"""
+Test doubles: a SAM-BA monitor speaking the wire protocol from memory, and a Thumb interpreter
+running uploaded applets on it.
+"""
+
+import struct
+
+from atenka.port import TimeoutError
+
+
+MASK = 0xffffffff
+RETURN_ADDRESS = 0xfffffff0     # Fake LR; reaching it ends the applet.
+
+
+class FakeMonitor(object):
+    """Stands in for `atenka.port.Port`.
+
+    `storeHook(monitor, addr, value, size)` may intercept stores of applets and 'W/H/O' commands
+    (return True if handled), `goHook(monitor, addr)` replaces running applets, `replyFilter(frame, reply)`
+    may alter replies, e.g. to simulate a lossy link.
+    """
+
+    baudrate = 115200
+    timeout = 0.0125
+    buffered = False
+
+    def __init__(self):
+        self.memory = {}
+        self.input = bytearray()
+        self.output = bytearray()
+        self.pending = None
+        self.frames = []
+        self.storeHook = None
+        self.goHook = None
+        self.replyFilter = None
+
+    # Memory.
+    def load(self, addr, length):
+        return bytearray(self.memory.get(addr + idx, 0) for idx in range(length))
+
+    def store(self, addr, data):
+        for idx, value in enumerate(bytearray(data)):
+            self.memory[addr + idx] = value
+
+    def u32(self, addr):
+        return struct.unpack("<L", bytes(self.load(addr, 4)))[0]
+
+    def storeUnit(self, addr, value, size):
+        if self.storeHook is not None and self.storeHook(self, addr, value, size):
+            return
+        self.store(addr, struct.pack({1: "<B", 2: "<H", 4: "<L"}[size], value & ((1 << (8 * size)) - 1)))
+
+    # Port interface.
+    def write(self, data):
+        self.input.extend(bytearray(data))
+        self._process()
+
+    def read(self, length, timeout = None):
+        data = self.output[ : length]
+        del self.output[ : length]
+        if len(data) < length:
+            raise TimeoutError("Requested %d bytes got %d" % (length, len(data)), data)
+        return bytearray(data)
+
+    def deadline(self, length):
+        return self.timeout + length * 10.0 / self.baudrate
+
+    def flush(self):
+        del self.output[ : ]
+
+    def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _reply(self, frame, data):
+        if self.replyFilter is not None:
+            data = self.replyFilter(frame, bytearray(data))
+        self.output.extend(data)
+
+    def _process(self):
+        while True:
+            if self.pending is not None:
+                addr, length = self.pending
+                if len(self.input) < length:
+                    return
+                self.store(addr, self.input[ : length])
+                del self.input[ : length]
+                self.pending = None
+                continue
+            end = self.input.find(b'#')
+            if end < 0:
+                return
+            frame = bytes(self.input[ : end]).decode("ascii")
+            del self.input[ : end + 1]
+            if self.input[ : 1] == b'\n':
+                del self.input[ : 1]
+            if not frame:
+                continue
+            self.frames.append(frame)
+            cmd, params = frame[0], [int(x, 16) for x in frame[1 : ].split(",") if x]
+            if cmd == 'w':
+                self._reply(frame, struct.pack("<L", self.u32(params[0])))
+            elif cmd == 'h':
+                self._reply(frame, self.load(params[0], 2))
+            elif cmd == 'o':
+                self._reply(frame, self.load(params[0], 1))
+            elif cmd == 'R':
+                self._reply(frame, self.load(params[0], params[1]))
+            elif cmd in "WHO":
+                self.storeUnit(params[0], params[1], {'W': 4, 'H': 2, 'O': 1}[cmd])
+            elif cmd == 'S':
+                self.pending = (params[0], params[1])
+            elif cmd == 'G':
+                if self.goHook is not None:
+                    self.goHook(self, params[0])
+                else:
+                    Cpu(self).run(params[0])
+
+
+class Cpu(object):
+    """Interpreter for the Thumb subset emitted by `atenka.applet.Thumb`.
+    """
+
+    def __init__(self, monitor, maxSteps = 50000000):
+        self.monitor = monitor
+        self.maxSteps = maxSteps
+        self.r = [0] * 16
+        self.n = self.z = self.c = self.v = False
+
+    def load(self, addr, size):
+        data = self.monitor.load(addr & MASK, size)
+        return struct.unpack({1: "<B", 2: "<H", 4: "<L"}[size], bytes(data))[0]
+
+    def flags(self, value):
+        value &= MASK
+        self.n, self.z = bool(value >> 31), value == 0
+        return value
+
+    def add(self, a, b, carry = 0):
+        result = a + b + carry
+        self.c = result > MASK
+        result &= MASK
+        self.v = bool(((a ^ result) & (b ^ result)) >> 31)
+        return self.flags(result)
+
+    def sub(self, a, b):
+        return self.add(a, ~b & MASK, 1)
+
+    def condition(self, cond):
+        return [self.z, not self.z, self.c, not self.c, self.n, not self.n, self.v, not self.v,
+            self.c and not self.z, not self.c or self.z, self.n == self.v, self.n != self.v,
+            not self.z and self.n == self.v, self.z or self.n != self.v][cond]
+
+    def shiftLeft(self, value, amount):
+        if amount == 0:
+            return self.flags(value)
+        self.c = amount <= 32 and bool((value << amount) >> 32 & 1)
+        return self.flags(value << amount if amount < 32 else 0)
+
+    def shiftRight(self, value, amount):
+        self.c = bool((value >> (amount - 1)) & 1)
+        return self.flags(value >> amount)
+
+    def run(self, vector):
+        r = self.r
+        r[13] = self.monitor.u32(vector)
+        pc = self.monitor.u32(vector + 4) & ~1
+        r[14] = RETURN_ADDRESS
+        for step in range(self.maxSteps):
+            if pc == RETURN_ADDRESS:
+                return step
+            pc = self.execute(self.load(pc, 2), pc)
+        raise RuntimeError("Applet did not return.")
+
+    def execute(self, op, pc):
+        r = self.r
+        nextPc = pc + 2
+        rd, rs, rn = op & 7, (op >> 3) & 7, (op >> 6) & 7
+        imm5 = (op >> 6) & 31
+        top5 = op >> 11
+        if top5 == 0:
+            r[rd] = self.shiftLeft(r[rs], imm5)
+        elif top5 == 1:
+            r[rd] = self.shiftRight(r[rs], imm5 or 32)
+        elif op >> 9 == 0x0c:
+            r[rd] = self.add(r[rs], r[rn])
+        elif op >> 9 == 0x0d:
+            r[rd] = self.sub(r[rs], r[rn])
+        elif op >> 9 == 0x0e:
+            r[rd] = self.add(r[rs], rn)
+        elif op >> 9 == 0x0f:
+            r[rd] = self.sub(r[rs], rn)
+        elif top5 in (4, 5, 6, 7):
+            reg, imm = (op >> 8) & 7, op & 0xff
+            if top5 == 4:
+                r[reg] = self.flags(imm)
+            elif top5 == 5:
+                self.sub(r[reg], imm)
+            elif top5 == 6:
+                r[reg] = self.add(r[reg], imm)
+            else:
+                r[reg] = self.sub(r[reg], imm)
+        elif op >> 10 == 0x10:
+            alu, a, m = (op >> 6) & 15, r[rd], r[rs]
+            if alu == 0x0:
+                r[rd] = self.flags(a & m)
+            elif alu == 0x1:
+                r[rd] = self.flags(a ^ m)
+            elif alu == 0x2:
+                r[rd] = self.shiftLeft(a, m & 0xff)
+            elif alu == 0x8:
+                self.flags(a & m)
+            elif alu == 0xa:
+                self.sub(a, m)
+            elif alu == 0xc:
+                r[rd] = self.flags(a | m)
+            elif alu == 0xd:
+                r[rd] = self.flags(a * m)
+            elif alu == 0xe:
+                r[rd] = self.flags(a & ~m)
+            elif alu == 0xf:
+                r[rd] = self.flags(~m)
+            else:
+                raise RuntimeError("ALU op %u not supported." % alu)
+        elif op >> 8 == 0x46:
+            r[(op & 7) | ((op >> 4) & 8)] = r[(op >> 3) & 15]
+        elif op >> 7 == 0x8e:
+            nextPc = r[(op >> 3) & 15] & ~1
+        elif top5 == 9:
+            r[(op >> 8) & 7] = self.load(((pc + 4) & ~3) + ((op & 0xff) << 2), 4)
+        elif op >> 12 == 5:
+            kind, addr = (op >> 9) & 7, (r[rs] + r[rn]) & MASK
+            if kind == 0:
+                self.monitor.storeUnit(addr, r[rd], 4)
+            elif kind == 2:
+                self.monitor.storeUnit(addr, r[rd], 1)
+            elif kind == 4:
+                r[rd] = self.load(addr, 4)
+            elif kind == 6:
+                r[rd] = self.load(addr, 1)
+            else:
+                raise RuntimeError("Load/store op %u not supported." % kind)
+        elif top5 in (0x0c, 0x0d, 0x0e, 0x0f, 0x10, 0x11):
+            size = {0x0c: 4, 0x0d: 4, 0x0e: 1, 0x0f: 1, 0x10: 2, 0x11: 2}[top5]
+            addr = (r[rs] + imm5 * size) & MASK
+            if top5 in (0x0c, 0x0e, 0x10):
+                self.monitor.storeUnit(addr, r[rd], size)
+            else:
+                r[rd] = self.load(addr, size)
+        elif op >> 9 == 0x5a:
+            regs = [x for x in range(8) if op & (1 << x)] + ([14] if op & 0x100 else [])
+            sp = r[13] - 4 * len(regs)
+            for idx, reg in enumerate(regs):
+                self.monitor.storeUnit(sp + 4 * idx, r[reg], 4)
+            r[13] = sp
+        elif op >> 9 == 0x5e:
+            regs = [x for x in range(8) if op & (1 << x)] + ([15] if op & 0x100 else [])
+            sp = r[13]
+            for idx, reg in enumerate(regs):
+                value = self.load(sp + 4 * idx, 4)
+                if reg == 15:
+                    nextPc = value & ~1
+                else:
+                    r[reg] = value
+            r[13] = sp + 4 * len(regs)
+        elif op >> 12 == 0xd:
+            offset = op & 0xff
+            if self.condition((op >> 8) & 15):
+                nextPc = pc + 4 + 2 * (offset - 256 if offset & 0x80 else offset)
+        elif top5 == 0x1c:
+            offset = op & 0x7ff
+            nextPc = pc + 4 + 2 * (offset - 2048 if offset & 0x400 else offset)
+        else:
+            raise RuntimeError("Unknown instruction 0x%04x at 0x%08x." % (op, pc))
+        return nextPc
+
+
+def connect():
+    """(monitor, samba) pair."""
+    from atenka.samba import Samba
+
+    monitor = FakeMonitor()
+    return monitor, Samba(monitor)
@@ -0,0 +1,151 @@
+import struct
+
+import pytest
+
+from atenka.applet import (Thumb, Applet, AppletError, Allocator, R0, R1, R2, R3, R5, R6, R7, LR, PC, EQ, NE,
+    MBX_ARGS, MBX_STATUS, HASH_OFFSET, HEADER_SIZE, APPLET_CODE_ADDR, APPLET_MAILBOX_ADDR)
+from atenka.samba import Samba
+from fakemonitor import connect
+
+
+def halfwords(asm):
+    code = asm.assemble()
+    return list(struct.unpack("<%uH" % (len(code) >> 1), code))
+
+
+@pytest.mark.parametrize("emit, expected", [
+    (lambda a: a.movs(R0, 1), 0x2001),
+    (lambda a: a.adds(R0, R1, R2), 0x1888),
+    (lambda a: a.subs(R3, R3, R1), 0x1a5b),
+    (lambda a: a.lsls(R1, R2, 3), 0x00d1),
+    (lambda a: a.lsrs(R6, R5, 1), 0x086e),
+    (lambda a: a.eors(R1, R2), 0x4051),
+    (lambda a: a.lslsr(R5, R6), 0x40b5),
+    (lambda a: a.mvns(R2, R2), 0x43d2),
+    (lambda a: a.cmp(R0, R1), 0x4288),
+    (lambda a: a.cmpi(R2, 7), 0x2a07),
+    (lambda a: a.mov(8, R0), 0x4680),
+    (lambda a: a.ldr(R0, R1, 4), 0x6848),
+    (lambda a: a.str(R2, R7, 8), 0x60ba),
+    (lambda a: a.ldrh(R1, R2, 2), 0x8851),
+    (lambda a: a.ldrb(R3, R0, 1), 0x7843),
+    (lambda a: a.ldrr(R0, R1, R2), 0x5888),
+    (lambda a: a.strbr(R3, R1, R2), 0x548b),
+    (lambda a: a.push(R5, R6, R7, LR), 0xb5e0),
+    (lambda a: a.pop(R5, R6, R7, PC), 0xbde0),
+    (lambda a: a.bx(LR), 0x4770),
+])
+def test_encodings(emit, expected):
+    asm = Thumb(0x20002000)
+    emit(asm)
+    assert halfwords(asm)[0] == expected
+
+
+def test_branches():
+    asm = Thumb(0x20002000)
+    asm.label("top")
+    asm.b("top")
+    asm.b("end", EQ)
+    asm.nop()
+    asm.label("end")
+    asm.b("top", NE)
+    assert halfwords(asm) == [0xe7fe, 0xd000, 0x46c0, 0xd1fb]
+
+
+def test_literal_pool():
+    asm = Thumb(0x20002000)
+    asm.ldrConst(R0, 0x400e0740)
+    asm.ldrConst(R1, 0xdeadbeef)
+    asm.ldrConst(R2, 0x400e0740)
+    code = asm.assemble()
+    assert struct.unpack("<4H", code[ : 8]) == (0x4801, 0x4902, 0x4a00, 0x46c0)
+    assert struct.unpack("<2L", code[8 : ]) == (0x400e0740, 0xdeadbeef)
+
+
+def test_out_of_range():
+    asm = Thumb(0)
+    asm.b("far", EQ)
+    for _ in range(200):
+        asm.nop()
+    asm.label("far")
+    with pytest.raises(AppletError):
+        asm.assemble()
+
+
+class AddApplet(Applet):
+    """Stores ARGS[0] + ARGS[1] in ARGS[0]."""
+    NAME = "add"
+
+    def build(self, asm):
+        asm.ldrConst(R3, self.mailbox)
+        asm.ldr(R0, R3, MBX_ARGS)
+        asm.ldr(R1, R3, MBX_ARGS + 4)
+        asm.adds(R0, R0, R1)
+        asm.str(R0, R3, MBX_ARGS)
+        asm.movs(R0, 0)
+        asm.str(R0, R3, MBX_STATUS)
+        asm.bx(LR)
+
+
+def test_image_header():
+    applet = AddApplet(None)
+    sp, entry, crc = struct.unpack("<3L", applet.image[ : HEADER_SIZE])
+    assert (sp, entry) == (APPLET_MAILBOX_ADDR, (APPLET_CODE_ADDR + HEADER_SIZE) | 1)
+    assert crc == applet.hash
+    assert AddApplet(None, addr = APPLET_CODE_ADDR + 0x100).hash != applet.hash
+
+
+def test_call():
+    monitor, samba = connect()
+    applet = AddApplet(samba)
+    assert applet.call(1, 40, 2, count = 1) == (0, 42)
+    assert monitor.load(APPLET_CODE_ADDR, len(applet.image)) == bytearray(applet.image)
+
+
+def test_allocator_first_fit():
+    allocator = Allocator(0x1000, 0x1100, reserved = [(0x1010, 0x10)])
+    assert allocator.allocate(0x10) == 0x1000
+    assert allocator.allocate(3) == 0x1020
+    assert allocator.allocate(4) == 0x1024
+    allocator.free(0x1000)
+    assert allocator.allocate(0x11) == 0x1028
+    assert allocator.allocate(8) == 0x1000
+    with pytest.raises(AppletError):
+        allocator.allocate(0x100)
+
+
+def test_manager_places_applets_side_by_side():
+    monitor, samba = connect()
+    manager = samba.applets
+    add = manager.get(AddApplet)
+    assert manager.get(AddApplet) is add
+    assert add.addr == APPLET_CODE_ADDR
+    assert manager.lookup(add.hash) is add
+
+    class OtherApplet(AddApplet):
+        NAME = "other"
+    other = manager.get(OtherApplet)
+    assert other.addr >= add.addr + len(add.image)
+    manager.release(AddApplet)
+    assert manager.lookup(add.hash) is None
+    assert manager.get(AddApplet).addr == APPLET_CODE_ADDR
+
+
+def test_resident_applets_are_not_uploaded_again():
+    monitor, samba = connect()
+    applet = samba.applets.get(AddApplet)
+    applet.call(1, 1, 2)
+    uploads = [f for f in monitor.frames if f.startswith("S")]
+    applet.call(1, 3, 4)
+    assert [f for f in monitor.frames if f.startswith("S")] == uploads
+
+    # A new session finds the applet by its hash word.
+    samba2 = Samba(monitor)
+    del monitor.frames[:]
+    assert samba2.applets.get(AddApplet).call(1, 5, 6, count = 1) == (0, 11)
+    assert not [f for f in monitor.frames if f.startswith("S%08X" % APPLET_CODE_ADDR)]
+
+    # Overwriting it from the host forces an upload.
+    samba2.sendFile(APPLET_CODE_ADDR + HASH_OFFSET, b"\x00\x00\x00\x00")
+    assert samba2.applets.get(AddApplet).call(1, 5, 7, count = 1) == (0, 12)
+    assert [f for f in monitor.frames if f.startswith("S%08X" % APPLET_CODE_ADDR)]
@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from atenka.baudrate import (brgrFor, baudrateOf, detect, negotiate, BaudrateError, USART0, USART1, USART2,
+    BRGR, MR, MR_OVER)
+from fakemonitor import connect
+
+
+CLOCK = 12000000
+
+
+def configure(monitor, usart, brgr, mr = 0):
+    monitor.store(usart + BRGR, struct.pack("<L", brgr))
+    monitor.store(usart + MR, struct.pack("<L", mr))
+
+
+@pytest.mark.parametrize("mr", [0, MR_OVER])
+@pytest.mark.parametrize("baudrate", [9600, 57600, 230400, 460800])
+def test_brgr_for(baudrate, mr):
+    sampling = 8 if mr else 16
+    current = int(round(CLOCK * 8.0 / (sampling * 115200)))
+    current = ((current & 7) << 16) | (current >> 3)
+    brgr = brgrFor(baudrate, 115200, current, mr)
+    assert abs(baudrateOf(CLOCK, brgr, mr) - baudrate) / baudrate < 0.02
+
+
+def test_brgr_for_rejects_unreachable_rates():
+    with pytest.raises(BaudrateError):
+        brgrFor(115200, 115200, 0, 0)
+    with pytest.raises(BaudrateError):
+        brgrFor(10000000, 115200, 6, 0)
+
+
+def test_detect_configured_usart():
+    monitor, samba = connect()
+    configure(monitor, USART1, 6)
+    assert detect(samba, 115200) == USART1
+
+
+def test_detect_needs_clock_to_decide():
+    monitor, samba = connect()
+    configure(monitor, USART0, 6)          # 125000 Baud at 12 MHz.
+    configure(monitor, USART2, 78)         # 9615 Baud at 12 MHz.
+    with pytest.raises(BaudrateError):
+        detect(samba, 9600)
+    assert detect(samba, 9600, CLOCK) == USART2
+
+
+def test_detect_skips_synchronous_usart():
+    monitor, samba = connect()
+    configure(monitor, USART0, 6, 0x100)
+    with pytest.raises(BaudrateError):
+        detect(samba, 115200)
+
+
+def test_negotiate_switches_detected_usart():
+    monitor, samba = connect()
+    configure(monitor, USART1, 6, MR_OVER)
+    assert negotiate(samba, monitor, 57600) == 57600
+    assert monitor.baudrate == 57600
+    assert monitor.u32(USART1 + BRGR) == brgrFor(57600, 115200, 6, MR_OVER)
+    assert monitor.u32(USART0 + BRGR) == 0
@@ -0,0 +1,61 @@
+from array import array
+import struct
+
+import pytest
+
+from atenka.bitfield import Decoder, DecodedField
+from atenka.module import Field, ACC_RW
+from atenka.samba import CHIP_ID_ADDR, EX_ID_ADDR, CHIP_ID
+from fakemonitor import connect
+
+
+FIELDS = (
+    Field("DIV",  8, 8, "Divider", ACC_RW),
+    Field("EN",   0, 1, "Enable", ACC_RW),
+    Field("MODE", 4, 3, "Mode", ACC_RW),
+    Field("CNT", 16, 16, "Counter", ACC_RW),
+)
+ENUMS = {"MODE": {0: "off", 5: "burst"}}
+
+
+@pytest.fixture
+def decoder():
+    return Decoder(FIELDS, ENUMS)
+
+
+def test_decode(decoder):
+    assert len(decoder) == 4
+    assert list(decoder.decode(0x1234ab51).items()) == [("EN", 1), ("MODE", 5), ("DIV", 0xab), ("CNT", 0x1234)]
+
+
+def test_describe(decoder):
+    fields = decoder.describe(0x50)
+    assert fields[1] == DecodedField("MODE", 5, "burst", "Mode")
+    assert fields[0] == DecodedField("EN", 0, None, "Enable")
+    assert decoder.label("MODE", 3, "?") == "?"
+
+
+@pytest.mark.parametrize("useNumpy", [False, True])
+def test_column(decoder, useNumpy):
+    if useNumpy:
+        pytest.importorskip("numpy")
+    samples = [0x00000000, 0x1234ab51, 0xffffffff]
+    columns = decoder.column(samples, useNumpy)
+    assert [list(columns[name]) for name in decoder.names] == [
+        [0, 1, 1], [0, 5, 7], [0, 0xab, 0xff], [0, 0x1234, 0xffff]]
+    if not useNumpy:
+        assert [columns[name].typecode for name in decoder.names] == ['B', 'B', 'B', 'H']
+        assert list(decoder.column(array('L', samples), False)["CNT"]) == [0, 0x1234, 0xffff]
+    assert decoder.labels("MODE", columns["MODE"], "?") == ["off", "burst", "?"]
+
+
+def test_chip_info():
+    monitor, samba = connect()
+    monitor.store(CHIP_ID_ADDR, struct.pack("<L", 0xAB0A09E0))
+    monitor.store(EX_ID_ADDR, struct.pack("<L", 0x03000006))
+    info = samba.chipInfo()
+    assert CHIP_ID.decode(0xAB0A09E0)["EXT"] == 1
+    assert (info.architecture.name, info.processor.name, info.sramSize.name, info.nvpSize0.name) == \
+        ("SAM4L", "CM4", "32K", "256K")
+    assert (info.ext, info.package, info.usb, info.usbfull, info.aes, info.lcd) == \
+        (True, "64-pin", True, True, False, False)
@@ -0,0 +1,126 @@
+import json
+import time
+
+import pytest
+
+from atenka.dump import Dump, DumpError, parseRange
+from atenka.samba import Samba, CHIP_ID_ADDR, MAX_PAYLOAD
+from fakemonitor import FakeMonitor
+
+
+START = 0x20008000
+
+
+class LateMonitor(FakeMonitor):
+    """The tail of the first reply to `frame` arrives `delay` seconds late, everything after it queues up behind."""
+
+    baudrate = 250000
+
+    def __init__(self, frame = None, keep = 0x800, delay = 0.25):
+        super(LateMonitor, self).__init__()
+        self.lateFrame = frame
+        self.keep = keep
+        self.delay = delay
+        self.wire = []          # [due, data], in order.
+
+    def _reply(self, frame, data):
+        if self.replyFilter is not None:
+            data = self.replyFilter(frame, bytearray(data))
+        if frame == self.lateFrame:
+            self.lateFrame = None
+            self.output.extend(data[ : self.keep])
+            self.wire.append([time.time() + self.delay, bytearray(data[self.keep : ])])
+        elif self.wire:
+            self.wire.append([self.wire[-1][0], bytearray(data)])
+        else:
+            self.output.extend(data)
+
+    def _arrive(self, until):
+        while self.wire and self.wire[0][0] <= until:
+            due, data = self.wire.pop(0)
+            time.sleep(max(0.0, due - time.time()))
+            self.output.extend(data)
+
+    def read(self, length, timeout = None):
+        until = time.time() + (timeout if timeout is not None else self.deadline(length))
+        if len(self.output) < length:
+            self._arrive(until)
+        if len(self.output) < length:
+            time.sleep(max(0.0, until - time.time()))
+        return super(LateMonitor, self).read(length, timeout)
+
+    def flush(self):
+        self._arrive(time.time())
+        super(LateMonitor, self).flush()
+
+
+def target(monitor = None):
+    monitor = monitor or LateMonitor()
+    monitor.store(START, bytearray((idx * 13 + (idx >> 8)) & 0xff for idx in range(0x3000)))
+    monitor.store(CHIP_ID_ADDR, b"\xe0\x0a\xa0\xab")
+    return monitor, Samba(monitor)
+
+
+def test_parse_range():
+    assert parseRange("0x20000000:0x100") == (0x20000000, 0x100)
+    assert parseRange("0x100-0x180") == (0x100, 0x80)
+    for text in ("0x100-0x100", "foo", "1:"):
+        with pytest.raises(DumpError):
+            parseRange(text)
+
+
+def test_overlapping_ranges():
+    monitor, samba = target()
+    with pytest.raises(DumpError):
+        Dump(samba, "unused", [(0, 0x100), (0x80, 0x100)])
+
+
+def test_dump_and_resume(tmpdir):
+    monitor, samba = target()
+    filename = str(tmpdir.join("ram.bin"))
+    ranges = [(START + 0x1000, 0x1000), (START, 0x800)]
+    result = Dump(samba, filename, ranges, chunkSize = 0x400).run()
+    assert (result.read, result.resumed, result.failed) == (0x1800, 0, [])
+    with open(filename, "rb") as inf:
+        assert bytearray(inf.read()) == monitor.load(START + 0x1000, 0x1000) + monitor.load(START, 0x800)
+    manifest = json.load(open(filename + ".manifest"))
+    assert manifest["complete"] and len(manifest["sha1"]) == 2
+
+    # Damage one chunk: only that one is read again.
+    with open(filename, "r+b") as outf:
+        outf.seek(0x500)
+        outf.write(b"\x00")
+    del monitor.frames[:]
+    result = Dump(samba, filename, ranges, chunkSize = 0x400).run()
+    assert (result.read, result.resumed) == (0x400, 5)
+    assert [f for f in monitor.frames if f.startswith("R")] == ["R%08X,%08X" % (START + 0x1400, 0x400)]
+
+
+def test_late_bytes_do_not_shift_later_chunks(tmpdir):
+    """The tail shows up after the read gave up (~0.17 s) and after a short settle time, but within
+    the wire time of a full reply."""
+    monitor, samba = target(LateMonitor("R%08X,%08X" % (START + 0x1000, MAX_PAYLOAD)))
+    filename = str(tmpdir.join("ram.bin"))
+    result = Dump(samba, filename, [(START, 0x3000)], chunkSize = 0x1000, timeout = 0.01).run()
+    with open(filename, "rb") as inf:
+        assert bytearray(inf.read()) == monitor.load(START, 0x3000)
+    assert result.retries == 1 and not result.failed
+
+
+def test_unreadable_chunk_is_left_for_next_run(tmpdir):
+    monitor, samba = target()
+    bad = START + 0x100
+
+    def unreadable(frame, data):
+        if frame[0] == 'R':
+            addr, length = [int(x, 16) for x in frame[1 : ].split(",")]
+            if addr <= bad < addr + length:
+                return data[ : 0x10]
+        return data
+    monitor.replyFilter = unreadable
+    filename = str(tmpdir.join("ram.bin"))
+    result = Dump(samba, filename, [(START, 0x400)], chunkSize = 0x400, minChunkSize = 0x100, retries = 2,
+        timeout = 0.01).run()
+    assert result.failed == [[bad, 0x100]]
+    assert result.read == 0x300
+    assert not json.load(open(filename + ".manifest"))["complete"]
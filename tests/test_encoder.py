@@ -0,0 +1,42 @@
+import pytest
+
+from atenka.encoder import CommandEncoder
+
+
+@pytest.fixture
+def encoder():
+    return CommandEncoder()
+
+
+def test_read_unit(encoder):
+    assert bytes(encoder.readUnit('w', 0x400e0740, 4)) == b"w400E0740,4#\n"
+    assert bytes(encoder.readUnit('o', 0x20000001, 1)) == b"o20000001,1#\n"
+
+
+@pytest.mark.parametrize("dlen, value, expected", [
+    (1, 0x1ab, b"O20001234,AB#\n"),
+    (2, 0x1beef, b"H20001234,BEEF#\n"),
+    (4, 0xdeadbeef, b"W20001234,DEADBEEF#\n"),
+])
+def test_write_unit(encoder, dlen, value, expected):
+    cmd = expected[0 : 1].decode()
+    assert bytes(encoder.writeUnit(cmd, 0x20001234, value, dlen)) == expected
+
+
+def test_frames_are_reused(encoder):
+    first = encoder.writeUnit('W', 0xffffffff, 0xffffffff, 4)
+    second = encoder.writeUnit('W', 0, 0, 4)
+    assert first is second
+    assert bytes(second) == b"W00000000,00000000#\n"
+
+
+def test_transfer_and_go(encoder):
+    assert bytes(encoder.transfer('S', 0x20002000, 0x1000)) == b"S20002000,00001000#\n"
+    assert bytes(encoder.transfer(ord('R'), 0x80000, 4)) == b"R00080000,00000004#\n"
+    assert bytes(encoder.go('G', 0x20002081)) == b"G20002081#\n"
+    assert bytes(encoder.command('N')) == b"N#\n"
+
+
+def test_decode_unit(encoder):
+    assert encoder.decodeUnit(b"\xef\xbe\xad\xde", 4) == 0xdeadbeef
+    assert encoder.decodeUnit(b"\x34\x12", 2) == 0x1234
@@ -0,0 +1,106 @@
+import struct
+
+import pytest
+
+from atenka.flash import (FlashPipeline, FlashApplet, FlashError, FLASHCALW, FCMD, FSR, FSR_FRDY, FSR_PROGE,
+    CMD_EP, STAGING_ADDR, crc32)
+from fakemonitor import connect
+
+
+PAGE_SIZE = 512
+
+
+def flashController(monitor):
+    """Ready flash controller; erase fills the page with 0xff, writes land directly in memory."""
+    monitor.store(FLASHCALW + FSR, struct.pack("<L", FSR_FRDY))
+
+    def storeHook(monitor, addr, value, size):
+        if addr == FLASHCALW + FCMD:
+            if value & 0xff == CMD_EP:
+                page = (value >> 8) & 0xffff
+                monitor.store(page * PAGE_SIZE, b'\xff' * PAGE_SIZE)
+            return True
+        return False
+    monitor.storeHook = storeHook
+
+
+@pytest.fixture
+def target():
+    monitor, samba = connect()
+    flashController(monitor)
+    return monitor, samba
+
+
+def image(pages):
+    return bytearray((idx * 7 + idx // 251) & 0xff for idx in range(pages * PAGE_SIZE - 100))
+
+
+def test_program_confirms_each_transfer(target):
+    monitor, samba = target
+    data = image(3)
+    report = FlashPipeline(samba, PAGE_SIZE).program(0x4000, data)
+    assert monitor.load(0x4000, len(data)) == data
+    assert report.pages == 3
+    assert not report.overlapped
+    assert report.bottleneck in ("link", "flash controller")
+    for buffer in (STAGING_ADDR, STAGING_ADDR + PAGE_SIZE):
+        assert "w%08X,4" % (buffer + PAGE_SIZE - 4) in monitor.frames
+
+
+def test_overlap_follows_port(target):
+    monitor, samba = target
+    assert not FlashPipeline(samba, PAGE_SIZE).overlap
+    monitor.buffered = True
+    pipeline = FlashPipeline(samba, PAGE_SIZE)
+    assert pipeline.overlap
+    data = image(2)
+    report = pipeline.program(0, data)
+    assert monitor.load(0, len(data)) == data
+    assert report.overlapped and report.bottleneck is None
+
+
+def test_lost_page_data_is_detected(target):
+    monitor, samba = target
+    staged = "w%08X,4" % (STAGING_ADDR + PAGE_SIZE - 4)
+    monitor.replyFilter = lambda frame, data: bytearray(4) if frame == staged else data
+    with pytest.raises(FlashError):
+        FlashPipeline(samba, PAGE_SIZE).program(0, image(1))
+
+
+def test_precomputed_crcs_are_checked(target):
+    monitor, samba = target
+    data = image(2)
+    pipeline = FlashPipeline(samba, PAGE_SIZE)
+    with pytest.raises(FlashError, match = "0x00000200"):
+        pipeline.program(0, data, [crc32(data[ : PAGE_SIZE]), 0])
+
+
+def test_error_cleared_by_an_earlier_fsr_read_is_reported(target):
+    """FSR.PROGE is set for the first read only, i.e. while the applet waits for the erase."""
+    monitor, samba = target
+    load = monitor.load
+    reads = []
+
+    def clearOnRead(addr, length):
+        data = load(addr, length)
+        if addr == FLASHCALW + FSR:
+            reads.append(addr)
+            if len(reads) == 1:
+                data = bytearray(struct.pack("<L", FSR_FRDY | FSR_PROGE))
+        return data
+    monitor.load = clearOnRead
+    with pytest.raises(FlashError, match = "FSR: 0x00000008"):
+        FlashPipeline(samba, PAGE_SIZE).program(0, image(1))
+    assert len(reads) == 3
+
+
+class ShortWaitApplet(FlashApplet):
+    READY_LIMIT = 16
+
+
+def test_stuck_controller_times_out(target):
+    monitor, samba = target
+    monitor.store(FLASHCALW + FSR, struct.pack("<L", 0))
+    pipeline = FlashPipeline(samba, PAGE_SIZE, applet = samba.applets.get(ShortWaitApplet))
+    with pytest.raises(FlashError, match = "not ready"):
+        pipeline.program(0, image(1))
@@ -0,0 +1,109 @@
+import os
+import zlib
+
+import pytest
+
+from atenka.imagecache import ImageCache, CachedImage, ImageError, parseIntelHex, flatten
+from atenka.flash import FlashPipeline, FlashError
+from fakemonitor import connect
+from test_flash import flashController, PAGE_SIZE
+
+
+def record(kind, offset, data):
+    body = bytearray([len(data), offset >> 8, offset & 0xff, kind]) + bytearray(data)
+    body.append(-sum(body) & 0xff)
+    return b":" + "".join("%02X" % b for b in body).encode("ascii")
+
+
+HEX = b"\n".join([
+    record(0x04, 0, b"\x00\x01"),
+    record(0x00, 0x0010, b"\x01\x02\x03\x04"),
+    record(0x00, 0x0014, b"\x05\x06"),
+    record(0x00, 0x0300, b"\xaa"),
+    record(0x01, 0, b""),
+    record(0x00, 0x0400, b"\xbb"),
+])
+
+
+def test_parse_intel_hex():
+    assert parseIntelHex(HEX) == [(0x10010, bytearray(b"\x01\x02\x03\x04\x05\x06")), (0x10300, bytearray(b"\xaa"))]
+
+
+@pytest.mark.parametrize("text", [b"00", b":0G", b":0100000000", b":00000001FE"])
+def test_parse_intel_hex_errors(text):
+    with pytest.raises(ImageError):
+        parseIntelHex(text)
+
+
+def test_flatten():
+    base, image = flatten(parseIntelHex(HEX), 0x200)
+    assert base == 0x10000 and len(image) == 0x400
+    assert image[0x10 : 0x16] == b"\x01\x02\x03\x04\x05\x06" and image[0x300] == 0xaa
+    assert image.count(b"\xff") == 0x400 - 7
+    with pytest.raises(ImageError):
+        flatten([], 0x200)
+
+
+def test_get_builds_once(tmpdir):
+    cache = ImageCache(str(tmpdir))
+    content = bytes(bytearray(range(256)) * 5)
+    with cache.get(content, 512, 0x4000, {"zlib": zlib.compress}) as image:
+        assert (image.base, image.pageSize, image.pages, len(image)) == (0x4000, 512, 3, 1536)
+        assert bytes(image.data[ : len(content)]) == content and bytes(image.data[len(content) : ]) == b"\xff" * 256
+        assert bytes(image.page(1)) == bytes(image.data[512 : 1024])
+        assert image.crcs == tuple(zlib.crc32(bytes(image.page(idx))) & 0xffffffff for idx in range(3))
+        assert image.encodings == ["zlib"]
+        assert zlib.decompress(bytes(image.encoded("zlib"))) == bytes(image.data)
+    cache.get(content, 512, 0x4000, {"zlib": zlib.compress}).close()
+    cache.get(content, 256, 0x4000).close()
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 2, 2)
+
+
+def test_damaged_entry_is_rebuilt(tmpdir):
+    cache = ImageCache(str(tmpdir))
+    content = b"\x00" * 512
+    filename = cache._filename(cache.key(content, 512, 0))
+    with open(filename, "wb") as outf:
+        outf.write(b"junk" * 8)
+    with pytest.raises(ImageError):
+        CachedImage(filename)
+    with cache.get(content, 512) as image:
+        assert bytes(image.data) == content
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_load_hex(tmpdir):
+    filename = os.path.join(str(tmpdir), "fw.hex")
+    with open(filename, "wb") as outf:
+        outf.write(HEX)
+    cache = ImageCache(os.path.join(str(tmpdir), "cache"))
+    with cache.load(filename, 0x200) as image:
+        assert image.base == 0x10000 and image.pages == 2
+
+
+def test_evict_least_recently_used(tmpdir):
+    cache = ImageCache(str(tmpdir))
+    for idx in range(3):
+        cache.get(bytes(bytearray([idx])) * 512, 512).close()
+        entry = cache._filename(cache.key(bytes(bytearray([idx])) * 512, 512, 0))
+        os.utime(entry, (1000 + idx, 1000 + idx))
+    size = cache.stats().size
+    cache.maxSize = size * 2 // 3
+    cache.evict()
+    stats = cache.stats()
+    assert stats.entries == 2 and stats.evictions == 1
+    assert not os.path.exists(cache._filename(cache.key(b"\x00" * 512, 512, 0)))
+
+
+def test_program_image(tmpdir):
+    monitor, samba = connect()
+    flashController(monitor)
+    content = bytes(bytearray(idx & 0xff for idx in range(2 * PAGE_SIZE - 10)))
+    with ImageCache(str(tmpdir)).get(content, PAGE_SIZE, 0x8000) as image:
+        report = FlashPipeline(samba, PAGE_SIZE).programImage(image)
+        assert report.pages == 2
+        assert monitor.load(0x8000, len(image)) == bytes(image.data)
+    with ImageCache(str(tmpdir)).get(content, PAGE_SIZE * 2) as image:
+        with pytest.raises(FlashError):
+            FlashPipeline(samba, PAGE_SIZE).programImage(image)
@@ -0,0 +1,54 @@
+import struct
+
+import pytest
+
+from atenka.applet import APPLET_ADDR, APPLET_REGION_END
+from atenka.logstream import locate, LogStream, LogStreamError, LOG_MAGIC, LOG_HEAD, LOG_TAIL, LOG_BUFFER
+from fakemonitor import connect
+
+
+BLOCK = 0x20006000
+SIZE = 0x40
+
+
+@pytest.fixture
+def target():
+    monitor, samba = connect()
+    monitor.store(BLOCK, struct.pack("<4L", LOG_MAGIC, SIZE, 0, 0))
+    return monitor, samba
+
+
+def test_locate_ignores_search_buffer(target):
+    monitor, samba = target
+
+    def plausibleSize(frame, data):
+        # Whatever follows the search's own copy of the magic reads as a valid buffer size.
+        addr = int(frame[1 : 9], 16)
+        if frame[0] == 'w' and APPLET_ADDR <= addr < APPLET_REGION_END and monitor.u32(addr - 4) == LOG_MAGIC:
+            return bytearray(struct.pack("<L", 0x100))
+        return data
+    monitor.replyFilter = plausibleSize
+    assert locate(samba) == BLOCK
+
+
+def test_locate_fails_without_block():
+    monitor, samba = connect()
+    with pytest.raises(LogStreamError):
+        locate(samba, 0x20000000, 0x20001000)
+
+
+def test_poll_wraps(target):
+    monitor, samba = target
+    stream = LogStream(samba, BLOCK)
+    monitor.store(BLOCK + LOG_BUFFER, b"one\ntw")
+    monitor.store(BLOCK + LOG_HEAD, struct.pack("<L", 6))
+    assert stream.poll() == ["one"]
+    assert monitor.u32(BLOCK + LOG_TAIL) == 6
+    assert stream.poll() == []
+    monitor.store(BLOCK + LOG_BUFFER + 6, b"o\n" + b"x" * (SIZE - 8))
+    monitor.store(BLOCK + LOG_BUFFER, b"\nab")
+    monitor.store(BLOCK + LOG_HEAD, struct.pack("<L", 3))
+    assert stream.poll() == ["two", "x" * (SIZE - 8)]
+    monitor.store(BLOCK + LOG_BUFFER + 3, b"c\n")
+    monitor.store(BLOCK + LOG_HEAD, struct.pack("<L", 5))
+    assert stream.poll() == ["abc"]
@@ -0,0 +1,99 @@
+import struct
+
+import pytest
+
+from atenka.memory import TargetMemory
+from atenka.samba import CHIP_ID_ADDR, SRAM
+from fakemonitor import connect
+
+
+REGIONS = [(0, 0x2000)]
+
+
+@pytest.fixture
+def target():
+    monitor, samba = connect()
+    monitor.store(0, bytearray(idx & 0xff for idx in range(0x2000)))
+    return monitor, samba
+
+
+def expected(start, stop):
+    return bytearray(idx & 0xff for idx in range(start, stop))
+
+
+def test_reads_larger_than_the_cache(target):
+    monitor, samba = target
+    mem = TargetMemory(samba, maxPages = 4)
+    assert mem[0 : 1] == expected(0, 1)
+    assert mem[256 : 1024] == expected(256, 1024)
+    assert mem[0 : 2048] == expected(0, 2048)
+    assert len(mem._pages) == 4
+
+
+def test_read_ahead_is_bounded_by_cache_size(target):
+    monitor, samba = target
+    mem = TargetMemory(samba, maxPages = 2, readAhead = 8, regions = REGIONS)
+    mem[0 : 1]
+    mem[256 : 257]
+    assert monitor.frames[-1] == "R00000100,00000200"
+    assert mem[512 : 513] == expected(512, 513)
+    assert len(mem._pages) == 2
+
+
+def test_hits_and_read_ahead(target):
+    monitor, samba = target
+    mem = TargetMemory(samba, readAhead = 2, regions = REGIONS)
+    for addr in range(0, 0x400, 0x80):
+        assert mem[addr] == addr & 0xff
+    assert mem.transfers == 2
+    assert mem.misses == 2
+
+
+def test_read_ahead_stays_inside_the_region(target):
+    monitor, samba = target
+    mem = TargetMemory(samba, readAhead = 8, regions = REGIONS)
+    mem[0x1d00]
+    assert mem[0x1e00 : 0x1e01] == expected(0x1e00, 0x1e01)
+    assert monitor.frames[-1] == "R00001E00,00000200"
+    mem = TargetMemory(samba, readAhead = 8)
+    mem[0x100]
+    mem[0x200]
+    assert monitor.frames[-1] == "R00000200,00000100"
+
+
+def test_regions_from_chip_id():
+    monitor, samba = connect()
+    monitor.store(CHIP_ID_ADDR, struct.pack("<L", 0x2A0A0960))     # 256K flash, 32K SRAM.
+    assert samba.memoryRegions() == [(0, 0x40000), (SRAM, SRAM + 0x8000)]
+    assert samba.memory().regions == [(0, 0x400), (SRAM >> 8, (SRAM + 0x8000) >> 8)]
+
+
+def test_writes_are_buffered_and_visible(target):
+    monitor, samba = target
+    with TargetMemory(samba) as mem:
+        mem[0x10 : 0x14] = b"\xaa\xbb\xcc\xdd"
+        mem.u16[0x300] = 0x1234
+        assert mem.u32[0x10] == 0xddccbbaa
+        assert monitor.load(0x10, 4) == expected(0x10, 0x14)
+        assert mem.u16[0x300 : 0x304] == (0x1234, 0x0302)
+    assert monitor.load(0x10, 4) == bytearray(b"\xaa\xbb\xcc\xdd")
+    assert monitor.load(0x300, 2) == bytearray(b"\x34\x12")
+
+
+def test_invalidate(target):
+    monitor, samba = target
+    mem = TargetMemory(samba)
+    assert mem[5] == 5
+    monitor.store(5, b"\x99")
+    assert mem[5] == 5
+    mem.invalidate()
+    assert mem[5] == 0x99
+
+
+def test_only_contiguous_slices():
+    monitor, samba = connect()
+    mem = TargetMemory(samba)
+    with pytest.raises(IndexError):
+        mem[0 : 10 : 2]
+    with pytest.raises(ValueError):
+        mem[0 : 4] = b"\x00"
@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+from atenka.memtest import (MemTestApplet, MemTestError, MemTestResult, run, fill, marchCMinus, walkingOnes,
+    addressInAddress, checkerboard, memoryTest, MODE_ALTERNATE, MODE_WALKING)
+from fakemonitor import connect
+
+
+START, END = 0x20008000, 0x20008100
+
+
+def words(monitor, start = START, end = END):
+    return list(struct.unpack("<%uL" % ((end - start) >> 2), bytes(monitor.load(start, end - start))))
+
+
+def test_fault_free_memory_passes():
+    monitor, samba = connect()
+    results = memoryTest(samba, START, END)
+    assert [r.name for r in results] == ["march-c-", "walking-ones", "address-in-address", "checkerboard"]
+    assert all(r.passed for r in results)
+    assert results[0] == MemTestResult("march-c-", 0, None, None, None, 0)
+
+
+def test_value_generators():
+    monitor, samba = connect()
+    run(samba, (MemTestApplet.WRITE, ), START, END, MODE_WALKING, 0)
+    assert words(monitor) == [1 << ((a >> 2) % 32) for a in range(START, END, 4)]
+    run(samba, (MemTestApplet.WRITE | MemTestApplet.INVERT, ), START, END, MODE_ALTERNATE, 0x55555555)
+    assert words(monitor)[ : 4] == [0xaaaaaaaa, 0x55555555, 0xaaaaaaaa, 0x55555555]
+
+
+def test_descending_element():
+    monitor, samba = connect()
+    order = []
+
+    def record(monitor, addr, value, size):
+        if START <= addr < END:
+            order.append(addr)
+        return False
+    monitor.storeHook = record
+    run(samba, (MemTestApplet.DOWN | MemTestApplet.WRITE, ), START, END, 0, 0x12345678)
+    assert order == list(range(END - 4, START - 4, -4))
+    assert words(monitor) == [0x12345678] * 64
+
+
+def test_stuck_at_fault():
+    monitor, samba = connect()
+    stuck = START + 0x40
+
+    def stuckAtOne(monitor, addr, value, size):
+        if addr == stuck:
+            monitor.store(addr, struct.pack("<L", value | 0x100))
+            return True
+        return False
+    monitor.storeHook = stuckAtOne
+    result = marchCMinus(samba, START, END)
+    assert not result.passed
+    assert (result.address, result.expected, result.actual, result.bits) == (stuck, 0, 0x100, 0x100)
+    assert not checkerboard(samba, START, END).passed
+
+
+def test_coupling_fault_needs_descending_elements():
+    """Raising bit 0 of `aggressor` sets bit 0 of the lower `victim`; only seen when walking down."""
+    monitor, samba = connect()
+    aggressor, victim = START + 0x80, START + 0x20
+
+    def coupling(monitor, addr, value, size):
+        if addr == aggressor and value & 1 and not monitor.u32(aggressor) & 1:
+            monitor.store(victim, struct.pack("<L", monitor.u32(victim) | 1))
+        return False
+    monitor.storeHook = coupling
+    assert addressInAddress(samba, START, END).passed
+    result = marchCMinus(samba, START, END)
+    assert result.failures == 1
+    assert (result.address, result.expected, result.actual) == (victim, 0, 1)
+
+
+def test_fill_phases_pattern_to_address():
+    monitor, samba = connect()
+    fill(samba, START + 1, 10, b"\x01\x02")
+    assert monitor.load(START, 12) == bytearray(b"\x00\x01\x02\x01\x02\x01\x02\x01\x02\x01\x02\x00")
+    with pytest.raises(ValueError):
+        fill(samba, START, 8, b"\x01\x02\x03")
+
+
+@pytest.mark.parametrize("start, end", [
+    (0x20001000, 0x20001100),       # Monitor.
+    (0x20002f00, 0x20003100),       # Applet area / hash table.
+    (0x20005000, 0x20005100),       # Flash staging buffers.
+    (START + 2, END),
+])
+def test_reserved_regions_are_rejected(start, end):
+    monitor, samba = connect()
+    with pytest.raises(MemTestError):
+        walkingOnes(samba, start, end)
+
+
+@pytest.mark.parametrize("addr, length", [
+    (0x20000001, 0x100),            # Unaligned head and tail, ends in the monitor.
+    (0x20002041, 2),                # Too short for the applet, inside the applet area.
+])
+def test_fill_checks_region_before_writing(addr, length):
+    monitor, samba = connect()
+    with pytest.raises(MemTestError):
+        fill(samba, addr, length, 0xaa)
+    assert not [frame for frame in monitor.frames if frame[0] in "OHW"]
@@ -0,0 +1,60 @@
+import os
+import time
+
+import pytest
+
+from atenka.port import Port, TimeoutError
+from fakemonitor import connect
+
+
+@pytest.fixture
+def pty():
+    master, slave = os.openpty()
+    port = Port(os.ttyname(slave))
+    yield master, port
+    port.close()
+    os.close(master)
+    os.close(slave)
+
+
+def test_read_complete(pty):
+    master, port = pty
+    os.write(master, b"abcdef")
+    assert port.read(6) == bytearray(b"abcdef")
+
+
+def test_short_read_raises_with_partial_data(pty):
+    master, port = pty
+    os.write(master, b"abc")
+    with pytest.raises(TimeoutError) as info:
+        port.read(5, timeout = 0.05)
+    assert info.value.data == bytearray(b"abc")
+
+
+def test_read_returns_early(pty):
+    master, port = pty
+    os.write(master, b"x" * 4)
+    started = time.time()
+    port.read(4, timeout = 2.0)
+    assert time.time() - started < 1.0
+
+
+def test_short_unit_reply_raises_timeout():
+    monitor, samba = connect()
+    monitor.replyFilter = lambda frame, data: data[ : 2]
+    with pytest.raises(TimeoutError):
+        samba.readLong(0x20000000)
+
+
+def test_reply_assembled_from_partial_reads():
+    monitor, samba = connect()
+    monitor.store(0x20000000, b"\x78\x56\x34\x12")
+    chunks = []
+    monitor.replyFilter = lambda frame, data: (chunks.append(data[2 : ]), data[ : 2])[1]
+    monitor.read, read = None, monitor.read
+    def dribble(length, timeout = None):
+        if not monitor.output and chunks:
+            monitor.output.extend(chunks.pop())
+        return read(length, timeout)
+    monitor.read = dribble
+    assert samba.readLong(0x20000000, timeout = 0.5) == 0x12345678
@@ -0,0 +1,54 @@
+import io
+import os
+
+import pytest
+
+from atenka import profiling
+from atenka.profiling import profiled, phase, NULL_PHASE, TOPLEVEL
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(profiling, "time", clock)
+    return clock
+
+
+def test_nested_phases(clock, tmpdir):
+    basename = os.path.join(str(tmpdir), "run")
+    stream = io.StringIO() if str is not bytes else io.BytesIO()
+    with profiled(basename, stream) as profiler:
+        clock.now += 1
+        with phase("transfer"):
+            clock.now += 2
+            with phase("decode"):
+                clock.now += 3
+                assert profiler._stack == [TOPLEVEL, "transfer", "decode"]
+        with phase("transfer"):
+            clock.now += 4
+        with pytest.raises(ValueError):
+            with phase("output"):
+                clock.now += 5
+                raise ValueError("inside a phase")
+        assert profiler._stack == [TOPLEVEL]
+    timings = dict((name, (calls, wall)) for name, (calls, wall, cpu) in profiler.timings.items())
+    assert timings == {"transfer": (2, 9.0), "decode": (1, 3.0), "output": (1, 5.0), TOPLEVEL: (1, 15.0)}
+    assert phase("transfer") is NULL_PHASE
+    assert os.path.exists(basename + ".prof") and os.path.exists(basename + ".folded")
+    summary = stream.getvalue()
+    assert "transfer" in summary and "run.folded" in summary
+
+
+def test_profiling_off():
+    with profiled() as profiler:
+        assert profiler is None
+        assert phase("transfer") is NULL_PHASE
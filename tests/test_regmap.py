@@ -0,0 +1,130 @@
+import struct
+
+import pytest
+
+from atenka import module, regmap
+from atenka.module import ACC_RO, ACC_RW, ACC_WO, Range, readRegisters
+from fakemonitor import connect
+
+
+SVD = b"""<?xml version="1.0" encoding="utf-8"?>
+<device>
+  <name>TEST</name>
+  <size>32</size>
+  <access>read-write</access>
+  <resetValue>0x0</resetValue>
+  <peripherals>
+    <peripheral>
+      <name>TIMER0</name>
+      <description>Timer
+        zero</description>
+      <baseAddress>0x40010000</baseAddress>
+      <registers>
+        <register>
+          <name>CTRL</name>
+          <addressOffset>0x00</addressOffset>
+          <fields>
+            <field><name>EN</name><bitOffset>0</bitOffset><bitWidth>1</bitWidth></field>
+            <field><name>MODE</name><lsb>4</lsb><msb>6</msb><access>write-only</access></field>
+            <field><name>DIV</name><bitRange>[15:8]</bitRange></field>
+          </fields>
+        </register>
+        <register>
+          <name>STATUS</name>
+          <addressOffset>0x04</addressOffset>
+          <access>read-only</access>
+          <resetValue>0x10</resetValue>
+        </register>
+        <register>
+          <name>CC[%s]</name>
+          <dim>2</dim>
+          <dimIncrement>4</dimIncrement>
+          <addressOffset>0x10</addressOffset>
+        </register>
+        <register>
+          <name>ID</name>
+          <addressOffset>0x20</addressOffset>
+          <size>16</size>
+        </register>
+      </registers>
+    </peripheral>
+    <peripheral derivedFrom="TIMER0">
+      <name>TIMER1</name>
+      <baseAddress>0x40014000</baseAddress>
+    </peripheral>
+  </peripherals>
+</device>
+"""
+
+
+@pytest.fixture
+def svd(tmpdir):
+    path = tmpdir.join("test.svd")
+    path.write_binary(SVD)
+    return str(path)
+
+
+def test_compile(svd):
+    modules = regmap.load(svd, cacheDir = None)
+    assert list(modules) == ["TIMER0", "TIMER1"]
+    timer = modules["TIMER0"]
+    assert (timer.NAME, timer.BASE_ADDRESS, timer.DESCRIPTION) == ("TIMER0", 0x40010000, "Timer zero")
+    assert timer.ORDER == ("CTRL", "STATUS", "CC0", "CC1", "ID")
+    assert timer.RANGES == (Range(0, 8, ("CTRL", "STATUS")), Range(0x10, 8, ("CC0", "CC1")), Range(0x20, 2, ("ID", )))
+    status = timer.REGISTERS["STATUS"]
+    assert (status.access, status.resetValue, status.size) == (ACC_RO, 0x10, 4)
+    assert timer.REGISTERS["ID"].size == 2
+    fields = dict((f.name, (f.offset, f.width, f.access)) for f in timer.REGISTERS["CTRL"].fields)
+    assert fields == {"EN": (0, 1, ACC_RW), "MODE": (4, 3, ACC_WO), "DIV": (8, 8, ACC_RW)}
+    assert modules["TIMER1"].BASE_ADDRESS == 0x40014000
+    assert modules["TIMER1"].ORDER == timer.ORDER
+
+
+def test_cache(svd, tmpdir, monkeypatch):
+    cacheDir = str(tmpdir.join("cache"))
+    first = regmap.load(svd, cacheDir)
+    assert len(tmpdir.join("cache").listdir()) == 1
+
+    def fail(text):
+        raise AssertionError("XML parsed despite a cached register map.")
+    monkeypatch.setattr(regmap, "compileSvd", fail)
+    second = regmap.load(svd, cacheDir)
+    assert second["TIMER0"].REGISTERS == first["TIMER0"].REGISTERS
+    assert second["TIMER0"].RANGES == first["TIMER0"].RANGES
+
+
+def test_invalid_svd(tmpdir):
+    path = tmpdir.join("broken.svd")
+    path.write_binary(b"<device><peripherals>")
+    with pytest.raises(regmap.RegisterMapError):
+        regmap.load(str(path), cacheDir = None)
+
+
+@pytest.mark.parametrize("blockReads", [False, True])
+def test_read_registers(svd, blockReads):
+    monitor, samba = connect()
+    timer = regmap.load(svd, cacheDir = None)["TIMER1"]
+    monitor.store(0x40014000, struct.pack("<2L", 0x1234, 0x10))
+    monitor.store(0x40014010, struct.pack("<2L", 7, 8))
+    monitor.store(0x40014020, struct.pack("<H", 0xbeef))
+    values = readRegisters(samba, timer, blockReads)
+    assert list(values.items()) == [("CTRL", 0x1234), ("STATUS", 0x10), ("CC0", 7), ("CC1", 8), ("ID", 0xbeef)]
+    assert len([f for f in monitor.frames if f.startswith("R")]) == (3 if blockReads else 0)
+
+
+@pytest.mark.parametrize("buffered, writes", [(False, 5), (True, 3)])
+def test_read_registers_bounds_outstanding_replies(svd, monkeypatch, buffered, writes):
+    monitor, samba = connect()
+    monitor.buffered = buffered
+    monkeypatch.setattr(module, "MAX_OUTSTANDING", 2)
+    timer = regmap.load(svd, cacheDir = None)["TIMER1"]
+    pending = []
+    write = monitor.write
+
+    def recordingWrite(data):
+        write(data)
+        pending.append(len(monitor.output))
+    monitor.write = recordingWrite
+    readRegisters(samba, timer)
+    assert len(pending) == writes
+    assert max(pending) == (2 * 4 if buffered else 4)
@@ -0,0 +1,37 @@
+import struct
+
+import pytest
+
+from fakemonitor import connect
+
+
+def queue(monitor, samba):
+    monitor.store(0x20008000, bytearray(range(16)))
+    batch = samba.batch()
+    batch.readLong(0x20008000)
+    batch.writeWord(0x20008004, 0xbeef)
+    batch.readWord(0x20008004)
+    batch.receiveFile(0x20008000, 8)
+    batch.sendFile(0x20008010, b"\x55" * 8)
+    batch.readByte(0x20008010)
+    return batch
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+def test_batch_waits_for_replies_on_unbuffered_ports(buffered):
+    monitor, samba = connect()
+    monitor.buffered = buffered
+    batch = queue(monitor, samba)
+    unread = []
+    write = monitor.write
+
+    def recordingWrite(data):
+        unread.append(len(monitor.output))
+        write(data)
+    monitor.write = recordingWrite
+    assert batch.execute() == [0x03020100, None, 0xbeef, bytearray(b"\x00\x01\x02\x03\xef\xbe\x06\x07"), None, 0x55]
+    assert len(batch) == 0
+    if buffered:
+        assert max(unread) == 14            # One exchange: everything written before the first reply is read.
+    else:
+        assert unread == [0] * len(unread)  # No command is sent while a reply is outstanding.
@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from atenka.script import parse, expression, Script, ScriptError
+from fakemonitor import connect
+
+
+def test_expression():
+    pins = expression("($pins | 0x04) & ~1", 1)
+    assert pins.deps == frozenset(["pins"])
+    assert pins.evaluate({"pins": 0x11}) == 0x14
+    assert expression("1 << 4") == 16
+
+
+@pytest.mark.parametrize("text, message", [
+    ("frob 0x10", "Line 1: unknown command"),
+    ("\nread32", "Line 2: 'read32' takes 1 to 1 arguments"),
+    ("write32 0, 1 -> x", "Line 1: 'write32' has no result"),
+    ("read32 0x10 * 2", "Line 1: unsupported expression"),
+    ("read32 0x10 +", "Line 1: invalid expression"),
+    ("read32 0 -> a\nwrite32 4, $a | $b", "line 2): undefined result '$b'"),
+    ("write32 4, $a\nread32 0 -> a", "line 1): undefined result '$a'"),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(ScriptError) as info:
+        parse(text)
+    assert message in str(info.value)
+
+
+def test_run_pipelines_until_a_value_is_needed():
+    monitor, samba = connect()
+    monitor.store(0x100, struct.pack("<L", 0x11))
+    result = parse("""
+        read32  0x100 -> pins       # First batch.
+        read16  0x104 -> other
+        write32 0x108, $pins | 0x04 # Needs pins: second batch.
+        write8  0x10c, 0x55
+        read8   0x10c -> byte
+        wait32  0x108, 0x04, 0x04
+        receive 0x108, 4 -> data
+    """).run(samba)
+    assert monitor.u32(0x108) == 0x15
+    assert result.values["pins"] == 0x11
+    assert result.values["byte"] == 0x55
+    assert result.values["data"] == bytearray(b"\x15\x00\x00\x00")
+    assert result.batches == 3
+
+
+def test_send_reads_file_relative_to_script(tmpdir):
+    monitor, samba = connect()
+    tmpdir.join("blob.bin").write_binary(b"\x01\x02\x03")
+    parse("send 0x200, blob.bin", str(tmpdir)).run(samba)
+    assert monitor.load(0x200, 3) == bytearray(b"\x01\x02\x03")
+
+
+def test_run_reports_failing_step():
+    monitor, samba = connect()
+    script = Script()
+    script.wait32(0x100, 1, 1, 0.01, line = 7)
+    with pytest.raises(ScriptError) as info:
+        script.run(samba)
+    assert "line 7" in str(info.value)
@@ -0,0 +1,49 @@
+import pytest
+
+from atenka.applet import APPLET_ADDR, APPLET_REGION_END
+from atenka.search import searchOnTarget, scan
+from fakemonitor import connect
+
+
+PATTERN = b"\x12\x34\x56\x78\x9a"
+
+
+@pytest.fixture
+def target():
+    monitor, samba = connect()
+    monitor.store(0x1003, PATTERN)
+    monitor.store(0x1100, PATTERN)
+    monitor.store(0x10fe, b"\x12\x34")
+    return monitor, samba
+
+
+@pytest.mark.parametrize("chunkSize", [1, 2, 4, 0x10, 0x1000])
+def test_scan_across_chunks(target, chunkSize):
+    monitor, samba = target
+    assert list(scan(samba, 0x1000, 0x1200, PATTERN, chunkSize = chunkSize)) == [0x1003, 0x1100]
+
+
+def test_scan_with_mask(target):
+    monitor, samba = target
+    found = list(scan(samba, 0x1000, 0x1200, b"\x12\x30", b"\xff\xf0"))
+    assert found == [0x1003, 0x10fe, 0x1100]
+
+
+def test_scan_bounds(target):
+    monitor, samba = target
+    assert list(scan(samba, 0x1003, 0x1008, PATTERN)) == [0x1003]
+    assert list(scan(samba, 0x1003, 0x1007, PATTERN)) == []
+
+
+def test_search_on_target(target):
+    monitor, samba = target
+    assert list(searchOnTarget(samba, 0x1000, 0x1200, PATTERN)) == [0x1003, 0x1100]
+    found = list(searchOnTarget(samba, 0x1000, 0x1200, b"\x12\x30", b"\xff\xf0"))
+    assert found == [0x1003, 0x10fe, 0x1100]
+
+
+def test_search_skips_its_own_buffers(target):
+    monitor, samba = target
+    monitor.store(APPLET_REGION_END - 0x100, PATTERN)
+    found = list(searchOnTarget(samba, APPLET_ADDR, APPLET_REGION_END, PATTERN))
+    assert found == [APPLET_REGION_END - 0x100]
@@ -0,0 +1,88 @@
+import struct
+
+import pytest
+
+from atenka import wait
+from atenka.applet import APPLET_CODE_ADDR
+from atenka.flash import FlashApplet
+from atenka.wait import WaitApplet, WaitTimeoutError, pollUntil, waitUntil
+from fakemonitor import connect
+
+
+REG = 0x400E0800
+
+
+def readySecondTime(monitor, ready = 0x10):
+    """`REG` reads 0 first, afterwards `ready` in the low byte."""
+    load = monitor.load
+    reads = []
+
+    def load32(addr, length):
+        if addr == REG:
+            reads.append(addr)
+            return bytearray(struct.pack("<L", 0xff00 | (ready if len(reads) > 1 else 0)))
+        return load(addr, length)
+    monitor.load = load32
+    return reads
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(wait, "time", clock)
+    return clock
+
+
+def test_poll_match(clock):
+    monitor, samba = connect()
+    reads = readySecondTime(monitor)
+    assert pollUntil(samba, REG, 0xff, 0x10) == 0xff10
+    assert len(reads) == 2 and clock.sleeps == [0.0005]
+
+
+def test_poll_backs_off_until_timeout(clock):
+    monitor, samba = connect()
+    with pytest.raises(WaitTimeoutError, match = "last value: 0x00000000"):
+        pollUntil(samba, REG, 1, 1, timeout = 0.2, initialDelay = 0.01, maxDelay = 0.05)
+    assert clock.sleeps[ : 4] == [0.01, 0.02, 0.04, 0.05]
+    assert set(clock.sleeps[3 : -1]) == set([0.05])
+    assert sum(clock.sleeps) == pytest.approx(0.2)
+
+
+def test_on_target_match():
+    monitor, samba = connect()
+    reads = readySecondTime(monitor)
+    assert waitUntil(samba, REG, 0xff, 0x10, onTarget = True) == 0xff10
+    assert len(reads) == 2
+    assert not [f for f in monitor.frames if f.startswith("w%08X" % REG)]     # Not polled by the host.
+
+
+def test_on_target_timeout():
+    monitor, samba = connect()
+    with pytest.raises(WaitTimeoutError, match = "last value: 0x0000ff00"):
+        readySecondTime(monitor, 0)
+        waitUntil(samba, REG, 0xff, 0x10, timeout = 0.0001, onTarget = True)
+
+
+def test_wait_applet_is_placed_by_the_manager():
+    monitor, samba = connect()
+    flash = samba.applets.get(FlashApplet)
+    flash.ensure()
+    waitUntil(samba, REG, 0, 0, onTarget = True)
+    applet = samba.applets.get(WaitApplet)
+    assert applet.loaded and applet.addr != APPLET_CODE_ADDR
+    assert flash.loaded and flash.resident()
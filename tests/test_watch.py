@@ -0,0 +1,81 @@
+import io
+import struct
+
+import pytest
+
+from atenka.applet import APPLET_REGION_END
+from atenka.watch import blockHash, HashApplet, MemoryWatch, DeltaWriter, replay, WatchError, FNV_BASIS, HASH_TABLE_ADDR
+from fakemonitor import connect
+
+
+START, LENGTH, BLOCK = 0x20008000, 0x400, 0x100
+
+
+@pytest.fixture
+def target():
+    monitor, samba = connect()
+    monitor.store(START, bytearray((idx * 7) & 0xff for idx in range(LENGTH)))
+    return monitor, samba
+
+
+def test_block_hash():
+    assert blockHash(b"") == FNV_BASIS
+    assert blockHash(struct.pack("<L", 0)) == (FNV_BASIS * 0x01000193) & 0xffffffff
+    assert blockHash(b"\x01\x00\x00\x00\x00\x00\x00\x00") != blockHash(b"\x00\x00\x00\x00\x01\x00\x00\x00")
+
+
+def test_applet_matches_host_hash(target):
+    monitor, samba = target
+    applet = samba.applets.get(HashApplet)
+    hashes = applet.hashes(START, BLOCK, LENGTH // BLOCK)
+    assert hashes == [blockHash(monitor.load(START + idx * BLOCK, BLOCK)) for idx in range(LENGTH // BLOCK)]
+
+
+@pytest.mark.parametrize("onTarget", [False, True])
+def test_poll_returns_changed_blocks(target, onTarget):
+    monitor, samba = target
+    applet = samba.applets.get(HashApplet) if onTarget else None
+    watch = MemoryWatch(samba, START, LENGTH, BLOCK, applet)
+    assert [idx for idx, data in watch.poll().blocks] == [0, 1, 2, 3]
+    assert watch.poll().blocks == []
+    monitor.store(START + 0x104, b"\xff")
+    monitor.store(START + 0x3fc, b"\xff")
+    del monitor.frames[:]
+    delta = watch.poll()
+    assert [idx for idx, data in delta.blocks] == [1, 3]
+    assert watch.snapshot == monitor.load(START, LENGTH)
+    if onTarget:
+        transfers = [f for f in monitor.frames if f.startswith("R")]
+        assert transfers[-3 : ] == ["R%08X,%08X" % (HASH_TABLE_ADDR, 16),
+            "R%08X,%08X" % (START + 0x100, BLOCK), "R%08X,%08X" % (START + 0x300, BLOCK)]
+
+
+def test_record_and_replay(target):
+    monitor, samba = target
+    watch = MemoryWatch(samba, START, LENGTH, BLOCK)
+    stream = io.BytesIO()
+    writer = DeltaWriter(stream, watch)
+    snapshots = []
+    for value in (b"\x01", b"\x02"):
+        writer.write(watch.poll())
+        snapshots.append(watch.snapshot)
+        monitor.store(START + 0x200, value)
+    stream.seek(0)
+    frames = [(sequence, bytearray(snapshot)) for sequence, timestamp, snapshot in replay(stream)]
+    assert frames == list(enumerate(snapshots))
+
+
+def test_invalid_arguments(target):
+    monitor, samba = target
+    with pytest.raises(WatchError):
+        MemoryWatch(samba, START + 2, LENGTH)
+    with pytest.raises(WatchError):
+        MemoryWatch(samba, START, LENGTH + 4)
+    with pytest.raises(WatchError, match = "applet area"):
+        MemoryWatch(samba, APPLET_REGION_END - 0x100, 0x200, 0x100, table = 0x20007000)
+    with pytest.raises(WatchError, match = "hash table"):
+        MemoryWatch(samba, HASH_TABLE_ADDR, LENGTH)
+    with pytest.raises(WatchError, match = "hash table"):
+        MemoryWatch(samba, START, LENGTH, table = START + LENGTH - 4)
+    with pytest.raises(WatchError):
+        list(replay(io.BytesIO(b"\x00" * 16)))